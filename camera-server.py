@@ -15,13 +15,30 @@ SHARPNESS FIXES:
 """
 
 from flask import Flask, Response, request, jsonify, render_template_string
-import threading, time, socket, io, subprocess, queue
+import threading, time, socket, io, subprocess, queue, os
 import numpy as np
-from PIL import Image, ImageDraw, ImageFont
-import colorsys
-import torch
-from ultralytics import YOLO
+from PIL import Image, ImageDraw
 import requests as req_lib
+from camera_sources import RpicamSource, MjpegFileSource, SyntheticSource
+from raw_capture import FileDualCapture, Picamera2DualCapture, yuv420_to_rgb
+from frames import Frame, FrameBus, SeqTracker, wait_any
+from frame_cache import DecodeCache
+from inference_backends import load_model
+from inference_process import InferenceProcess
+from model_manager import ModelManager, LoadedModel
+from inference_server import RemoteModel
+from inference_scheduler import InferenceScheduler
+from motion_gate import MotionGate
+from crash_gate import CrashGate
+from overlay import OverlayCompositor
+from color_engine import ColorEngine
+from jpeg_stitch import stitch_h, stitch_v, stitch_tile, why_not, encode_like
+from crash_tracker import BoxTracker
+from detections import crash_detections
+
+# torch/ultralytics/onnxruntime are imported by the model loader thread, not
+# here, so cameras and HTTP come up before the model does.
+STARTUP_T0 = time.monotonic()
 
 app = Flask(__name__)
 app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 0
@@ -45,27 +62,151 @@ CAM_FPS    = 15
 COMBINED_W = 1280   # 2 × CAM_WIDTH
 COMBINED_H = 480
 
+# ─────────────────── CAPTURE CONFIG ─────────────────
+# CAMERA_SOURCE (env var overrides):
+#   'rpicam'    : rpicam-vid MJPEG only; ML decodes every JPEG before YOLO
+#   'dual'      : picamera2 main stream → MJPEG for viewers/cloud,
+#                 lores stream → raw YUV420 for ML (no decode before YOLO)
+#   'file'      : replay REPLAY_FILES — run the pipeline on a dev box
+#   'synthetic' : generated test pattern, no camera or files
+CAMERA_SOURCE = os.environ.get("CAMERA_SOURCE", "rpicam")
+RAW_WIDTH    = 640     # lores/inference resolution, must be ≤ CAM size
+RAW_HEIGHT   = 480
+# Off-hardware dual mode: replay files instead of opening the cameras, e.g.
+# {0: ("test.mjpeg", "test.yuv"), 1: ("test.mjpeg", "test.yuv")}
+# (make the .yuv with: python raw_capture.py test.mjpeg test.yuv)
+RAW_REPLAY   = None
+REPLAY_FILES = {idx: os.environ.get("REPLAY_FILE", "test.mjpeg") for idx in (0, 1)}
+REPLAY_FPS   = float(os.environ.get("REPLAY_FPS", CAM_FPS))   # 0 = as fast as possible
+
+# ─────────────────── ML CONFIG ──────────────────────
+# ML_BACKEND picks the model file, the file picks the runtime
+# (export the others with: python inference_backends.py export ...)
+ML_MODEL_FILES = {
+    "torch":       "accident_model_latest.pt",
+    "torchscript": "accident_model_latest.torchscript",
+    "onnx":        "accident_model_latest.onnx",        # ONNX Runtime
+    "onnx-int8":   "accident_model_latest.int8.onnx",   # int8 dynamic quantized
+}
+ML_BACKEND = os.environ.get("ML_BACKEND", "torch")
+MODEL_PATH = ML_MODEL_FILES[ML_BACKEND]
+# Letterbox/normalize into reused per-thread buffers and feed the model a
+# ready tensor (preprocess.py); 0 = let ultralytics preprocess each frame.
+# The network sees RGB either way.
+ML_PREALLOC = os.environ.get("ML_PREALLOC", "1") == "1"
+# Run YOLO in a child process fed through shared memory, so inference does
+# not compete with capture/overlay/streaming for the GIL. The worker is
+# restarted automatically if it crashes or hangs.
+ML_OUT_OF_PROCESS = os.environ.get("ML_OUT_OF_PROCESS", "0") == "1"
+ML_PROC_THREADS   = None    # torch threads in the worker (None = torch default)
+# Remote inference: send frames to inference_server.py on a LAN box, which
+# batches requests from every camera/Pi. Falls back to on-device inference
+# with MODEL_PATH while the server is unreachable.
+ML_REMOTE_URL      = os.environ.get("ML_REMOTE_URL")   # e.g. http://192.168.1.50:8500
+ML_REMOTE_DEADLINE = 0.5    # seconds a frame may spend in the remote queue + model
+# Load + warm up the model in the background while capture, streaming and the
+# cloud sender start; /ml_results reports "loading" until it is ready.
+# ML_BACKGROUND_LOAD=0 restores the old load-before-anything behaviour.
+ML_BACKGROUND_LOAD = os.environ.get("ML_BACKGROUND_LOAD", "1") == "1"
+# Inference rate is budgeted from measured latency: a camera holding a crash
+# candidate gets ML_ACTIVE_WEIGHT× the share of a quiet one, and no camera is
+# sampled below ML_FLOOR_HZ, so the confirmation timer stays accurate when
+# the CPU is saturated.
+ML_FLOOR_HZ      = 2.0
+ML_ACTIVE_WEIGHT = 4.0
+ML_MAX_DUTY      = 0.8      # fraction of wall time inference may occupy
+# Resolution cascade: quiet cameras are scanned at ML_IMGSZ_SCAN; a camera
+# holding a crash candidate is escalated to ML_IMGSZ_VERIFY until it clears.
+# ML_CASCADE=0 runs everything at ML_IMGSZ_VERIFY (the old behaviour).
+ML_CASCADE       = os.environ.get("ML_CASCADE", "1") == "1"
+ML_IMGSZ_SCAN    = 320
+ML_IMGSZ_VERIFY  = 640
+# ROI verify: while a candidate is held, infer on a crop around its last
+# boxes (expanded by ML_ROI_MARGIN × box size each side, at least ML_ROI_MIN
+# px) at native resolution; every ML_ROI_FULL_EVERY-th verification is a
+# full-frame scan so new crashes elsewhere are still found.
+ML_ROI            = os.environ.get("ML_ROI", "1") == "1"
+ML_ROI_MARGIN     = 0.5
+ML_ROI_MIN        = 256
+ML_ROI_FULL_EVERY = 4
+# Crash gate: a quiet camera's frame is first scored by the detector at
+# ML_GATE_IMGSZ (or by ML_GATE_MODEL, a small separate detector file); the
+# full model only runs when that score reaches ML_GATE_THRESHOLD, or at least
+# every ML_GATE_SAFETY_S seconds regardless. Cameras holding a candidate skip
+# the gate. Check recall before changing these: python crash_gate.py --help
+ML_GATE           = os.environ.get("ML_GATE", "1") == "1"
+ML_GATE_MODEL     = os.environ.get("ML_GATE_MODEL")
+ML_GATE_IMGSZ     = 160
+ML_GATE_THRESHOLD = 0.15
+ML_GATE_SAFETY_S  = 3.0
+# Motion gate: skip YOLO when a camera's scene has not changed since the last
+# frame it inferred (mean grey-level difference of an 80×60 thumbnail below
+# `threshold`); a static scene is still re-checked every `static_interval` s.
+# Never gates a camera that holds a crash candidate.
+MOTION_GATE_ENABLED = os.environ.get("MOTION_GATE", "1") == "1"
+MOTION_GATE = {
+    0: {"threshold": 4.0, "static_interval": 2.0},   # FRONT
+    1: {"threshold": 4.0, "static_interval": 2.0},   # REAR
+}
+
+# Overlay: every camera view carries its FRONT/REAR badge, an opaque 128×32
+# tile at the top-left (compositor.badge_tile). A /stream/front|rear frame
+# with nothing else on it (no color markers, crash boxes or progress bar) is
+# the camera JPEG with the tile's encoding spliced in (jpeg_stitch) — no
+# decode, no encode — when the stream's restart intervals allow it; other
+# frames are rendered with the same tile pasted in, so a view looks the same
+# whichever path produced it. OVERLAY_FAST_PATH=0 always renders.
+OVERLAY_FAST_PATH = os.environ.get("OVERLAY_FAST_PATH", "1") == "1"
+# Combined view stitched in the JPEG domain (jpeg_stitch.py): camera frames
+# with restart intervals per MCU row are joined side by side without a
+# decode/encode; halves with an overlay are re-encoded with the camera's
+# tables. Camera JPEGs without restart markers (rpicam-vid, picamera2 and
+# test.mjpeg emit none; SyntheticSource does) cannot be stitched: that is
+# read off the marker segments, logged once, and the pixel path is used
+# without re-probing. Other incompatibilities are re-checked every
+# STITCH_RETRY_S seconds.
+COMBINED_STITCH = os.environ.get("COMBINED_STITCH", "1") == "1"
+STITCH_RETRY_S  = 10.0
+# Color detection (color_engine.py): every pixel of a frame subsampled by
+# COLOR_STEP is classified; 'grid' mode reports each cell of COLOR_GRID
+# (rows, cols — POST /detection {"grid": [8, 8]}, 1..COLOR_GRID_MAX) with
+# its dominant color and class histogram. Runs on every other camera frame.
+COLOR_STEP     = 4
+COLOR_GRID     = (3, 3)
+COLOR_GRID_MAX = 16
+
 # ─────────────────── CRASH CONFIRMATION CONFIG ───────
 CRASH_LABEL            = 'motor_crash'
 CRASH_CONF_THRESHOLD   = 0.90
 CRASH_CONFIRM_SECONDS  = 3
 CRASH_COOLDOWN_SECONDS = 10
+# Detections are tracked across frames (IoU, then centroid match); a track —
+# and the confirmation timer — survives TRACK_MAX_GAP seconds without a
+# match, so a missed or skipped inference no longer restarts the count.
+TRACK_IOU     = 0.3
+TRACK_MAX_GAP = 1.0
 
 # ─────────────────── GLOBALS ────────────────────────
+# Camera buses share one Condition (and overlay buses another) so a single
+# worker can wait_any() on both cameras.
+camera_cond  = threading.Condition()
+overlay_cond = threading.Condition()
+
 cameras = {
-    0: {"label": "FRONT", "latest_frame": None, "overlay_frame": None,
-        "status": "Starting...", "frame_lock": threading.Lock(),
-        "overlay_lock": threading.Lock(), "status_lock": threading.Lock(),
-        "frame_ready": threading.Event()},
-    1: {"label": "REAR",  "latest_frame": None, "overlay_frame": None,
-        "status": "Starting...", "frame_lock": threading.Lock(),
-        "overlay_lock": threading.Lock(), "status_lock": threading.Lock(),
-        "frame_ready": threading.Event()},
+    0: {"label": "FRONT", "seq": 0, "status": "Starting...",
+        "frames":   FrameBus("cam0", camera_cond),
+        "overlays": FrameBus("overlay0", overlay_cond),
+        "status_lock": threading.Lock(), "frame_ready": threading.Event()},
+    1: {"label": "REAR",  "seq": 0, "status": "Starting...",
+        "frames":   FrameBus("cam1", camera_cond),
+        "overlays": FrameBus("overlay1", overlay_cond),
+        "status_lock": threading.Lock(), "frame_ready": threading.Event()},
 }
 
-combined_frame      = None
-combined_frame_lock = threading.Lock()
-combined_ready      = threading.Event()
+combined_bus = FrameBus("combined")   # Frame(cam=None, ...)
+
+# Stream generators give up after this long without a new frame
+STREAM_STALL_SECONDS = 15
 
 color_detection_enabled = False
 detection_mode  = 'center'
@@ -84,7 +225,68 @@ confirm_state = {
         "confirmed_at": None, "cooldown_until": 0.0, "boxes": []},
 }
 
-model      = None
+crash_trackers = {idx: BoxTracker(iou_thres=TRACK_IOU, max_gap=TRACK_MAX_GAP)
+                  for idx in (0, 1)}   # guarded by confirm_lock
+
+# model_manager.current is the serving LoadedModel (None until loaded);
+# POST /model/reload swaps in a new file without stopping the pipeline
+model_manager = None    # set below, after build_model is defined
+
+# ─── startup timing: boot_mark("x") logs seconds since STARTUP_T0 ───
+startup_times = {}
+
+def boot_mark(name):
+    t = round(time.monotonic() - STARTUP_T0, 2)
+    startup_times.setdefault(name, t)
+    print(f"[BOOT] {name:<22} +{t:.2f}s")
+
+def crash_candidate(cam_idx):
+    with confirm_lock:
+        return confirm_state[cam_idx]["first_seen"] is not None
+
+def ml_imgsz(cam_idx):
+    """Inference size for a camera right now (see ML_CASCADE)."""
+    if ML_CASCADE and not crash_candidate(cam_idx):
+        return ML_IMGSZ_SCAN
+    return ML_IMGSZ_VERIFY
+
+ml_scheduler = InferenceScheduler((0, 1), crash_candidate, floor_hz=ML_FLOOR_HZ,
+                                  max_hz=CAM_FPS, active_weight=ML_ACTIVE_WEIGHT,
+                                  max_duty=ML_MAX_DUTY,
+                                  tier_of=lambda cam: ml_sched_tier(cam))
+motion_gate  = MotionGate(MOTION_GATE)
+crash_gate   = CrashGate(ML_GATE_THRESHOLD, ML_GATE_SAFETY_S, ML_GATE_IMGSZ)
+compositor   = OverlayCompositor()   # cached fonts/layers + per-camera render cost
+color_engine = ColorEngine(COLOR_STEP)
+
+# ml_worker waits up to this long for the second camera so both frames go
+# through a single batched predict (≈ a third of a frame period at 15 fps)
+ML_BATCH_WAIT = 0.02
+
+# Consumers drop work on frames older than this (camera stalled / worker behind)
+MAX_FRAME_AGE = 1.0
+# Overlays and the combined view are only rendered while consumed: stream
+# subscribers, or a demand lease of DEMAND_HOLD_S taken by a snapshot, which
+# waits up to SNAPSHOT_WAIT_S for a render. The cloud upload leases only
+# CLOUD_LEASE_S at each send, so the view renders about once per upload
+DEMAND_HOLD_S   = 3.0
+SNAPSHOT_WAIT_S = 1.0
+CLOUD_FRAME_AGE = 0.5   # cloud upload: an older combined frame waits for a render
+CLOUD_LEASE_S   = 0.05
+render_stats    = {"rendered": 0, "idle": 0}   # overlay_worker passes
+# Per-consumer new/skipped/stale counters, served at /frame_stats
+frame_stats = {}
+
+def frame_tracker(name):
+    return frame_stats.setdefault(name, SeqTracker())
+
+# Each camera JPEG is decoded at most once and shared by ML, color
+# detection, overlay and combine (keeps current + previous per camera)
+decode_cache = DecodeCache(per_cam=2)
+
+def frame_image(frame):
+    """Decoded RGB image of a Frame: the render it carries, else the shared cache."""
+    return frame.image if frame.image is not None else decode_cache.image(frame)
 
 gps_state      = {"lat": None, "lon": None, "speed": None}
 gps_state_lock = threading.Lock()
@@ -109,200 +311,382 @@ def set_cam_status(cam_idx, msg):
         cameras[cam_idx]["status"] = msg
     print(f"[CAM{cam_idx}] {msg}")
 
-def rgb_to_color_name(r, g, b):
-    h, s, v = colorsys.rgb_to_hsv(r/255, g/255, b/255)
-    h=h*360; s=s*100; v=v*100
-    if s < 10:
-        if v < 20: return "Black"
-        elif v > 80: return "White"
-        else: return "Gray"
-    if v < 20: return "Black"
-    if h < 15 or h >= 345: return "Red"
-    elif h < 45: return "Orange"
-    elif h < 75: return "Yellow"
-    elif h < 155: return "Green"
-    elif h < 185: return "Cyan"
-    elif h < 250: return "Blue"
-    elif h < 290: return "Purple"
-    elif h < 345: return "Magenta"
-    return "Unknown"
+def publish_frame(cam_idx, jpeg, raw=None):
+    cam = cameras[cam_idx]
+    cam["seq"] += 1   # one producer per camera
+    cam["frames"].publish(Frame(cam_idx, cam["seq"], jpeg, raw=raw))
+    if not cam["frame_ready"].is_set():
+        cam["frame_ready"].set()
+        set_cam_status(cam_idx,"Streaming!")
+        boot_mark(f"cam{cam_idx} first frame")
 
 # ─────────────────── COLOR DETECTION ────────────────
-def detect_colors_in_frame(cam_idx, frame_bytes, mode='center'):
+def detect_colors_in_frame(cam_idx, frame, mode='center'):
     try:
-        img = Image.open(io.BytesIO(frame_bytes)).convert('RGB')
-        arr = np.array(img)
+        arr = decode_cache.array(frame)
         h, w = arr.shape[:2]
-        colors = []
         if mode == 'center':
-            cx, cy = w//2, h//2
-            sample = arr[max(0,cy-30):cy+30, max(0,cx-30):cx+30]
-            r, g, b = sample.mean(axis=(0,1)).astype(int)
-            colors.append({'position':'center','rgb':f'rgb({r},{g},{b})',
-                'rgba':f'rgba({r},{g},{b},1)','hex':f'#{r:02x}{g:02x}{b:02x}',
-                'name':rgb_to_color_name(r,g,b),'coords':(cx,cy),
-                'r':int(r),'g':int(g),'b':int(b)})
+            x0, y0 = max(0, w//2-30), max(0, h//2-30)
+            colors = color_engine.analyze(arr[y0:h//2+30, x0:w//2+30], (1, 1), (x0, y0))
         elif mode == 'grid':
-            for i in range(3):
-                for j in range(3):
-                    x=int(w*(j+0.5)/3); y=int(h*(i+0.5)/3)
-                    sample=arr[max(0,y-20):y+20,max(0,x-20):x+20]
-                    r,g,b=sample.mean(axis=(0,1)).astype(int)
-                    colors.append({'position':f'grid_{i}_{j}','rgb':f'rgb({r},{g},{b})',
-                        'rgba':f'rgba({r},{g},{b},1)','hex':f'#{r:02x}{g:02x}{b:02x}',
-                        'name':rgb_to_color_name(r,g,b),'coords':(x,y),
-                        'r':int(r),'g':int(g),'b':int(b)})
+            colors = color_engine.analyze(arr, COLOR_GRID)
+        else:
+            colors = []
         with detection_lock:
             detected_colors[cam_idx] = colors
     except Exception as e:
         print(f"Color detection error cam{cam_idx}: {e}")
 
 # ─────────────────── ML DETECTION + CONFIRMATION ────
-def detect_accidents_in_frame(cam_idx, frame_bytes):
-    try:
-        img = Image.open(io.BytesIO(frame_bytes)).convert('RGB')
-        results = model.predict(source=np.array(img), imgsz=640, conf=0.5, verbose=False)
-        boxes = []
-        w, h = img.size
-        for r in results:
-            if len(r.boxes) == 0: continue
-            for box, conf, cls in zip(r.boxes.xyxy, r.boxes.conf, r.boxes.cls):
-                label = model.names[int(cls)]
-                if label != CRASH_LABEL: continue
-                if float(conf) < CRASH_CONF_THRESHOLD: continue
-                x1,y1,x2,y2 = map(int, box.tolist())
-                cx = (x1+x2)//2
-                side = 'Left' if cx < w/3 else ('Center' if cx < w*2/3 else 'Right')
-                boxes.append({'box':[x1,y1,x2,y2],'label':label,
-                              'conf':float(conf),'side':side,'cam':cam_idx})
-
-        with ml_lock:
-            ml_results[cam_idx] = boxes
-
-        now = time.time()
-        with confirm_lock:
-            cs = confirm_state[cam_idx]
-            if boxes:
-                if cs["first_seen"] is None:
-                    cs["first_seen"]   = now
-                    cs["elapsed"]      = 0.0
-                    cs["confirmed"]    = False
-                    cs["confirmed_at"] = None
-                cs["boxes"]   = boxes
-                cs["elapsed"] = now - cs["first_seen"]
-                if (not cs["confirmed"]
-                        and cs["elapsed"] >= CRASH_CONFIRM_SECONDS
-                        and now >= cs["cooldown_until"]):
-                    cs["confirmed"]      = True
-                    cs["confirmed_at"]   = now
-                    cs["cooldown_until"] = now + CRASH_COOLDOWN_SECONDS
-                    print(f"[CAM{cam_idx}] ✅ CRASH CONFIRMED after {cs['elapsed']:.1f}s")
-            else:
-                if cs["first_seen"] is not None:
-                    held = now - cs["first_seen"]
-                    if not cs["confirmed"]:
-                        print(f"[CAM{cam_idx}] ❌ Detection cleared after {held:.1f}s — FALSE ALARM")
-                cs["first_seen"]   = None
+def frame_to_rgb(frame):
+    """Uses frame.raw (dual capture YUV420) when present — skips the JPEG decode."""
+    if frame.raw is not None:
+        return yuv420_to_rgb(frame.raw, RAW_WIDTH, RAW_HEIGHT)
+    return decode_cache.array(frame)
+
+def boxes_from_result(cam_idx, r, shape, offset=(0, 0), crash_ids=(0,)):
+    """Crash boxes from one Result, in camera (MJPEG) coordinates.
+    `shape` is the full source array; `offset` the crop origin within it."""
+    det = crash_detections(r, shape, crash_ids, CRASH_CONF_THRESHOLD,
+                           (CAM_WIDTH, CAM_HEIGHT), offset)
+    return det.to_dicts(cam_idx, CRASH_LABEL) if len(det) else []
+
+def update_confirm_state(cam_idx, boxes):
+    with ml_lock:
+        ml_results[cam_idx] = boxes
+
+    now = time.time()
+    with confirm_lock:
+        tracker = crash_trackers[cam_idx]
+        tracks  = tracker.update(boxes, now)
+        cs = confirm_state[cam_idx]
+        if tracks:
+            if cs["first_seen"] is None:
                 cs["elapsed"]      = 0.0
                 cs["confirmed"]    = False
                 cs["confirmed_at"] = None
-                cs["boxes"]        = []
-    except Exception as e:
-        print(f"ML detection error cam{cam_idx}: {e}")
-
-# ─────────────────── OVERLAY ─────────────────────────
-def add_overlay(cam_idx, frame_bytes, mode='center'):
+            # Held since the oldest live track appeared
+            cs["first_seen"] = tracker.held_since()
+            cs["boxes"]   = [t.as_det() for t in tracks]
+            cs["elapsed"] = now - cs["first_seen"]
+            if (not cs["confirmed"]
+                    and cs["elapsed"] >= CRASH_CONFIRM_SECONDS
+                    and now >= cs["cooldown_until"]):
+                cs["confirmed"]      = True
+                cs["confirmed_at"]   = now
+                cs["cooldown_until"] = now + CRASH_COOLDOWN_SECONDS
+                print(f"[CAM{cam_idx}] ✅ CRASH CONFIRMED after {cs['elapsed']:.1f}s")
+        else:
+            if cs["first_seen"] is not None:
+                held = now - cs["first_seen"]
+                if not cs["confirmed"]:
+                    print(f"[CAM{cam_idx}] ❌ Detection cleared after {held:.1f}s — FALSE ALARM")
+            cs["first_seen"]   = None
+            cs["elapsed"]      = 0.0
+            cs["confirmed"]    = False
+            cs["confirmed_at"] = None
+            cs["boxes"]        = []
+
+roi_runs = {0: 0, 1: 0}   # ROI verifications since the last full-frame run
+
+def ml_plan(cam_idx):
+    """(imgsz, roi) for the next inference on a camera; roi is a CAM-coordinate
+    crop box, or None for a full-frame run."""
+    imgsz = ml_imgsz(cam_idx)
+    if not ML_ROI or imgsz != ML_IMGSZ_VERIFY or roi_runs[cam_idx] >= ML_ROI_FULL_EVERY - 1:
+        return imgsz, None
+    with confirm_lock:
+        boxes = np.array([b['box'] for b in confirm_state[cam_idx]["boxes"]], dtype=np.float32)
+    if not len(boxes):
+        return imgsz, None
+    x1, y1 = boxes[:, :2].min(0); x2, y2 = boxes[:, 2:].max(0)
+    pad  = ML_ROI_MARGIN * max(x2 - x1, y2 - y1)
+    half = max((max(x2 - x1, y2 - y1) + 2 * pad) / 2, ML_ROI_MIN / 2)
+    cx, cy = (x1 + x2) / 2, (y1 + y2) / 2
+    w2 = min(half, CAM_WIDTH / 2); h2 = min(half, CAM_HEIGHT / 2)
+    cx = min(max(cx, w2), CAM_WIDTH - w2); cy = min(max(cy, h2), CAM_HEIGHT - h2)
+    roi = (int(cx - w2), int(cy - h2), int(cx + w2), int(cy + h2))
+    if (roi[2] - roi[0]) * (roi[3] - roi[1]) > 0.6 * CAM_WIDTH * CAM_HEIGHT:
+        return imgsz, None      # crop would save little — just run the frame
+    # native resolution: letterbox size = crop's long side, multiple of 32
+    side = max(roi[2] - roi[0], roi[3] - roi[1])
+    return min(ML_IMGSZ_VERIFY, -(-side // 32) * 32), roi
+
+def ml_tier(imgsz, roi):
+    """Scheduler latency bucket for a plan."""
+    return "roi" if roi else imgsz
+
+def ml_sched_tier(cam_idx):
+    """Bucket the scheduler charges a camera: quiet cameras pay the gate pass
+    (the occasional full run behind it is not budgeted separately)."""
+    if ML_GATE and not crash_candidate(cam_idx):
+        return "gate"
+    return ml_tier(*ml_plan(cam_idx))
+
+def detect_accidents_batch(frames, imgsz=ML_IMGSZ_VERIFY, rois=None, lm=None):
+    """
+    One model.predict call for the newest frame of every camera.
+    `frames` is a list of Frames (any cameras); results are split back per
+    camera and fed to each confirm_state entry. `rois` (aligned with
+    frames, CAM coordinates or None) crops before inference. `lm` is the
+    LoadedModel to use (default: whatever is serving now).
+    """
+    lm = lm or model_manager.current
+    if lm is None: return
     try:
-        img  = Image.open(io.BytesIO(frame_bytes)).convert('RGB')
-        draw = ImageDraw.Draw(img, 'RGBA')
-        try:
-            font  = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSansMono-Bold.ttf", 18)
-            sfont = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSansMono-Bold.ttf", 14)
-        except Exception:
-            font  = ImageFont.load_default()
-            sfont = font
+        arrs = [frame_to_rgb(f) for f in frames]
+        srcs, offsets = [], []
+        for arr, roi in zip(arrs, rois or [None] * len(arrs)):
+            if roi is None:
+                srcs.append(arr); offsets.append((0, 0)); continue
+            sx = arr.shape[1] / CAM_WIDTH; sy = arr.shape[0] / CAM_HEIGHT
+            x1, y1 = int(roi[0] * sx), int(roi[1] * sy)
+            x2, y2 = int(roi[2] * sx), int(roi[3] * sy)
+            srcs.append(np.ascontiguousarray(arr[y1:y2, x1:x2])); offsets.append((x1, y1))
+        results = lm.model.predict(source=srcs, imgsz=imgsz, conf=0.5,
+                                   classes=lm.crash_ids, verbose=False)
+        for frame, arr, r, off in zip(frames, arrs, results, offsets):
+            update_confirm_state(frame.cam,
+                                 boxes_from_result(frame.cam, r, arr.shape, off, lm.crash_ids))
+    except Exception as e:
+        print(f"ML detection error cams {[f.cam for f in frames]}: {e}")
 
-        badge_col = (0, 200, 255, 220) if cam_idx == 0 else (255, 100, 0, 220)
-        draw.rectangle([4, 4, 120, 28], fill=badge_col)
-        draw.text((8, 6), cameras[cam_idx]["label"], fill=(0,0,0,255), font=font)
+def detect_accidents_in_frame(cam_idx, frame):
+    detect_accidents_batch([frame])
 
-        with detection_lock:
-            colors = detected_colors[cam_idx].copy()
-        for color in colors:
-            x, y = color['coords']
-            if mode == 'center':
-                draw.line([(x-20,y),(x+20,y)], fill=(0,255,0,255), width=2)
-                draw.line([(x,y-20),(x,y+20)], fill=(0,255,0,255), width=2)
-            elif mode == 'grid':
-                draw.ellipse([x-10,y-10,x+10,y+10],
-                             fill=(color['r'],color['g'],color['b'],255))
-
-        with confirm_lock:
-            cs = confirm_state[cam_idx].copy()
-        with ml_lock:
-            boxes = ml_results[cam_idx].copy()
-
-        now = time.time()
-        for b in boxes:
-            x1,y1,x2,y2 = b['box']
-            if cs["confirmed"] and cs["confirmed_at"] and \
-               now - cs["confirmed_at"] < CRASH_COOLDOWN_SECONDS:
-                box_color  = (255, 0, 0, 255)
-                text_bg    = (200, 0, 0, 220)
-                status_tag = "CONFIRMED"
-            elif cs["first_seen"] is not None and not cs["confirmed"]:
-                pct  = min(1.0, cs["elapsed"] / CRASH_CONFIRM_SECONDS)
-                fill = int(pct * 255)
-                box_color  = (255, fill, 0, 255)
-                text_bg    = (160, 100, 0, 200)
-                status_tag = f"VERIFYING {cs['elapsed']:.1f}/{CRASH_CONFIRM_SECONDS}s"
-            else:
-                continue
-            draw.rectangle([x1,y1,x2,y2], outline=box_color, width=3)
-            text = f"{b['label']} {b['conf']*100:.0f}% {b['side']} | {status_tag}"
-            tw   = len(text) * 8
-            draw.rectangle([x1, max(0,y1-22), x1+tw, y1], fill=text_bg)
-            draw.text((x1+2, max(0,y1-20)), text, fill=(255,255,255,255), font=sfont)
-
-        if cs["first_seen"] is not None and not cs["confirmed"]:
+# ─────────────────── OVERLAY ─────────────────────────
+def overlay_plan(cam_idx):
+    """Dynamic overlay content for a camera right now: (colors, styled boxes,
+    confirm state, verifying) — or None when there is nothing to draw."""
+    with detection_lock:
+        colors = detected_colors[cam_idx].copy()
+    with confirm_lock:
+        cs = confirm_state[cam_idx].copy()
+    with ml_lock:
+        boxes = ml_results[cam_idx].copy()
+
+    now = time.time()
+    styled = []
+    for b in boxes:
+        if cs["confirmed"] and cs["confirmed_at"] and \
+           now - cs["confirmed_at"] < CRASH_COOLDOWN_SECONDS:
+            styled.append((b, (255, 0, 0, 255), (200, 0, 0, 220), "CONFIRMED"))
+        elif cs["first_seen"] is not None and not cs["confirmed"]:
             pct  = min(1.0, cs["elapsed"] / CRASH_CONFIRM_SECONDS)
-            iw, ih = img.size
-            bar_w = int(iw * pct)
-            draw.rectangle([0, ih-8, iw, ih], fill=(40,40,40,200))
-            draw.rectangle([0, ih-8, bar_w, ih], fill=(255, int(255*(1-pct)), 0, 220))
-
-        out = io.BytesIO()
-        img.save(out, format='JPEG', quality=92)
-        return out.getvalue()
-    except Exception as e:
-        print(f"Overlay error cam{cam_idx}: {e}")
-        return frame_bytes
-
-# ─────────────────── COMBINE FRAMES ─────────────────
-def combine_frames(front_bytes, rear_bytes):
-    try:
-        # ← LANCZOS for sharp resize (was default bilinear)
-        front = Image.open(io.BytesIO(front_bytes)).convert('RGB').resize((CAM_WIDTH, CAM_HEIGHT), Image.LANCZOS)
-        rear  = Image.open(io.BytesIO(rear_bytes)).convert('RGB').resize((CAM_WIDTH, CAM_HEIGHT), Image.LANCZOS)
-        canvas = Image.new('RGB', (COMBINED_W, COMBINED_H + 32), (10, 10, 10))
-        canvas.paste(front, (0, 32))
-        canvas.paste(rear,  (CAM_WIDTH, 32))
-        draw = ImageDraw.Draw(canvas)
-        try:
-            hfont = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSansMono-Bold.ttf", 18)
-        except Exception:
-            hfont = ImageFont.load_default()
-        draw.rectangle([0, 0, COMBINED_W, 32], fill=(10, 10, 10))
-        draw.text((8, 8),            "◀ FRONT", fill=(0, 200, 255), font=hfont)
-        draw.text((CAM_WIDTH + 8, 8),"REAR ▶",  fill=(255, 120, 0), font=hfont)
-        draw.line([(CAM_WIDTH,0),(CAM_WIDTH,COMBINED_H+32)], fill=(40,40,40), width=2)
-        ts = time.strftime("%Y-%m-%d  %H:%M:%S")
-        draw.text((COMBINED_W//2 - 90, 8), ts, fill=(180,180,180), font=hfont)
-        out = io.BytesIO()
-        canvas.save(out, format='JPEG', quality=92)
-        return out.getvalue()
-    except Exception as e:
-        print(f"Combine error: {e}"); return front_bytes
+            styled.append((b, (255, int(pct * 255), 0, 255), (160, 100, 0, 200),
+                           f"VERIFYING {cs['elapsed']:.1f}/{CRASH_CONFIRM_SECONDS}s"))
+    verifying = cs["first_seen"] is not None and not cs["confirmed"]
+    if not colors and not styled and not verifying:
+        return None
+    return colors, styled, cs, verifying
+
+BADGE_COLORS = {0: (0, 200, 255, 220), 1: (255, 100, 0, 220)}
+_badge_jpeg  = {}   # cam → (camera JPEG marker segments, tile encoded to match)
+
+def badge_tile(cam_idx):
+    return compositor.badge_tile(cameras[cam_idx]["label"], BADGE_COLORS[cam_idx])
+
+def badged_jpeg(cam_idx, jpeg):
+    """Camera JPEG with the badge tile spliced in, or None when the stream's
+    restart intervals do not allow it (then the view has to be rendered)."""
+    key = jpeg[:jpeg.find(b'\xff\xda')]               # tables, size, DRI
+    cached = _badge_jpeg.get(cam_idx)
+    if cached is None or cached[0] != key:
+        cached = _badge_jpeg[cam_idx] = (key, encode_like(badge_tile(cam_idx), jpeg))
+    return cached[1] and stitch_tile(jpeg, cached[1])
+
+def draw_overlay(img, cam_idx, plan, mode='center', origin=(0, 0)):
+    """Draw a camera's overlay into `img` (the camera view or the combined
+    canvas) with the camera's top-left at `origin`. plan None = nothing."""
+    if plan is None:
+        return
+    ox, oy = origin
+    iw, ih = CAM_WIDTH, CAM_HEIGHT
+    colors, styled, cs, verifying = plan
+    if verifying:
+        compositor.blend_image(img, compositor.bar_background(iw), ox, oy + ih - 8)
+    draw = ImageDraw.Draw(img, 'RGBA')
+
+    for color in colors:
+        x, y = color['coords']; x += ox; y += oy
+        if mode == 'center':
+            draw.line([(x-20,y),(x+20,y)], fill=(0,255,0,255), width=2)
+            draw.line([(x,y-20),(x,y+20)], fill=(0,255,0,255), width=2)
+        elif mode == 'grid':
+            draw.ellipse([x-10,y-10,x+10,y+10],
+                         fill=(color['r'],color['g'],color['b'],255))
+
+    sfont = compositor.font(14)
+    for b, box_color, text_bg, status_tag in styled:
+        x1,y1,x2,y2 = b['box']
+        draw.rectangle([ox+x1,oy+y1,ox+x2,oy+y2], outline=box_color, width=3)
+        text = f"{b['label']} {b['conf']*100:.0f}% {b['side']} | {status_tag}"
+        tw   = len(text) * 8
+        draw.rectangle([ox+x1, oy+max(0,y1-22), ox+x1+tw, oy+y1], fill=text_bg)
+        draw.text((ox+x1+2, oy+max(0,y1-20)), text, fill=(255,255,255,255), font=sfont)
+
+    if verifying:
+        pct = min(1.0, cs["elapsed"] / CRASH_CONFIRM_SECONDS)
+        draw.rectangle([ox, oy+ih-8, ox+int(iw * pct), oy+ih],
+                       fill=(255, int(255*(1-pct)), 0, 220))
+
+# ─────────────────── COMPOSE FRAMES ─────────────────
+# One reused canvas: both camera views are pasted in (resized only if they
+# are not already CAM_WIDTH×CAM_HEIGHT), overlays are drawn in place and the
+# combined JPEG is encoded once. Only overlay_worker touches it.
+# The canvas is COMBINED_W × (CAM_HEIGHT + HEADER_H) = 1280×512: the 32 px
+# header is the one combine_frames always drew, and — unlike 28 px (which
+# would make it 1280×508) — it is a whole number of 16 px JPEG MCU rows,
+# which stitch_combined needs to stack the header strip on the cameras.
+HEADER_H = 32
+combined_canvas = Image.new('RGB', (COMBINED_W, COMBINED_H + HEADER_H), (10, 10, 10))
+
+def compose_frames(frames, mode='center', want=(), combined=True):
+    """
+    Render the combined view from one Frame per camera (None → blank half).
+    Returns (combined JPEG, {cam: derived Frame}) with a per-camera overlay
+    Frame only for cameras in `want`; one with nothing dynamic on it is the
+    camera JPEG with the badge spliced in (OVERLAY_FAST_PATH). combined=False
+    renders only the wanted cameras and returns (None, {...}).
+    """
+    t0 = time.perf_counter()
+    canvas = combined_canvas
+    per_cam, encode_s = {}, 0.0
+    for idx, frame in enumerate(frames):
+        tc = time.perf_counter()
+        ox, oy = idx * CAM_WIDTH, HEADER_H
+        box = (ox, oy, ox + CAM_WIDTH, oy + CAM_HEIGHT)
+        if not combined and (frame is None or idx not in want):
+            continue
+        if frame is None:
+            canvas.paste((10, 10, 10), box)
+            continue
+        plan = overlay_plan(idx)
+        spliced = idx in want and plan is None and OVERLAY_FAST_PATH and \
+                  badged_jpeg(idx, frame.jpeg)
+        if spliced:
+            compositor.record(idx, passthrough=True)
+            per_cam[idx] = frame.derive(spliced)
+            if not combined:
+                continue        # nothing to decode at all
+        img = frame_image(frame)
+        if img.size != (CAM_WIDTH, CAM_HEIGHT):
+            img = img.resize((CAM_WIDTH, CAM_HEIGHT), Image.LANCZOS)
+        canvas.paste(img, box[:2])
+        canvas.paste(badge_tile(idx), box[:2])
+        draw_overlay(canvas, idx, plan, mode, (ox, oy))
+        if idx not in want or spliced:
+            continue
+        # crop before the next camera is pasted: a label running past the
+        # right edge is still in this view
+        te = time.perf_counter()
+        view = canvas.crop(box)
+        out  = io.BytesIO()
+        view.save(out, format='JPEG', quality=92)
+        encode_s += time.perf_counter() - te
+        compositor.record(idx, False, te - tc, time.perf_counter() - te)
+        per_cam[idx] = frame.derive(out.getvalue(), view)
+    if not combined:
+        return None, per_cam
+
+    canvas.paste(compositor.header(COMBINED_W, HEADER_H, (
+        ("◀ FRONT", (8, 8),             (0, 200, 255)),
+        ("REAR ▶",  (CAM_WIDTH + 8, 8), (255, 120, 0))), divider_x=CAM_WIDTH), (0, 0))
+    draw = ImageDraw.Draw(canvas)
+    draw.line([(CAM_WIDTH,HEADER_H),(CAM_WIDTH,COMBINED_H+HEADER_H)], fill=(40,40,40), width=2)
+    ts = time.strftime("%Y-%m-%d  %H:%M:%S")
+    draw.text((COMBINED_W//2 - 90, 8), ts, fill=(180,180,180), font=compositor.font(18))
+    te = time.perf_counter()
+    out = io.BytesIO()
+    canvas.save(out, format='JPEG', quality=92)
+    compositor.record("combined", False, te - t0 - encode_s, time.perf_counter() - te)
+    return out.getvalue(), per_cam
+
+stitch_stats = {"stitched": 0, "fallback": 0, "reason": None, "ms": None,
+                "retry_at": 0.0}
+_stitch_header = {"key": None, "jpeg": None}
+STITCH_NO_DRI  = "camera JPEGs have no restart markers (DRI)"
+
+def stitch_header(ref_jpeg):
+    """Header strip (labels + timestamp) encoded to stitch above `ref_jpeg`;
+    re-encoded only when the second ticks over."""
+    ts  = time.strftime("%Y-%m-%d  %H:%M:%S")
+    key = (ts, ref_jpeg[:ref_jpeg.find(b'\xff\xda')])   # marker segments: tables, size, DRI
+    if _stitch_header["key"] != key:
+        img = compositor.header(COMBINED_W, HEADER_H, (
+            ("◀ FRONT", (8, 8),             (0, 200, 255)),
+            ("REAR ▶",  (CAM_WIDTH + 8, 8), (255, 120, 0))), divider_x=CAM_WIDTH).copy()
+        ImageDraw.Draw(img).text((COMBINED_W//2 - 90, 8), ts, fill=(180,180,180),
+                                 font=compositor.font(18))
+        _stitch_header.update(key=key, jpeg=encode_like(img, ref_jpeg))
+    return _stitch_header["jpeg"]
+
+def stitch_combined(frames, mode='center', want=()):
+    """
+    compose_frames() in the JPEG domain: halves with nothing dynamic are the
+    camera JPEGs with the badge tile spliced in, drawn halves are re-encoded
+    with the camera's tables, and header + halves are spliced (jpeg_stitch). Returns the same
+    (combined JPEG, {cam: Frame}) or None when the streams cannot be stitched.
+    """
+    now = time.monotonic()
+    if now < stitch_stats["retry_at"]:
+        return None
+    # no DRI segment before the scan: a property of the encoder, not worth
+    # a full parse every STITCH_RETRY_S
+    if any(b'\xff\xdd' not in f.jpeg[:f.jpeg.find(b'\xff\xda')] for f in frames):
+        if stitch_stats["reason"] != STITCH_NO_DRI:
+            print(f"[STITCH] Unavailable: {STITCH_NO_DRI}; combined view uses the pixel path")
+            stitch_stats["reason"] = STITCH_NO_DRI
+        stitch_stats["fallback"] += 1
+        return None
+    t0 = time.perf_counter()
+    sizes = [Image.open(io.BytesIO(f.jpeg)).size for f in frames]   # header only
+    reason = None if all(sz == (CAM_WIDTH, CAM_HEIGHT) for sz in sizes) else \
+             f"frame size {sizes} is not {CAM_WIDTH}x{CAM_HEIGHT}"
+    reason = reason or why_not([f.jpeg for f in frames])
+    parts, per_cam = [], {}
+    for idx, frame in enumerate(frames):
+        if reason: break
+        plan = overlay_plan(idx)
+        if plan is None:
+            jpeg = badged_jpeg(idx, frame.jpeg)
+            if jpeg is None:
+                reason = "badge tile does not line up with the restart intervals"; break
+            parts.append(jpeg)
+            if idx in want:
+                compositor.record(idx, passthrough=True)
+                per_cam[idx] = frame.derive(jpeg)
+            continue
+        tc   = time.perf_counter()
+        img  = frame_image(frame).copy()
+        img.paste(badge_tile(idx), (0, 0))
+        draw_overlay(img, idx, plan, mode)
+        te   = time.perf_counter()
+        jpeg = encode_like(img, frame.jpeg)
+        if jpeg is None:
+            reason = "overlay re-encode does not match the camera tables"; break
+        compositor.record(idx, False, te - tc, time.perf_counter() - te)
+        parts.append(jpeg)
+        if idx in want:
+            per_cam[idx] = frame.derive(jpeg, img)
+    if not reason:
+        row    = stitch_h(parts)
+        header = row and stitch_header(parts[0])
+        jpeg   = header and stitch_v([header, row])
+        reason = None if jpeg else \
+                 "camera halves do not stitch" if not row else \
+                 "header strip does not match the camera tables"
+    if reason:
+        if stitch_stats["reason"] != reason:
+            print(f"[STITCH] Pixel path: {reason}")
+        stitch_stats.update(fallback=stitch_stats["fallback"] + 1, reason=reason,
+                            retry_at=now + STITCH_RETRY_S)
+        return None
+    ms = (time.perf_counter() - t0) * 1000
+    stitch_stats.update(stitched=stitch_stats["stitched"] + 1, reason=None,
+                        ms=ms if stitch_stats["ms"] is None
+                           else stitch_stats["ms"] + 0.1 * (ms - stitch_stats["ms"]))
+    return jpeg, per_cam
 
 # ─────────────────── CAMERA THREAD ──────────────────
 def kill_existing_cameras():
@@ -311,63 +695,45 @@ def kill_existing_cameras():
         time.sleep(1)
     except Exception: pass
 
+def make_source(cam_idx):
+    if CAMERA_SOURCE == 'rpicam':
+        return RpicamSource(cam_idx, CAM_WIDTH, CAM_HEIGHT, CAM_FPS, quality=90)
+    if CAMERA_SOURCE == 'dual':
+        if RAW_REPLAY:
+            mjpeg_path, raw_path = RAW_REPLAY[cam_idx]
+            return FileDualCapture(mjpeg_path, raw_path, RAW_WIDTH, RAW_HEIGHT, CAM_FPS)
+        return Picamera2DualCapture(cam_idx, (CAM_WIDTH, CAM_HEIGHT),
+                                    (RAW_WIDTH, RAW_HEIGHT), CAM_FPS, quality=90)
+    if CAMERA_SOURCE == 'file':
+        return MjpegFileSource(REPLAY_FILES[cam_idx], fps=REPLAY_FPS)
+    if CAMERA_SOURCE == 'synthetic':
+        return SyntheticSource(cam_idx, CAM_WIDTH, CAM_HEIGHT, CAM_FPS)
+    raise ValueError(f"Unknown CAMERA_SOURCE {CAMERA_SOURCE!r}")
+
 def camera_thread(cam_idx):
     cam = cameras[cam_idx]
     consecutive_failures = 0
     while True:
-        process = None; frames_captured = 0
-        set_cam_status(cam_idx, "Starting...")
+        source = None; frames_captured = 0
+        set_cam_status(cam_idx, f"Starting ({CAMERA_SOURCE})...")
         try:
-            process = subprocess.Popen(
-                ['rpicam-vid', '-t', '0',
-                 '--camera',    str(cam_idx),
-                 '--width',     str(CAM_WIDTH),
-                 '--height',    str(CAM_HEIGHT),
-                 '--framerate', str(CAM_FPS),
-                 '--codec',     'mjpeg',
-                 '--quality',   '90',
-                 '--sharpness', '2.0',   # ← sharp!
-                 '--contrast',  '1.1',   # ← pop
-                 '--awb',       'auto',  # ← correct white balance
-                 '--inline', '--nopreview', '--denoise', 'off',
-                 '--flush', '1', '-o', '-'],
-                stdout=subprocess.PIPE, stderr=subprocess.PIPE, bufsize=0)
-            SOI=b'\xff\xd8'; EOI=b'\xff\xd9'; buffer=b''
-            last_frame_time=time.time()
+            source = make_source(cam_idx)
             set_cam_status(cam_idx,"Waiting for first frame...")
-            while True:
-                if time.time()-last_frame_time>10:
-                    set_cam_status(cam_idx,"Watchdog: no frame 10s, restarting..."); break
-                try: chunk=process.stdout.read(8192)
-                except Exception as e: set_cam_status(cam_idx,f"Read error: {e}"); break
-                if not chunk:
-                    err=process.stderr.read(2048).decode(errors='replace').strip()
-                    set_cam_status(cam_idx,f"Process ended. {err or '(none)'}");
-                    with cam["frame_lock"]: cam["latest_frame"]=None; break
-                buffer+=chunk
-                if len(buffer)>4*1024*1024: buffer=b''; continue
-                while True:
-                    soi=buffer.find(SOI)
-                    if soi==-1: break
-                    eoi=buffer.find(EOI,soi+2)
-                    if eoi==-1: break
-                    frame=buffer[soi:eoi+2]; buffer=buffer[eoi+2:]
-                    if len(frame)<1024: continue
-                    last_frame_time=time.time(); frames_captured+=1
-                    with cam["frame_lock"]:
-                        cam["latest_frame"]=frame
-                        if not cam["frame_ready"].is_set():
-                            cam["frame_ready"].set()
-                            set_cam_status(cam_idx,"Streaming!")
-        except FileNotFoundError:
-            set_cam_status(cam_idx,"ERROR: rpicam-vid not found!"); time.sleep(10); continue
+            for jpeg, raw in source:
+                frames_captured+=1
+                publish_frame(cam_idx, jpeg, raw)
+            set_cam_status(cam_idx,"Capture ended.")
+        except FileNotFoundError as e:
+            set_cam_status(cam_idx,f"ERROR: {e.filename} not found!"); time.sleep(10); continue
+        except TimeoutError:
+            set_cam_status(cam_idx,"Watchdog: no frame 10s, restarting...")
+        except EOFError as e: set_cam_status(cam_idx,str(e))
+        except OSError as e: set_cam_status(cam_idx,f"Read error: {e}")
         except Exception as e: set_cam_status(cam_idx,f"Error: {e}")
         finally:
-            if process:
-                try: process.terminate(); process.wait(timeout=3)
-                except Exception:
-                    try: process.kill()
-                    except Exception: pass
+            if source: source.close()
+            # whatever ended the capture, the last frame is no longer live
+            cam["frames"].publish(None)
         consecutive_failures = 0 if frames_captured>0 else consecutive_failures+1
         delay=min(15,2*(consecutive_failures+1))
         set_cam_status(cam_idx,f"Restarting in {delay}s...")
@@ -375,64 +741,118 @@ def camera_thread(cam_idx):
 
 # ─────────────────── WORKERS ─────────────────────────
 def overlay_worker():
-    last={0:None,1:None}; skip={0:0,1:0}
+    subs=[cameras[idx]["frames"].subscribe(tracker=frame_tracker(f"overlay{idx}"))
+          for idx in (0,1)]
+    skip={0:0,1:0}
+    combined_seq=0
     while True:
-        time.sleep(0.033)
-        for idx in (0,1):
-            cam=cameras[idx]
-            with cam["frame_lock"]: frame=cam["latest_frame"]
-            if frame is None or frame is last[idx]: continue
-            last[idx]=frame
+        ready=wait_any(subs,timeout=1.0)
+        fresh=False
+        for idx,frame in enumerate(ready):
+            if frame is None or subs[idx].tracker.too_old(MAX_FRAME_AGE): continue
             if color_detection_enabled and skip[idx]%2==0:
                 detect_colors_in_frame(idx,frame,detection_mode)
-            skip[idx]+=1
-            rendered=add_overlay(idx,frame,detection_mode)
-            with cam["overlay_lock"]: cam["overlay_frame"]=rendered
-        def get_best(idx):
-            with cameras[idx]["overlay_lock"]: f=cameras[idx]["overlay_frame"]
-            if f is None:
-                with cameras[idx]["frame_lock"]: f=cameras[idx]["latest_frame"]
-            return f
-        f0=get_best(0); f1=get_best(1)
-        if f0 and f1:
-            combined=combine_frames(f0,f1)
-            with combined_frame_lock:
-                global combined_frame; combined_frame=combined
-            if not combined_ready.is_set(): combined_ready.set()
+            skip[idx]+=1; fresh=True
+        if not fresh: continue
+        latest=[cameras[idx]["frames"].latest() for idx in (0,1)]
+        # Render only what someone is consuming: per-camera JPEGs for a new
+        # frame on a watched camera, the combined view while it has a stream,
+        # WebRTC track, uploader or snapshot lease
+        want=[idx for idx in (0,1) if ready[idx] is not None
+              and cameras[idx]["overlays"].wanted()]
+        combined=all(latest) and combined_bus.wanted()
+        if not want and not combined:
+            render_stats["idle"]+=1; continue
+        render_stats["rendered"]+=1
+        try:
+            out=None
+            if COMBINED_STITCH and combined:
+                out=stitch_combined(latest,detection_mode,want)
+            jpeg,per_cam=out or compose_frames(latest,detection_mode,want,combined)
+        except Exception as e:
+            print(f"Compose error: {e}"); continue
+        for idx,f in per_cam.items():
+            cameras[idx]["overlays"].publish(f)
+        if combined:
+            combined_seq+=1
+            combined_bus.publish(Frame(None,combined_seq,jpeg,
+                                       ts=min(f.ts for f in latest)))
+
+def fresh_frame(bus):
+    """Frame for a one-off reader (snapshot): takes a demand lease so the
+    overlay worker renders, and waits briefly if the last render is stale."""
+    bus.want(DEMAND_HOLD_S)
+    return bus.wait_fresh(MAX_FRAME_AGE, timeout=SNAPSHOT_WAIT_S)
 
 def ml_worker():
-    last={0:None,1:None}
+    subs=[cameras[idx]["frames"].subscribe(tracker=frame_tracker(f"ml{idx}"))
+          for idx in (0,1)]
     while True:
-        time.sleep(0.033)
+        ready=wait_any(subs,timeout=1.0)
+        lm=model_manager.current            # one model for the whole pass
+        if lm is None: continue             # still loading (or failed)
         if not ml_detection_enabled:
             with confirm_lock:
                 for idx in (0,1):
+                    crash_trackers[idx].reset()
                     confirm_state[idx].update({
                         "first_seen":None,"elapsed":0.0,
                         "confirmed":False,"confirmed_at":None,"boxes":[]})
             continue
-        for idx in (0,1):
-            with cameras[idx]["frame_lock"]: frame=cameras[idx]["latest_frame"]
-            if frame is None or frame is last[idx]: continue
-            last[idx]=frame
-            detect_accidents_in_frame(idx,frame)
+        # Give the other camera a moment to deliver so both share one predict
+        if None in ready and any(ready):
+            late=wait_any([s for s,f in zip(subs,ready) if f is None],timeout=ML_BATCH_WAIT)
+            it=iter(late); ready=[f if f is not None else next(it) for f in ready]
+        fresh=[f if f is not None and not subs[idx].tracker.too_old(MAX_FRAME_AGE)
+               else None for idx,f in enumerate(ready)]
+        batch=ml_scheduler.due(fresh)
+        if MOTION_GATE_ENABLED:
+            batch=[f for f in batch
+                   if motion_gate.should_infer(f,force=crash_candidate(f.cam))]
+        if ML_GATE and batch:
+            # Cheap pass first; only likely crashes (and safety-net runs) go on.
+            # Its cost feeds the "gate" tier latency only — a gate pass is
+            # not an inference run — but every frame it looks at restarts its
+            # camera's interval, so gating stays within the scheduled rate
+            ml_scheduler.mark_checked(batch)
+            t0=time.monotonic()
+            try:
+                batch=crash_gate.select(batch,frame_to_rgb,lm.gate,lm.gate_ids,
+                                        force=crash_candidate)
+                ml_scheduler.record_latency("gate",time.monotonic()-t0,crash_gate.last_checked)
+            except Exception as e:
+                print(f"ML gate error: {e}")        # fail open: run the full model
+        # One predict per inference size (both cameras share one when equal)
+        groups={}
+        for f in batch:
+            imgsz,roi=ml_plan(f.cam)
+            roi_runs[f.cam]=roi_runs[f.cam]+1 if roi else 0
+            groups.setdefault((imgsz,ml_tier(imgsz,roi)),[]).append((f,roi))
+        for (imgsz,tier),group in groups.items():
+            t0=time.monotonic()
+            detect_accidents_batch([f for f,_ in group],imgsz,[roi for _,roi in group],lm)
+            ml_scheduler.record([f for f,_ in group],time.monotonic()-t0,tier=tier)
 
 # ─────────────────── CLOUD SENDER ───────────────────
 def cloud_sender():
     if not CLOUD_ENABLED: return
     session=req_lib.Session()
     session.headers.update({"X-Secret":PUSH_SECRET})
-    lf=ls=lg=lm=0; last_sent=None
+    lf=ls=lg=lm=0; sent=frame_tracker("cloud")
     print(f"[CLOUD] Sender started → {CLOUD_URL}")
     while True:
         now=time.time()
         if now-lf>=1.0:
-            with combined_frame_lock: frame=combined_frame
-            if frame and frame is not last_sent:
+            # Short lease only at the send tick (wait_fresh's subscription
+            # holds demand while it waits): a standing lease would re-render
+            # the combined view on every camera frame for a 1 fps upload
+            combined_bus.want(CLOUD_LEASE_S)
+            frame=combined_bus.wait_fresh(CLOUD_FRAME_AGE,timeout=SNAPSHOT_WAIT_S)
+            if frame and frame.seq>sent.last_seq:
                 try:
-                    r=session.post(f"{CLOUD_URL}/push/frame",data=frame,
+                    r=session.post(f"{CLOUD_URL}/push/frame",data=frame.jpeg,
                                    headers={"Content-Type":"image/jpeg"},timeout=8)
-                    if r.status_code==200: last_sent=frame; lf=now
+                    if r.status_code==200: sent.is_new(frame); lf=now
                     elif r.status_code==401: print("[CLOUD] ❌ Wrong secret")
                 except Exception as e: print(f"[CLOUD] Frame: {e}")
         if now-lm>=0.5:
@@ -482,29 +902,25 @@ def gps_worker():
 # ─────────────────── FRAME GENERATORS ────────────────
 def _gen_single(cam_idx):
     cameras[cam_idx]["frame_ready"].wait(timeout=15)
-    last=None; stall=0
-    while True:
-        with cameras[cam_idx]["overlay_lock"]: frame=cameras[cam_idx]["overlay_frame"]
-        if frame is None:
-            with cameras[cam_idx]["frame_lock"]: frame=cameras[cam_idx]["latest_frame"]
-        if frame is None or frame is last:
-            stall+=1
-            if stall>450: return
-            time.sleep(0.033); continue
-        stall=0; last=frame
-        yield b'--frame\r\nContent-Type: image/jpeg\r\n\r\n'+frame+b'\r\n'
+    # fresh: the last overlay frame may be from before rendering went idle
+    sub=cameras[cam_idx]["overlays"].subscribe(fresh=True)
+    try:
+        while True:
+            frame=sub.get(timeout=STREAM_STALL_SECONDS)
+            if frame is None: return
+            yield b'--frame\r\nContent-Type: image/jpeg\r\n\r\n'+frame.jpeg+b'\r\n'
+    finally:
+        sub.close()   # stops the per-camera encode once nobody watches
 
 def generate_combined():
-    combined_ready.wait(timeout=20)
-    last=None; stall=0
-    while True:
-        with combined_frame_lock: frame=combined_frame
-        if frame is None or frame is last:
-            stall+=1
-            if stall>450: return
-            time.sleep(0.033); continue
-        stall=0; last=frame
-        yield b'--frame\r\nContent-Type: image/jpeg\r\n\r\n'+frame+b'\r\n'
+    sub=combined_bus.subscribe(fresh=True)
+    try:
+        frame=sub.get(timeout=20)
+        while frame is not None:
+            yield b'--frame\r\nContent-Type: image/jpeg\r\n\r\n'+frame.jpeg+b'\r\n'
+            frame=sub.get(timeout=STREAM_STALL_SECONDS)
+    finally:
+        sub.close()
 
 # ─────────────────── ROUTES ─────────────────────────
 @app.route('/stream')
@@ -521,28 +937,34 @@ def stream_rear():
 
 @app.route('/snapshot.jpg')
 def snapshot():
-    with combined_frame_lock: frame=combined_frame
+    frame=fresh_frame(combined_bus)
     if frame is None: return "No frame",503
-    return Response(frame,mimetype='image/jpeg')
+    return Response(frame.jpeg,mimetype='image/jpeg')
 
 @app.route('/snapshot/<int:cam_idx>.jpg')
 def snapshot_cam(cam_idx):
     if cam_idx not in cameras: return "Invalid camera",404
-    with cameras[cam_idx]["overlay_lock"]: frame=cameras[cam_idx]["overlay_frame"]
-    if frame is None:
-        with cameras[cam_idx]["frame_lock"]: frame=cameras[cam_idx]["latest_frame"]
+    frame=fresh_frame(cameras[cam_idx]["overlays"]) or cameras[cam_idx]["frames"].latest()
     if frame is None: return "No frame",503
-    return Response(frame,mimetype='image/jpeg')
+    return Response(frame.jpeg,mimetype='image/jpeg')
 
 @app.route('/detection',methods=['GET','POST'])
 def detection():
-    global color_detection_enabled,detection_mode
+    global color_detection_enabled,detection_mode,COLOR_GRID
     if request.method=='POST':
         d=request.get_json()
+        if 'grid' in d:
+            try:
+                rows,cols=(int(v) for v in d['grid'])
+            except (TypeError,ValueError):
+                return jsonify({'success':False,'error':'grid must be [rows, cols]'}),400
+            COLOR_GRID=(min(max(rows,1),COLOR_GRID_MAX),min(max(cols,1),COLOR_GRID_MAX))
         color_detection_enabled=d.get('enabled',False)
         detection_mode=d.get('mode','center')
-        return jsonify({'success':True,'enabled':color_detection_enabled,'mode':detection_mode})
-    return jsonify({'enabled':color_detection_enabled,'mode':detection_mode})
+        return jsonify({'success':True,'enabled':color_detection_enabled,
+                        'mode':detection_mode,'grid':list(COLOR_GRID)})
+    return jsonify({'enabled':color_detection_enabled,'mode':detection_mode,
+                    'grid':list(COLOR_GRID)})
 
 @app.route('/ml',methods=['GET','POST'])
 def ml_toggle():
@@ -570,12 +992,51 @@ def get_ml_results():
             }
             for idx in (0, 1)
         }
-    return jsonify({"front": cs[0], "rear": cs[1]})
+    return jsonify({"front": cs[0], "rear": cs[1], "model": model_manager.status()})
+
+@app.route('/model')
+def get_model():
+    return jsonify(model_manager.status())
+
+@app.route('/model/reload', methods=['POST'])
+def reload_model():
+    """Body (optional): {"path": "accident_model_v2.pt"} — a model file in the
+    server directory; default reloads the configured MODEL_PATH."""
+    path = (request.get_json(silent=True) or {}).get("path", MODEL_PATH)
+    if os.path.basename(path) != path or not path.endswith(('.pt', '.torchscript', '.onnx')):
+        return jsonify({"error": "path must be a .pt/.torchscript/.onnx file name"}), 400
+    if not os.path.isfile(path):
+        return jsonify({"error": f"{path} not found"}), 404
+    if not model_manager.load(path):
+        return jsonify({"error": "a load is already in progress",
+                        **model_manager.status()}), 409
+    return jsonify(model_manager.status()), 202
 
 @app.route('/status')
 def get_status():
     return jsonify({'front':cameras[0]["status"],'rear':cameras[1]["status"]})
 
+@app.route('/frame_stats')
+def get_frame_stats():
+    stats={name:t.as_dict() for name,t in list(frame_stats.items())}
+    stats["decode_cache"]=decode_cache.stats()
+    lm=model_manager.current
+    if lm and isinstance(lm.model,InferenceProcess): stats["inference"]=lm.model.stats()
+    if lm and isinstance(lm.model,RemoteModel): stats["remote"]=lm.model.stats()
+    stats["ml_scheduler"]=ml_scheduler.stats()
+    stats["startup"]=startup_times
+    if MOTION_GATE_ENABLED: stats["motion_gate"]=motion_gate.stats()
+    if ML_GATE: stats["crash_gate"]=crash_gate.stats()
+    stats["overlay"]=compositor.stats()
+    stats["colors"]=color_engine.stats()
+    stats["render"]=dict(render_stats,demand={
+        bus.name:{"subscribers":bus.subscribers,"wanted":bus.wanted()}
+        for bus in (cameras[0]["overlays"],cameras[1]["overlays"],combined_bus)})
+    if COMBINED_STITCH:
+        stats["stitch"]={k:(round(v,2) if k=="ms" and v is not None else v)
+                         for k,v in stitch_stats.items() if k!="retry_at"}
+    return jsonify(stats)
+
 @app.route('/gps')
 def get_gps():
     with gps_state_lock: return jsonify(gps_state)
@@ -900,6 +1361,11 @@ function updateML(){
     confirmSecs = (data.front?.confirm_secs || data.rear?.confirm_secs || 3);
     document.getElementById('lbl-threshold').innerText = confirmSecs+'s';
     let html='';
+    const m=data.model;
+    if(m&&!m.version){
+      html+=`<div class="ml-none" style="margin:4px 0 8px 0;color:var(--${m.state==='error'?'red':'yellow'})">
+        ${m.state==='error'?'⚠ MODEL FAILED: '+m.error:'⏳ MODEL LOADING…'}</div>`;
+    }
     ['front','rear'].forEach(key=>{
       const d=data[key], idx=key==='front'?0:1;
       const label=key==='front'?'FRONT':'REAR';
@@ -1008,11 +1474,72 @@ document.getElementById('btn-mode-c').className='btn active-cyan';
 </html>'''
     return render_template_string(html)
 
+# ─────────────────── MODEL LOADER ───────────────────
+def build_model(path):
+    """Import, load and warm up `path`; ModelManager swaps it in when done."""
+    first = model_manager.current is None
+    timings = {}
+    print(f"Loading ML model ({path})...")
+    t0 = time.monotonic()
+    if ML_REMOTE_URL:
+        m = RemoteModel(ML_REMOTE_URL, deadline=ML_REMOTE_DEADLINE,
+                        fallback_loader=lambda: load_model(path, prealloc=ML_PREALLOC))
+    elif ML_OUT_OF_PROCESS:
+        # Same predict()/names interface, frames go through shared memory;
+        # the child does its own imports
+        m = InferenceProcess(path, slot_shape=(CAM_HEIGHT, CAM_WIDTH, 3),
+                             slots=2, threads=ML_PROC_THREADS).start()
+    else:
+        if not path.endswith('.onnx'):
+            import ultralytics   # noqa: F401 — torch import, timed on its own
+            timings["import_s"] = round(time.monotonic() - t0, 2)
+            if first: boot_mark("ml imports")
+            t0 = time.monotonic()
+        m = load_model(path, prealloc=ML_PREALLOC)
+    timings["load_s"] = round(time.monotonic() - t0, 2)
+    if first: boot_mark("model loaded")
+    if getattr(m, "fixed_size", None):
+        # fixed-size export (TorchScript, static ONNX): every imgsz below is
+        # clamped to it, so the scan, gate and ROI tiers cost a full run
+        print(f"[ML] {path} only runs at {m.fixed_size}px; cascade/gate/ROI sizes are ignored")
+
+    try:
+        crash_ids = [int(i) for i, n in m.names.items() if n == CRASH_LABEL]
+        if not crash_ids:
+            raise ValueError(f"model has no '{CRASH_LABEL}' class: {m.names}")
+        gate = gate_ids = None
+        if ML_GATE and ML_GATE_MODEL:
+            # Always in-process: it exists to be cheaper than a round trip
+            gate = load_model(ML_GATE_MODEL, prealloc=ML_PREALLOC)
+            gate_ids = [int(i) for i, n in gate.names.items() if n == CRASH_LABEL]
+            if not gate_ids:
+                raise ValueError(f"gate model has no '{CRASH_LABEL}' class: {gate.names}")
+
+        # First predict pays for lazy init / allocator warm-up — do it now,
+        # with the batch shape ml_worker will use
+        t0 = time.monotonic()
+        blank = np.zeros((CAM_HEIGHT, CAM_WIDTH, 3), dtype=np.uint8)
+        for imgsz in sorted({ML_IMGSZ_SCAN if ML_CASCADE else ML_IMGSZ_VERIFY,
+                             ML_IMGSZ_VERIFY}):
+            m.predict(source=[blank, blank], imgsz=imgsz, conf=0.5,
+                      classes=crash_ids, verbose=False)
+        if ML_GATE:
+            (gate or m).predict(source=[blank, blank], imgsz=ML_GATE_IMGSZ, conf=0.05,
+                                classes=gate_ids or crash_ids, verbose=False)
+        timings["warmup_s"] = round(time.monotonic() - t0, 2)
+    except Exception:
+        if hasattr(m, 'close'): m.close()
+        raise
+    if first: boot_mark("model warm")
+    print(f"Model ready! {timings}")
+    return LoadedModel(m, path, crash_ids, timings, gate, gate_ids)
+
+model_manager = ModelManager(build_model)
+
 # ─────────────────── MAIN ───────────────────────────
 if __name__ == "__main__":
-    print("Loading ML model...")
-    model = YOLO("accident_model_latest.pt")
-    print("Model loaded!")
+    boot_mark("imports done")
+    model_manager.load(MODEL_PATH, background=ML_BACKGROUND_LOAD)
 
     ports = [5000, 5001, 8000, 8080]
     selected_port = next((p for p in ports if check_port(p)), None)
@@ -1020,7 +1547,8 @@ if __name__ == "__main__":
         print("No port available!"); exit(1)
 
     local_ip = get_local_ip()
-    kill_existing_cameras()
+    if CAMERA_SOURCE in ('rpicam', 'dual'):
+        kill_existing_cameras()
 
     for idx in (0, 1):
         threading.Thread(target=camera_thread, args=(idx,), daemon=True).start()
@@ -1030,8 +1558,9 @@ if __name__ == "__main__":
     threading.Thread(target=cloud_sender,   daemon=True).start()
     threading.Thread(target=gps_worker,     daemon=True).start()
 
-    cameras[0]["frame_ready"].wait(timeout=15)
-    cameras[1]["frame_ready"].wait(timeout=5)
+    if not ML_BACKGROUND_LOAD:
+        cameras[0]["frame_ready"].wait(timeout=15)
+        cameras[1]["frame_ready"].wait(timeout=5)
 
     import logging
     logging.getLogger('werkzeug').setLevel(logging.WARNING)
@@ -1042,10 +1571,14 @@ if __name__ == "__main__":
     print(f"  Combined:   http://{local_ip}:{selected_port}/stream")
     print(f"  Front:      http://{local_ip}:{selected_port}/stream/front")
     print(f"  Rear:       http://{local_ip}:{selected_port}/stream/rear")
+    print(f"  Source:     {CAMERA_SOURCE}")
+    print(f"  Inference:  {ML_BACKEND}, " + (f"remote {ML_REMOTE_URL}" if ML_REMOTE_URL else
+                                         'worker process' if ML_OUT_OF_PROCESS else 'in-process'))
     print(f"  Resolution: {CAM_WIDTH}x{CAM_HEIGHT} per camera")
     print(f"  Quality:    rpicam=90, PIL=92, Sharpness=2.0")
     print(f"  Confirm:    {CRASH_CONFIRM_SECONDS}s hold required")
     print(f"  Cooldown:   {CRASH_COOLDOWN_SECONDS}s after confirmed alert")
     print(f"{'='*55}\n")
 
+    boot_mark("http starting")
     app.run(host='0.0.0.0', port=selected_port, threaded=True)
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+camera_sources.py — pluggable frame sources for camera_thread.
+
+A source is an iterable of (jpeg_bytes, raw) pairs with a close() method;
+raw is a YUV420 array for dual-output sources and None otherwise.
+
+  RpicamSource      rpicam-vid --codec mjpeg on a CSI camera (the default)
+  MjpegFileSource   replays an .mjpeg file (e.g. test.mjpeg), looping,
+                    at real-time fps or as fast as it can be read
+  SyntheticSource   generated test pattern, no files or camera needed
+
+plus the dual MJPEG+YUV sources in raw_capture.py. make_source() picks one
+from the server config, so the whole capture → ML → overlay → cloud
+pipeline runs on a Linux dev box:
+
+    CAMERA_SOURCE=file REPLAY_FPS=0 python camera-server.py   # max speed
+    CAMERA_SOURCE=synthetic python camera-server.py
+
+Throughput and per-stage frame age are then visible at /frame_stats.
+"""
+
+import abc
+import io
+import subprocess
+import threading
+import time
+
+from mjpeg_stream import MjpegDemuxer
+
+
+class CameraSource(abc.ABC):
+    """Base class: iterate for (jpeg, raw) pairs, close() to stop."""
+
+    name = "source"
+
+    def __init__(self):
+        self._stop = threading.Event()
+
+    @abc.abstractmethod
+    def __iter__(self):
+        """Yield (jpeg_bytes, raw) until closed or the device fails."""
+
+    def close(self):
+        self._stop.set()
+
+
+class _Pacer:
+    """Sleeps so successive tick() calls are 1/fps apart; fps=0 never sleeps."""
+
+    def __init__(self, fps):
+        self.period = 1.0 / fps if fps else 0.0
+        self.next_t = time.monotonic()
+
+    def tick(self):
+        if not self.period:
+            return
+        self.next_t += self.period
+        delay = self.next_t - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        else:
+            self.next_t = time.monotonic()   # fell behind: don't burst
+
+
+class RpicamSource(CameraSource):
+    name = "rpicam"
+
+    def __init__(self, cam_idx, width, height, fps, quality=90):
+        super().__init__()
+        self.cmd = ['rpicam-vid', '-t', '0',
+                    '--camera',    str(cam_idx),
+                    '--width',     str(width),
+                    '--height',    str(height),
+                    '--framerate', str(fps),
+                    '--codec',     'mjpeg',
+                    '--quality',   str(quality),
+                    '--sharpness', '2.0',   # ← sharp!
+                    '--contrast',  '1.1',   # ← pop
+                    '--awb',       'auto',  # ← correct white balance
+                    '--inline', '--nopreview', '--denoise', 'off',
+                    '--flush', '1', '-o', '-']
+        self.process = None
+
+    def __iter__(self):
+        # FileNotFoundError propagates: rpicam-vid is not installed
+        self.process = subprocess.Popen(self.cmd, stdout=subprocess.PIPE,
+                                        stderr=subprocess.PIPE, bufsize=0)
+        for jpeg in MjpegDemuxer(self.process.stdout, frame_timeout=10):
+            yield jpeg, None
+        err = self.process.stderr.read(2048).decode(errors='replace').strip()
+        raise EOFError(f"Process ended. {err or '(none)'}")
+
+    def close(self):
+        super().close()
+        if self.process:
+            try: self.process.terminate(); self.process.wait(timeout=3)
+            except Exception:
+                try: self.process.kill()
+                except Exception: pass
+            self.process = None
+
+
+class MjpegFileSource(CameraSource):
+    """fps > 0: paced real-time replay; fps = 0: as fast as frames are consumed."""
+
+    name = "file"
+
+    def __init__(self, path, fps=15, loop=True):
+        super().__init__()
+        self.path = path
+        self.fps  = fps
+        self.loop = loop
+
+    def __iter__(self):
+        pacer = _Pacer(self.fps)
+        while not self._stop.is_set():
+            n = 0
+            with open(self.path, 'rb') as f:
+                for jpeg in MjpegDemuxer(f):
+                    if self._stop.is_set():
+                        return
+                    pacer.tick()
+                    n += 1
+                    yield jpeg, None
+            if n == 0:
+                raise ValueError(f"{self.path}: no JPEG frames")
+            if not self.loop:
+                return
+
+
+class SyntheticSource(CameraSource):
+    """
+    Deterministic moving test pattern. A cycle of `period` frames is encoded
+    once up front, so replay cost is just the pacing — the encoder does not
+    show up in pipeline benchmarks.
+    """
+
+    name = "synthetic"
+
+    def __init__(self, cam_idx, width, height, fps=15, period=30, quality=90):
+        super().__init__()
+        self.cam_idx = cam_idx
+        self.width   = width
+        self.height  = height
+        self.fps     = fps
+        self.frames  = [self._render(i, period, quality) for i in range(period)]
+
+    def _render(self, i, period, quality):
+        from PIL import Image, ImageDraw
+        w, h = self.width, self.height
+        img  = Image.new('RGB', (w, h), (30, 40, 50) if self.cam_idx == 0 else (50, 40, 30))
+        draw = ImageDraw.Draw(img)
+        for x in range(0, w, 40):
+            draw.line([(x, 0), (x, h)], fill=(60, 70, 80))
+        bx = int((w - 80) * i / max(1, period - 1))
+        draw.rectangle([bx, h // 2 - 40, bx + 80, h // 2 + 40], fill=(220, 180, 0))
+        draw.text((8, h - 20), f"SYNTH CAM{self.cam_idx} {i:03d}", fill=(255, 255, 255))
+        out = io.BytesIO()
+        # a restart interval every 8 MCUs (128 px), so jpeg_stitch can join
+        # the cameras and splice in the 128×32 badge tile (Pillow < 11.1
+        # ignores the option)
+        img.save(out, format='JPEG', quality=quality, restart_marker_blocks=8)
+        return out.getvalue()
+
+    def __iter__(self):
+        pacer = _Pacer(self.fps)
+        i = 0
+        while not self._stop.is_set():
+            pacer.tick()
+            yield self.frames[i % len(self.frames)], None
+            i += 1
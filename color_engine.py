@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+color_engine.py — whole-frame color classification in one numpy pass.
+
+The old /colors path averaged a few patches and named each mean with
+colorsys, one pixel at a time. ColorEngine classifies every pixel of a
+downscaled frame and counts classes per grid cell:
+
+    engine = ColorEngine(step=4)                 # 640×480 → 160×120
+    cells  = engine.analyze(rgb, grid=(8, 8))    # row-major list of cells
+    cells[0]["name"], cells[0]["share"], cells[0]["hist"]
+
+  - no per-pixel float HSV: saturation and value depend only on the
+    (max, min) channel pair, hue class only on which channel is the max,
+    the signed difference of the other two and max - min — small lookup
+    tables over those, built with the thresholds and arithmetic of the old
+    rgb_to_color_name (only exact float ties on a hue edge can differ)
+  - one bincount over (cell, class) gives every cell's histogram; cells
+    are row × column bands, so two np.add.reduceat give their mean RGB
+  - a cell's "name" is its dominant class, "share" that class's fraction
+
+Run `python color_engine.py test.mjpeg` for timing against the per-patch
+colorsys loop.
+"""
+
+import time
+
+import numpy as np
+
+COLOR_NAMES = ("Black", "White", "Gray", "Red", "Orange", "Yellow", "Green",
+               "Cyan", "Blue", "Purple", "Magenta")
+_IDX = {n: i for i, n in enumerate(COLOR_NAMES)}
+
+# hue (whole degrees) → class; edges as in rgb_to_color_name
+_HUE_EDGES = ((15, "Red"), (45, "Orange"), (75, "Yellow"), (155, "Green"),
+              (185, "Cyan"), (250, "Blue"), (290, "Purple"), (345, "Magenta"),
+              (360, "Red"))
+
+
+def _build_luts():
+    # (max, min) → Black/White/Gray, or _CHROMATIC; s and v need nothing else
+    mx, mn = np.meshgrid(np.arange(256), np.arange(256), indexing='ij')
+    maxc, minc = mx / 255.0, mn / 255.0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        achrom = ((maxc - minc) / maxc) * 100 < 10
+    achrom |= mx == 0                                  # colorsys: s = 0 when black
+    v = maxc * 100
+    gray = np.where(v > 80, _IDX["White"], _IDX["Gray"])
+    sv = np.where(achrom, np.where(v < 20, _IDX["Black"], gray),
+                  np.where(v < 20, _IDX["Black"], _CHROMATIC))
+
+    # (sector, d, max - min) → hue class, as colorsys: sector 0/1/2 = R/G/B is
+    # the max channel, d = g-b / b-r / r-g, h = (2*sector + d/range) / 6
+    edges = np.empty(360, np.uint8)
+    lo = 0
+    for hi, name in _HUE_EDGES:
+        edges[lo:hi] = _IDX[name]
+        lo = hi
+    d, rng = np.arange(-255, 256)[:, None], np.arange(256)[None, :]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        h = np.stack([((2.0 * k + d / rng) / 6.0) % 1.0 * 360 for k in range(3)])
+    hue = edges[np.nan_to_num(h).astype(np.int16) % 360]
+    return sv.astype(np.uint8).ravel(), hue.ravel()
+
+
+_CHROMATIC = 255
+SV_LUT, HUE_LUT = _build_luts()                        # 64 KB, 392 KB
+
+
+def classify(rgb):
+    """Class index (into COLOR_NAMES) for every pixel of a uint8 (..., 3)
+    array. Integer max/min/difference, then two table lookups — no float
+    HSV per pixel."""
+    r, g, b = (rgb[..., k].astype(np.int16) for k in range(3))
+    mx = np.maximum(np.maximum(r, g), b)
+    mn = np.minimum(np.minimum(r, g), b)
+    sv = SV_LUT[mx.astype(np.uint16) << 8 | mn]
+    d = np.where(r == mx, g - b + 255, np.where(g == mx, b - r + 766, r - g + 1277))
+    hue = HUE_LUT[d.astype(np.int32) << 8 | (mx - mn)]
+    return np.where(sv == _CHROMATIC, hue, sv)
+
+
+class ColorEngine:
+    def __init__(self, step=4):
+        self.step    = step
+        self.calls   = 0
+        self.last_ms = None
+        self._layout = {}
+
+    def _cells(self, h, w, gy, gx):
+        """Cell index of every pixel, and the first row / column of each band."""
+        key = (h, w, gy, gx)
+        if key not in self._layout:
+            row = np.arange(h) * gy // h
+            col = np.arange(w) * gx // w
+            self._layout[key] = ((row[:, None] * gx + col[None, :]).ravel(),
+                                 np.searchsorted(row, np.arange(gy)).clip(max=h - 1),
+                                 np.searchsorted(col, np.arange(gx)).clip(max=w - 1))
+        return self._layout[key]
+
+    def analyze(self, rgb, grid=(3, 3), origin=(0, 0)):
+        """
+        Per-cell color summary of an RGB uint8 array, row-major. Each cell:
+        position, name (dominant class), share, hist {name: fraction},
+        mean r/g/b (+ rgb/rgba/hex strings) and coords (cell centre in the
+        source array's pixels, shifted by `origin`).
+        """
+        t0 = time.perf_counter()
+        gy, gx = grid
+        H, W = rgb.shape[:2]
+        small = rgb[::self.step, ::self.step]
+        h, w = small.shape[:2]
+        cell, rows, cols = self._cells(h, w, gy, gx)
+        ncell, ncls = gy * gx, len(COLOR_NAMES)
+
+        hist  = np.bincount(cell * ncls + classify(small).ravel(),
+                            minlength=ncell * ncls).reshape(ncell, ncls)
+        count = hist.sum(1)
+        # cells are row × column bands: two reduceats sum each one's RGB
+        sums  = np.add.reduceat(np.add.reduceat(small, rows, axis=0, dtype=np.int32),
+                                cols, axis=1).reshape(ncell, 3)
+        means = np.where(count[:, None] > 0, sums, 0) / np.maximum(count, 1)[:, None]
+        dom   = hist.argmax(1)
+        share = np.round(hist / np.maximum(count, 1)[:, None], 3).tolist()
+        rgbs  = means.astype(int).tolist()
+
+        out = []
+        for i in range(ncell):
+            cy, cx = divmod(i, gx)
+            r, g, b = rgbs[i]
+            sh = share[i]
+            out.append({
+                'position': 'center' if ncell == 1 else f'grid_{cy}_{cx}',
+                'name': COLOR_NAMES[dom[i]], 'share': sh[dom[i]],
+                'hist': {COLOR_NAMES[k]: v for k, v in enumerate(sh) if v},
+                'rgb': f'rgb({r},{g},{b})', 'rgba': f'rgba({r},{g},{b},1)',
+                'hex': f'#{r:02x}{g:02x}{b:02x}',
+                'coords': (origin[0] + int(W * (cx + 0.5) / gx),
+                           origin[1] + int(H * (cy + 0.5) / gy)),
+                'r': r, 'g': g, 'b': b})
+        self.calls  += 1
+        self.last_ms = (time.perf_counter() - t0) * 1000
+        return out
+
+    def stats(self):
+        return {"calls": self.calls, "step": self.step,
+                "last_ms": None if self.last_ms is None else round(self.last_ms, 2)}
+
+
+if __name__ == "__main__":
+    import colorsys
+    import io
+    import sys
+    from PIL import Image
+    from mjpeg_stream import MjpegDemuxer
+
+    def old_name(r, g, b):
+        h, s, v = colorsys.rgb_to_hsv(r / 255, g / 255, b / 255)
+        h = h * 360; s = s * 100; v = v * 100
+        if s < 10:
+            return "Black" if v < 20 else "White" if v > 80 else "Gray"
+        if v < 20:
+            return "Black"
+        for hi, name in _HUE_EDGES:
+            if h < hi:
+                return name
+        return "Red"
+
+    def on_edge(r, g, b):
+        """Exact hue exactly on an edge: colorsys's rounding picks either side."""
+        mx, mn = max(r, g, b), min(r, g, b)
+        if mx == mn:
+            return False
+        k, d = (0, g - b) if r == mx else (1, b - r) if g == mx else (2, r - g)
+        num = (120 * k * (mx - mn) + 60 * d) % (360 * (mx - mn))
+        return num % (mx - mn) == 0 and num // (mx - mn) in {0} | {hi for hi, _ in _HUE_EDGES}
+
+    # class boundaries match the scalar rules on a coarse RGB lattice
+    lattice = np.stack(np.meshgrid(*[np.arange(0, 256, 5)] * 3, indexing='ij'), -1).reshape(-1, 3)
+    fast = classify(lattice.astype(np.uint8))
+    bad = [tuple(map(int, p)) for k, p in zip(fast, lattice)
+           if COLOR_NAMES[k] != old_name(*map(int, p))]
+    ties = sum(on_edge(*p) for p in bad)
+    print(f"lattice check: {len(bad)} of {len(lattice)} RGB points classified differently, "
+          f"{ties} of them exact hue-edge ties")
+
+    path = sys.argv[1] if len(sys.argv) > 1 else "test.mjpeg"
+    with open(path, 'rb') as f:
+        frames = [np.asarray(Image.open(io.BytesIO(j)).convert('RGB'))
+                  for j in list(MjpegDemuxer(f))[:30]]
+    H, W = frames[0].shape[:2]
+
+    def patches(arr, n):
+        out = []
+        for i in range(n):
+            for j in range(n):
+                x = int(W * (j + 0.5) / n); y = int(H * (i + 0.5) / n)
+                r, g, b = arr[max(0, y - 20):y + 20, max(0, x - 20):x + 20].mean(axis=(0, 1)).astype(int)
+                out.append(old_name(r, g, b))
+        return out
+
+    engine = ColorEngine()
+    print(f"{len(frames)} frames {W}x{H}")
+    for n in (3, 8):
+        for name, fn in ((f"patch loop {n}x{n}", lambda a: patches(a, n)),
+                         (f"engine     {n}x{n}", lambda a: engine.analyze(a, (n, n)))):
+            t0 = time.perf_counter()
+            for a in frames:
+                fn(a)
+            print(f"  {name}  {(time.perf_counter() - t0) / len(frames) * 1000:6.2f} ms/frame")
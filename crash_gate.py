@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+crash_gate.py — cheap "possible crash" pass in front of the full detector.
+
+Almost every frame on the road has no crash in it, yet each one paid for a
+full YOLO run. CrashGate scores frames with a much cheaper model call — the
+same detector at a tiny imgsz (e.g. 160) with a low conf floor, or a small
+separate detector file — and only frames scoring at least `threshold` go
+on to the full model:
+
+    gate = CrashGate(threshold=0.15, safety_interval=3.0, imgsz=160)
+    passed = gate.select(frames, to_rgb, model, crash_ids, force=is_candidate)
+    ...run the full detector on `passed`...
+
+  - the score is the highest crash-class confidence the gate pass produced
+  - force(cam) True (e.g. a camera holding a crash candidate) skips the gate
+  - each camera still gets a full run at least every `safety_interval`
+    seconds, whatever the gate says, so a crash the gate misses is caught
+    within that interval
+
+Measure gate recall against the full detector on a frame set (.mjpeg or a
+directory of images) before picking a threshold:
+
+    python crash_gate.py test.mjpeg accident_model_latest.onnx
+    python crash_gate.py frames/ accident_model_latest.pt --gate-model tiny.onnx --imgsz 224
+
+A frame counts as a positive when the full model at 640 finds motor_crash
+at or above --crash-conf; recall is the share of positives the gate passes.
+"""
+
+import threading
+import time
+
+import numpy as np
+
+DEFAULTS = {"threshold": 0.15, "safety_interval": 3.0, "imgsz": 160, "conf": 0.05}
+
+
+def gate_score(r, crash_ids=None):
+    """Highest crash-class confidence in one Result (0.0 if none)."""
+    b = r.boxes
+    if not len(b):
+        return 0.0
+    conf = np.asarray(b.conf, dtype=np.float32)
+    if crash_ids is not None:
+        conf = conf[np.isin(np.asarray(b.cls).astype(np.int64), crash_ids)]
+    return float(conf.max()) if len(conf) else 0.0
+
+
+class _CamStats:
+    __slots__ = ('checked', 'passed', 'forced', 'safety', 'last_full', 'last_score')
+
+    def __init__(self):
+        self.checked = self.passed = self.forced = self.safety = 0
+        self.last_full  = 0.0
+        self.last_score = None
+
+
+class CrashGate:
+    def __init__(self, threshold=0.15, safety_interval=3.0, imgsz=160, conf=0.05,
+                 alpha=0.2):
+        self.threshold       = threshold
+        self.safety_interval = safety_interval
+        self.imgsz           = imgsz
+        self.conf            = conf
+        self.alpha           = alpha
+        self.latency         = None           # EWMA seconds per gated image
+        self.last_checked    = 0              # frames the last select() scored
+        self._lock = threading.Lock()
+        self.cams  = {}
+
+    def _cam(self, cam):
+        g = self.cams.get(cam)
+        if g is None:
+            g = self.cams[cam] = _CamStats()
+        return g
+
+    def scores(self, model, arrs, crash_ids=None):
+        """Gate scores for RGB arrays with one batched predict."""
+        t0 = time.monotonic()
+        results = model.predict(source=list(arrs), imgsz=self.imgsz, conf=self.conf,
+                                classes=crash_ids, verbose=False)
+        per_image = (time.monotonic() - t0) / max(len(arrs), 1)
+        with self._lock:
+            self.latency = per_image if self.latency is None else \
+                self.latency + self.alpha * (per_image - self.latency)
+        return [gate_score(r, crash_ids) for r in results]
+
+    def select(self, frames, to_rgb, model, crash_ids=None, force=lambda cam: False,
+               now=None):
+        """
+        Frames that should go to the full detector, in input order. Forced
+        and safety-net frames pass without a gate predict; the rest are
+        decoded with to_rgb(frame) and scored in one batch.
+        """
+        now = time.monotonic() if now is None else now
+        keep, check = [False] * len(frames), []
+        with self._lock:
+            for i, f in enumerate(frames):
+                g = self._cam(f.cam)
+                if force(f.cam):
+                    g.forced += 1
+                    keep[i] = True
+                elif now - g.last_full >= self.safety_interval:
+                    g.safety += 1
+                    keep[i] = True
+                else:
+                    check.append(i)
+        self.last_checked = len(check)
+        if check:
+            scores = self.scores(model, [to_rgb(frames[i]) for i in check], crash_ids)
+            with self._lock:
+                for i, s in zip(check, scores):
+                    g = self._cam(frames[i].cam)
+                    g.checked   += 1
+                    g.last_score = s
+                    if s >= self.threshold:
+                        g.passed += 1
+                        keep[i] = True
+        out = [f for f, k in zip(frames, keep) if k]
+        with self._lock:
+            for f in out:
+                self._cam(f.cam).last_full = now
+        return out
+
+    def stats(self):
+        with self._lock:
+            return {"threshold": self.threshold, "imgsz": self.imgsz,
+                    "safety_interval": self.safety_interval,
+                    "latency_ms": None if self.latency is None else round(self.latency * 1000, 1),
+                    "cams": {cam: {"checked": g.checked, "passed": g.passed,
+                                   "forced": g.forced, "safety": g.safety,
+                                   "last_score": None if g.last_score is None
+                                                 else round(g.last_score, 3)}
+                             for cam, g in self.cams.items()}}
+
+
+# ─────────────────── RECALL ─────────────────────────
+def measure_recall(frames, model, crash_ids, gate_model=None, gate_crash_ids=None,
+                   imgsz=160, gate_conf=0.05, full_imgsz=640, crash_conf=0.90,
+                   thresholds=(0.05, 0.1, 0.15, 0.2, 0.3, 0.5)):
+    """Label frames with the full model, score them with the gate, sweep thresholds."""
+    gate = CrashGate(imgsz=imgsz, conf=gate_conf)
+    gm   = gate_model or model
+    gids = crash_ids if gate_model is None else gate_crash_ids
+
+    labels, scores = [], []
+    t_full = t_gate = 0.0
+    for i in range(0, len(frames), 2):
+        pair = frames[i:i + 2]
+        t0 = time.perf_counter()
+        rs = model.predict(source=pair, imgsz=full_imgsz, conf=0.5, classes=crash_ids,
+                           verbose=False)
+        t_full += time.perf_counter() - t0
+        labels += [gate_score(r, crash_ids) >= crash_conf for r in rs]
+        t0 = time.perf_counter()
+        scores += gate.scores(gm, pair, gids)
+        t_gate += time.perf_counter() - t0
+
+    labels, scores = np.array(labels), np.array(scores)
+    pos = int(labels.sum())
+    rows = []
+    for t in thresholds:
+        passed = scores >= t
+        rows.append({"threshold": t,
+                     "recall": float(passed[labels].mean()) if pos else None,
+                     "pass_rate": float(passed.mean()),
+                     "missed": int((labels & ~passed).sum())})
+    return {"frames": len(frames), "positives": pos,
+            "full_ms": t_full / len(frames) * 1000, "gate_ms": t_gate / len(frames) * 1000,
+            "rows": rows}
+
+
+if __name__ == "__main__":
+    import argparse
+    from inference_backends import CRASH_LABEL, load_corpus, load_model
+
+    ap = argparse.ArgumentParser(description="Gate recall vs the full detector on a frame set")
+    ap.add_argument("corpus", help=".mjpeg file or directory of images")
+    ap.add_argument("model", help="full detector (reference labels)")
+    ap.add_argument("--gate-model", default=None, help="separate gate detector (default: model)")
+    ap.add_argument("--imgsz", type=int, default=DEFAULTS["imgsz"], help="gate imgsz")
+    ap.add_argument("--gate-conf", type=float, default=DEFAULTS["conf"])
+    ap.add_argument("--full-imgsz", type=int, default=640)
+    ap.add_argument("--crash-conf", type=float, default=0.90)
+    ap.add_argument("--thresholds", type=float, nargs="+",
+                    default=[0.05, 0.1, 0.15, 0.2, 0.3, 0.5])
+    ap.add_argument("--limit", type=int, default=None)
+    args = ap.parse_args()
+
+    def ids(m):
+        return [int(i) for i, n in m.names.items() if n == CRASH_LABEL]
+
+    frames = load_corpus(args.corpus, args.limit)
+    model  = load_model(args.model)
+    gm     = load_model(args.gate_model) if args.gate_model else None
+    res = measure_recall(frames, model, ids(model), gm, ids(gm) if gm else None,
+                         imgsz=args.imgsz, gate_conf=args.gate_conf,
+                         full_imgsz=args.full_imgsz, crash_conf=args.crash_conf,
+                         thresholds=args.thresholds)
+
+    print(f"{res['frames']} frames, {res['positives']} with motor_crash ≥ {args.crash_conf} "
+          f"at {args.full_imgsz}")
+    print(f"  full {res['full_ms']:.1f} ms/frame   gate @{args.imgsz} {res['gate_ms']:.1f} ms/frame")
+    print(f"{'threshold':>9} {'recall':>7} {'missed':>7} {'pass rate':>10}")
+    for row in res["rows"]:
+        recall = "n/a" if row["recall"] is None else f"{row['recall']:.3f}"
+        print(f"{row['threshold']:9.2f} {recall:>7} {row['missed']:7d} {row['pass_rate']:10.3f}")
+    if not res["positives"]:
+        print("  no positives in this set — recall needs frames with crashes in them")
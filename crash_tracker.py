@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+crash_tracker.py — keep crash detections alive across frames for confirmation.
+
+The confirmation timer used to restart whenever a single inference came back
+empty, so every frame had to be inferred. BoxTracker matches detections to
+existing tracks (IoU first, then centroid distance) and only drops a track
+after it has gone unseen for `max_gap` seconds:
+
+    tracker = BoxTracker(iou_thres=0.3, max_gap=1.0)
+    tracks  = tracker.update(boxes, now)    # boxes: [{'box': [x1,y1,x2,y2], ...}]
+    tracker.held_since()                    # first_seen of the oldest live track
+
+Because the gap is measured in seconds, not frames, the same settings work
+at 15 fps or with sparse 3–5 fps inference.
+"""
+
+import itertools
+
+import numpy as np
+
+
+class Track:
+    __slots__ = ('id', 'det', 'first_seen', 'last_seen', 'hits', 'misses')
+
+    def __init__(self, tid, det, now):
+        self.id         = tid
+        self.det        = det          # latest detection dict
+        self.first_seen = now
+        self.last_seen  = now
+        self.hits       = 1
+        self.misses     = 0            # inferences since last match
+
+    @property
+    def box(self):
+        return self.det['box']
+
+    def as_det(self):
+        """Latest detection dict tagged with the track id and coast state."""
+        return dict(self.det, track=self.id, missed=self.misses)
+
+
+def iou_matrix(a, b):
+    """Pairwise IoU of two (N, 4) / (M, 4) xyxy arrays."""
+    a = np.asarray(a, dtype=np.float32).reshape(-1, 4)[:, None, :]
+    b = np.asarray(b, dtype=np.float32).reshape(-1, 4)[None, :, :]
+    iw = (np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0])).clip(0)
+    ih = (np.minimum(a[..., 3], b[..., 3]) - np.maximum(a[..., 1], b[..., 1])).clip(0)
+    inter  = iw * ih
+    area_a = (a[..., 2] - a[..., 0]) * (a[..., 3] - a[..., 1])
+    area_b = (b[..., 2] - b[..., 0]) * (b[..., 3] - b[..., 1])
+    return inter / np.maximum(area_a + area_b - inter, 1e-9)
+
+
+def _centers(boxes):
+    """Centres and diagonals; the diagonal is clamped so a zero-area box
+    gives a large finite distance instead of inf/NaN."""
+    b = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    diag = np.hypot(b[:, 2] - b[:, 0], b[:, 3] - b[:, 1])
+    return (b[:, :2] + b[:, 2:]) / 2, np.maximum(diag, 1e-6)
+
+
+class BoxTracker:
+    """
+    Greedy IoU tracker for one camera.
+      iou_thres   minimum IoU to continue a track
+      centroid    fallback: centres closer than this fraction of the track
+                  box diagonal also match (fast motion between sparse frames)
+      max_gap     seconds a track may go unmatched before it is dropped
+    """
+
+    def __init__(self, iou_thres=0.3, centroid=0.5, max_gap=1.0):
+        self.iou_thres = iou_thres
+        self.centroid  = centroid
+        self.max_gap   = max_gap
+        self.tracks    = []
+        self._ids      = itertools.count(1)
+
+    def reset(self):
+        self.tracks = []
+
+    def update(self, dets, now):
+        """Feed one inference's detections; returns the live tracks."""
+        unmatched_t = list(range(len(self.tracks)))
+        unmatched_d = list(range(len(dets)))
+        pairs = []
+        if self.tracks and dets:
+            tboxes = [t.box for t in self.tracks]
+            dboxes = [d['box'] for d in dets]
+            ious = iou_matrix(tboxes, dboxes)
+            # IoU pass, best pairs first
+            for ti, di in zip(*np.unravel_index(np.argsort(-ious, axis=None), ious.shape)):
+                if ious[ti, di] < self.iou_thres:
+                    break
+                if ti in unmatched_t and di in unmatched_d:
+                    pairs.append((ti, di)); unmatched_t.remove(ti); unmatched_d.remove(di)
+            # centroid pass for what is left
+            if unmatched_t and unmatched_d:
+                cand_t, cand_d = list(unmatched_t), list(unmatched_d)
+                tc, tdiag = _centers([tboxes[i] for i in cand_t])
+                dc, _     = _centers([dboxes[i] for i in cand_d])
+                dist = np.linalg.norm(tc[:, None, :] - dc[None, :, :], axis=2) / tdiag[:, None]
+                for a, b in zip(*np.unravel_index(np.argsort(dist, axis=None), dist.shape)):
+                    if dist[a, b] > self.centroid:
+                        break
+                    ti, di = cand_t[a], cand_d[b]
+                    if ti in unmatched_t and di in unmatched_d:
+                        pairs.append((ti, di)); unmatched_t.remove(ti); unmatched_d.remove(di)
+
+        for ti, di in pairs:
+            t = self.tracks[ti]
+            t.det, t.last_seen = dets[di], now
+            t.hits  += 1
+            t.misses = 0
+        for ti in unmatched_t:
+            self.tracks[ti].misses += 1
+        for di in unmatched_d:
+            self.tracks.append(Track(next(self._ids), dets[di], now))
+
+        self.tracks = [t for t in self.tracks if now - t.last_seen <= self.max_gap]
+        return self.tracks
+
+    def held_since(self):
+        """first_seen of the longest-lived live track, or None."""
+        return min((t.first_seen for t in self.tracks), default=None)
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+frame_cache.py — decode each camera JPEG once, share it between stages.
+
+ML, color detection, the overlay renderer and the combiner all need pixels
+for the same capture. DecodeCache decodes lazily on first demand, keyed by
+(cam, seq), and hands every stage the same read-only result:
+
+    img = decode_cache.image(frame)     # PIL RGB image — .copy() before drawing
+    arr = decode_cache.array(frame)     # numpy view, write-protected
+
+Only the newest `per_cam` sequences per camera are kept; an older frame is
+evicted as soon as enough newer ones have been requested. Stages that still
+hold a reference keep using it, the cache just forgets it.
+"""
+
+import io
+import threading
+
+import numpy as np
+from PIL import Image
+
+
+class _Entry:
+    __slots__ = ('lock', 'image', 'array')
+
+    def __init__(self):
+        self.lock  = threading.Lock()
+        self.image = None
+        self.array = None
+
+
+class DecodeCache:
+    def __init__(self, per_cam=2):
+        self.per_cam   = per_cam
+        self._lock     = threading.Lock()
+        self._entries  = {}
+        self.decodes   = 0
+        self.hits      = 0
+        self.evictions = 0
+
+    def _entry(self, frame):
+        key = (frame.cam, frame.seq)
+        with self._lock:
+            e = self._entries.get(key)
+            if e is None:
+                e = self._entries[key] = _Entry()
+                seqs = sorted(seq for cam, seq in self._entries if cam == frame.cam)
+                for seq in seqs[:-self.per_cam]:
+                    del self._entries[(frame.cam, seq)]
+                    self.evictions += 1
+            return e
+
+    def _count(self, attr):
+        with self._lock:
+            setattr(self, attr, getattr(self, attr) + 1)
+
+    def _decode(self, e, frame):
+        # caller holds e.lock
+        if e.image is None:
+            img = Image.open(io.BytesIO(frame.jpeg))
+            e.image = img.convert('RGB') if img.mode != 'RGB' else img
+            e.image.load()
+            self._count('decodes')
+        else:
+            self._count('hits')
+        return e.image
+
+    def image(self, frame):
+        e = self._entry(frame)
+        with e.lock:
+            return self._decode(e, frame)
+
+    def array(self, frame):
+        e = self._entry(frame)
+        with e.lock:
+            if e.array is None:
+                e.array = np.asarray(self._decode(e, frame))
+                e.array.setflags(write=False)
+            else:
+                self._count('hits')
+            return e.array
+
+    def stats(self):
+        with self._lock:
+            return {"decodes": self.decodes, "hits": self.hits,
+                    "evictions": self.evictions, "cached": len(self._entries)}
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+frames.py — frame records shared by capture, ML, overlay and streaming.
+
+Every frame published on a camera's FrameBus (cameras[idx]["frames"];
+renders go on cameras[idx]["overlays"] and combined_bus) is a Frame:
+
+    Frame(cam, seq, jpeg, ts=None, raw=None)
+
+  cam    camera index (None for the combined 360 view)
+  seq    per-producer sequence number, strictly increasing
+  ts     time.monotonic() at capture
+  jpeg   encoded bytes, what viewers and the cloud receive
+  raw    optional raw capture (YUV420 lores array in dual mode)
+  image  optional decoded view, filled by whoever decodes first
+
+Consumers keep a SeqTracker instead of comparing objects with `is`, which
+gives them ordering, a count of frames they never saw and the age of the
+one they are about to work on.
+
+Frames move between stages on a FrameBus (one per camera and per derived
+product). Subscribers block on a Condition until a newer sequence arrives
+instead of polling every 33 ms:
+
+    sub = bus.subscribe()                  # latest-only
+    sub = bus.subscribe(policy='queue', maxlen=4)
+    sub = bus.subscribe(fresh=True)        # not the frame already on the bus
+    frame = sub.get(timeout=15)            # None → producer stalled
+    sub.close()                            # bus.subscribers counts open ones
+
+Consumers that read bus.latest() instead of subscribing (an uploader, a
+snapshot route) take a short demand lease with bus.want(seconds), then
+bus.wait_fresh(max_age, timeout).
+Producers of derived products check bus.wanted() — open subscriptions or
+a live lease — and skip work nobody is reading.
+
+Buses created with the same Condition can be waited on together with
+wait_any(), for workers that serve both cameras from one thread.
+"""
+
+import collections
+import threading
+import time
+
+
+class Frame:
+    __slots__ = ('cam', 'seq', 'ts', 'jpeg', 'raw', 'image')
+
+    def __init__(self, cam, seq, jpeg, ts=None, raw=None):
+        self.cam   = cam
+        self.seq   = seq
+        self.ts    = time.monotonic() if ts is None else ts
+        self.jpeg  = jpeg
+        self.raw   = raw
+        self.image = None
+
+    def age(self, now=None):
+        """Seconds since capture."""
+        return (time.monotonic() if now is None else now) - self.ts
+
+    def derive(self, jpeg, image=None):
+        """Same capture (cam/seq/ts), new encoding — e.g. an overlay render.
+        Pass the rendered image along so later stages need not decode it."""
+        f = Frame(self.cam, self.seq, jpeg, ts=self.ts)
+        f.image = image
+        return f
+
+    def __repr__(self):
+        return (f"Frame(cam={self.cam}, seq={self.seq}, "
+                f"age={self.age()*1000:.0f}ms, {len(self.jpeg)} B)")
+
+
+class SeqTracker:
+    """Per-consumer view of a frame stream: new/skipped/stale accounting."""
+
+    __slots__ = ('last_seq', 'seen', 'skipped', 'stale', 'last_age')
+
+    def __init__(self):
+        self.last_seq = -1
+        self.seen     = 0
+        self.skipped  = 0     # frames published but never picked up
+        self.stale    = 0     # frames picked up but dropped as too old
+        self.last_age = 0.0
+
+    def is_new(self, frame):
+        """True (and record it) if `frame` is newer than the last one taken."""
+        if frame is None or frame.seq <= self.last_seq:
+            return False
+        if self.last_seq >= 0:
+            self.skipped += frame.seq - self.last_seq - 1
+        self.last_seq = frame.seq
+        self.seen    += 1
+        self.last_age = frame.age()
+        return True
+
+    def too_old(self, max_age):
+        """Call after is_new(): drop work on frames older than max_age."""
+        if max_age is not None and self.last_age > max_age:
+            self.stale += 1
+            return True
+        return False
+
+    def as_dict(self):
+        return {"seen": self.seen, "skipped": self.skipped, "stale": self.stale,
+                "last_seq": self.last_seq,
+                "last_age_ms": round(self.last_age * 1000, 1)}
+
+
+class FrameBus:
+    """Single-producer publish/subscribe slot for one frame stream."""
+
+    def __init__(self, name, cond=None):
+        self.name   = name
+        self.cond   = cond if cond is not None else threading.Condition()
+        self._latest = None
+        self._queues = []
+        self.subscribers = 0     # open Subscriptions
+        self._demand_until = 0.0
+
+    def publish(self, frame):
+        """Never blocks the producer; wakes every waiting subscriber."""
+        with self.cond:
+            self._latest = frame
+            if frame is not None:
+                for q in self._queues:
+                    q.append(frame)
+            self.cond.notify_all()
+
+    def latest(self):
+        """Most recent frame (None before the first one / after a stop)."""
+        return self._latest
+
+    def want(self, hold):
+        """Demand lease for a polling consumer: wanted() for `hold` seconds."""
+        until = time.monotonic() + hold
+        with self.cond:
+            self._demand_until = max(self._demand_until, until)
+
+    def wanted(self):
+        """True while anyone is subscribed or holds a demand lease."""
+        return self.subscribers > 0 or time.monotonic() < self._demand_until
+
+    def wait_fresh(self, max_age, timeout):
+        """Latest frame if younger than max_age, else wait up to `timeout`
+        for the next publish (falls back to the stale one). Pair with want()."""
+        frame = self._latest
+        if frame is not None and frame.age() <= max_age:
+            return frame
+        tracker = SeqTracker()
+        if frame is not None:
+            tracker.last_seq = frame.seq
+        sub = self.subscribe(tracker=tracker)
+        try:
+            return sub.get(timeout=timeout) or frame
+        finally:
+            sub.close()
+
+    def subscribe(self, policy='latest', maxlen=4, tracker=None, fresh=False):
+        return Subscription(self, policy, maxlen, tracker, fresh)
+
+
+class Subscription:
+    """
+    One consumer's cursor on a FrameBus.
+      policy='latest'  only ever hand out the newest frame (skips the rest)
+      policy='queue'   hand out every frame, oldest first; when more than
+                       `maxlen` are pending the oldest are dropped
+    Skips and drops both show up in tracker.skipped.
+    fresh=True starts the cursor at the frame already on the bus, so the
+    first get() waits for one published after subscribing — for a derived
+    bus whose last frame may predate an idle period.
+    """
+
+    def __init__(self, bus, policy='latest', maxlen=4, tracker=None, fresh=False):
+        if policy not in ('latest', 'queue'):
+            raise ValueError(f"unknown policy {policy!r}")
+        self.bus     = bus
+        self.policy  = policy
+        self.tracker = tracker if tracker is not None else SeqTracker()
+        self._queue  = None
+        self._open   = True
+        with bus.cond:
+            bus.subscribers += 1
+            if fresh and bus._latest is not None:
+                self.tracker.last_seq = max(self.tracker.last_seq, bus._latest.seq)
+            if policy == 'queue':
+                self._queue = collections.deque(maxlen=maxlen)
+                bus._queues.append(self._queue)
+
+    def poll(self):
+        """Newer frame if one is ready, else None. Caller holds no lock."""
+        with self.bus.cond:
+            return self._poll()
+
+    def _poll(self):
+        if self._queue is None:
+            frame = self.bus._latest
+            return frame if self.tracker.is_new(frame) else None
+        while self._queue:
+            frame = self._queue.popleft()
+            if self.tracker.is_new(frame):
+                return frame
+        return None
+
+    def get(self, timeout=None):
+        """Block until a newer frame arrives. Returns None on timeout (stall)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.bus.cond:
+            while True:
+                frame = self._poll()
+                if frame is not None:
+                    return frame
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self.bus.cond.wait(remaining)
+
+    def close(self):
+        with self.bus.cond:
+            if self._open:
+                self._open = False
+                self.bus.subscribers -= 1
+            if self._queue is not None:
+                if self._queue in self.bus._queues:
+                    self.bus._queues.remove(self._queue)
+                self._queue = None
+
+
+def wait_any(subs, timeout=None):
+    """
+    Block until at least one subscription has a newer frame.
+    Returns a list aligned with `subs` (frame or None); all None on timeout.
+    All subscribed buses must share one Condition.
+    """
+    cond = subs[0].bus.cond
+    if any(s.bus.cond is not cond for s in subs):
+        raise ValueError("wait_any needs buses created with the same Condition")
+    deadline = None if timeout is None else time.monotonic() + timeout
+    with cond:
+        while True:
+            frames = [s._poll() for s in subs]
+            if any(f is not None for f in frames):
+                return frames
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return frames
+            cond.wait(remaining)
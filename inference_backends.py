@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+"""
+inference_backends.py — run the accident model through torch, TorchScript or
+ONNX Runtime behind one model-like interface.
+
+Every backend has .names and .predict(source=[rgb arrays], imgsz, conf) and
+returns objects with r.boxes.xyxy / .conf / .cls, so camera-server.py does
+not care which one is loaded. The backend follows the model file:
+
+  accident_model_latest.pt             torch        (ultralytics YOLO)
+  accident_model_latest.torchscript    TorchScript  (ultralytics YOLO)
+  accident_model_latest.onnx           ONNX Runtime (no torch needed)
+  accident_model_latest.int8.onnx      ONNX Runtime, int8 dynamic quantized
+
+    model = load_model("accident_model_latest.onnx")
+
+EXPORT / CONVERT (needs ultralytics; --int8 also needs onnxruntime):
+    python inference_backends.py export accident_model_latest.pt --format onnx --int8
+    python inference_backends.py export accident_model_latest.pt --format torchscript
+
+COMPARE on a frame corpus (.mjpeg file or a directory of .jpg):
+    python inference_backends.py compare test.mjpeg \\
+        accident_model_latest.pt accident_model_latest.onnx accident_model_latest.int8.onnx
+
+The first model is the reference; the others are scored on latency and on
+whether they fire on motor_crash in the same frames. Every model is fed the
+same letterboxed RGB tensor per frame.
+"""
+
+import ast
+import json
+import os
+import time
+import zipfile
+
+import numpy as np
+
+from preprocess import Letterboxer, unletterbox
+
+CRASH_LABEL = 'motor_crash'
+
+
+class Boxes:
+    """Detections of one image as numpy arrays (xyxy in source pixels)."""
+
+    __slots__ = ('xyxy', 'conf', 'cls')
+
+    def __init__(self, xyxy, conf, cls):
+        self.xyxy = xyxy
+        self.conf = conf
+        self.cls  = cls
+
+    def __len__(self):
+        return len(self.conf)
+
+
+class Result:
+    __slots__ = ('boxes',)
+
+    def __init__(self, xyxy, conf, cls):
+        self.boxes = Boxes(xyxy, conf, cls)
+
+
+# ─────────────────── ULTRALYTICS ────────────────────
+# Channel order: every backend here hands the network RGB, which is what
+# ultralytics-trained weights expect. Ultralytics reads numpy images as BGR
+# (OpenCV order) and flips them, but passes tensors through unchanged.
+class UltralyticsBackend:
+    """
+    torch / TorchScript through ultralytics, fed a letterboxed float RGB
+    tensor from preallocated buffers (torch.from_numpy shares the memory),
+    so ultralytics skips its own letterbox/normalize copies. The batch is
+    padded to a multiple of the stride, not to a square, as ultralytics
+    does for numpy input. TorchScript exports only run at the square imgsz
+    they were exported with: fixed_size holds it and overrides every imgsz,
+    as with a fixed-size ONNX export.
+    """
+
+    name   = "torch"
+    STRIDE = 32                          # YOLOv8 max stride
+
+    def __init__(self, path):
+        from ultralytics import YOLO
+        self.model     = YOLO(path, task='detect')
+        self.names     = self.model.names
+        self.letterbox = Letterboxer()
+        self.fixed_size  = _torchscript_imgsz(path) if path.endswith('.torchscript') else None
+        self.rect_stride = 0 if self.fixed_size else self.STRIDE
+
+    def predict(self, source, imgsz=640, conf=0.25, iou=0.7, classes=None, **_):
+        arrs = source if isinstance(source, list) else [source]
+        batch, metas = self.letterbox(arrs, self.fixed_size or imgsz, self.rect_stride)
+        return self.run(batch, metas, [a.shape for a in arrs], conf, iou, classes)
+
+    def run(self, batch, metas, shapes, conf=0.25, iou=0.7, classes=None):
+        """predict() on an already letterboxed float32 NCHW RGB batch."""
+        import torch
+        results = self.model.predict(source=torch.from_numpy(batch), imgsz=max(batch.shape[2:]),
+                                     conf=conf, iou=iou, classes=classes, verbose=False)
+        out = []
+        for r, shape, meta in zip(results, shapes, metas):
+            b = r.boxes
+            out.append(Result(unletterbox(b.xyxy.cpu().numpy().copy(), meta, shape),
+                              b.conf.cpu().numpy(), b.cls.cpu().numpy()))
+        return out
+
+
+def _torchscript_imgsz(path, default=640):
+    """Export imgsz from the metadata ultralytics stores in a TorchScript zip."""
+    try:
+        with zipfile.ZipFile(path) as z:
+            name = next(n for n in z.namelist() if n.endswith('extra/config.txt'))
+            imgsz = json.loads(z.read(name)).get('imgsz', default)
+    except (OSError, StopIteration, ValueError, zipfile.BadZipFile):
+        return default
+    return int(max(imgsz) if isinstance(imgsz, (list, tuple)) else imgsz)
+
+
+class PlainUltralyticsBackend:
+    """
+    ML_PREALLOC=0: plain ultralytics predict on numpy frames, with its own
+    letterbox. Frames are flipped to BGR first, so after ultralytics' own
+    flip the network sees RGB, as on every other path.
+    """
+
+    name = "torch"
+
+    def __init__(self, path):
+        from ultralytics import YOLO
+        self.model = YOLO(path, task='detect')
+        self.names = self.model.names
+        self.fixed_size = _torchscript_imgsz(path) if path.endswith('.torchscript') else None
+
+    def predict(self, source, **kwargs):
+        arrs = source if isinstance(source, list) else [source]
+        kwargs.setdefault('verbose', False)
+        if self.fixed_size:
+            kwargs['imgsz'] = self.fixed_size
+        return self.model.predict(source=[np.ascontiguousarray(a[..., ::-1]) for a in arrs],
+                                  **kwargs)
+
+
+# ─────────────────── ONNX RUNTIME ───────────────────
+def nms(boxes, scores, iou_thres):
+    """Greedy NMS on xyxy boxes; returns kept indices, best score first."""
+    order = scores.argsort()[::-1]
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    keep  = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        xx1 = np.maximum(boxes[i, 0], boxes[rest, 0])
+        yy1 = np.maximum(boxes[i, 1], boxes[rest, 1])
+        xx2 = np.minimum(boxes[i, 2], boxes[rest, 2])
+        yy2 = np.minimum(boxes[i, 3], boxes[rest, 3])
+        inter = np.clip(xx2 - xx1, 0, None) * np.clip(yy2 - yy1, 0, None)
+        iou = inter / (areas[i] + areas[rest] - inter + 1e-9)
+        order = rest[iou <= iou_thres]
+    return np.array(keep, dtype=np.int64)
+
+
+class OnnxBackend:
+    """
+    YOLOv8-style ONNX export (output (N, 4+classes, anchors)) run directly
+    on onnxruntime: preallocated letterbox in, class-aware NMS out.
+    """
+
+    name = "onnx"
+
+    def __init__(self, path, threads=None):
+        # imported here, not at module load: the torch backend never needs it
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise RuntimeError("onnxruntime not installed (pip install onnxruntime)") from None
+        opts = ort.SessionOptions()
+        if threads:
+            opts.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(path, opts, providers=['CPUExecutionProvider'])
+        inp = self.session.get_inputs()[0]
+        self.input_name = inp.name
+        self.fixed_batch = inp.shape[0] if isinstance(inp.shape[0], int) else None
+        self.fixed_size  = inp.shape[2] if isinstance(inp.shape[2], int) else None
+        # dynamic exports take stride-padded (non-square) input
+        self.rect_stride = 0 if self.fixed_size else UltralyticsBackend.STRIDE
+        meta = self.session.get_modelmeta().custom_metadata_map
+        self.names = ast.literal_eval(meta['names']) if 'names' in meta else {0: CRASH_LABEL}
+        self.letterbox = Letterboxer()
+
+    def predict(self, source, imgsz=640, conf=0.25, iou=0.7, max_det=300, classes=None, **_):
+        arrs = source if isinstance(source, list) else [source]
+        batch, metas = self.letterbox(arrs, self.fixed_size or imgsz, self.rect_stride)
+        return self.run(batch, metas, [a.shape for a in arrs], conf, iou, classes, max_det)
+
+    def run(self, batch, metas, shapes, conf=0.25, iou=0.7, classes=None, max_det=300):
+        """predict() on an already letterboxed float32 NCHW RGB batch."""
+        if self.fixed_batch == 1 and len(batch) > 1:
+            preds = np.concatenate([self.session.run(None, {self.input_name: batch[i:i + 1]})[0]
+                                    for i in range(len(batch))])
+        else:
+            preds = self.session.run(None, {self.input_name: batch})[0]
+        classes = None if classes is None else np.asarray(classes, dtype=np.int64)
+        return [self._postprocess(p, shape, meta, conf, iou, max_det, classes)
+                for p, shape, meta in zip(preds, shapes, metas)]
+
+    @staticmethod
+    def _postprocess(pred, shape, meta, conf_thres, iou_thres, max_det, classes=None):
+        pred   = pred.T                              # (anchors, 4+classes)
+        scores = pred[:, 4:]
+        if classes is not None:                      # only these classes reach NMS
+            scores = scores[:, classes]
+        cls    = scores.argmax(1)
+        conf   = scores[np.arange(len(cls)), cls]
+        if classes is not None:
+            cls = classes[cls]
+        m = conf >= conf_thres
+        xywh, conf, cls = pred[m, :4], conf[m], cls[m]
+        xyxy = np.empty_like(xywh)
+        xyxy[:, :2] = xywh[:, :2] - xywh[:, 2:] / 2
+        xyxy[:, 2:] = xywh[:, :2] + xywh[:, 2:] / 2
+        # offset boxes per class so NMS never suppresses across classes
+        keep = nms(xyxy + cls[:, None] * 4096.0, conf, iou_thres)[:max_det]
+        xyxy, conf, cls = unletterbox(xyxy[keep], meta, shape), conf[keep], cls[keep]
+        return Result(xyxy, conf, cls.astype(np.float32))
+
+
+# ─────────────────── LOADER ─────────────────────────
+def backend_for(path):
+    if path.endswith('.onnx'):
+        return 'onnx-int8' if path.endswith('.int8.onnx') else 'onnx'
+    if path.endswith('.torchscript'):
+        return 'torchscript'
+    return 'torch'
+
+
+def load_model(path, threads=None, prealloc=True):
+    """
+    Model-like object for `path`; the backend follows the file extension.
+    prealloc=False hands torch/TorchScript frames to plain ultralytics
+    (its own letterbox) instead of the preallocated tensor path. Either way
+    the network sees RGB.
+    """
+    if backend_for(path).startswith('onnx'):
+        return OnnxBackend(path, threads=threads)
+    if prealloc:
+        return UltralyticsBackend(path)
+    return PlainUltralyticsBackend(path)
+
+
+# ─────────────────── EXPORT ─────────────────────────
+def export(pt_path, fmt='onnx', imgsz=640, int8=False):
+    """Export a .pt model with ultralytics; optionally int8-quantize the ONNX."""
+    from ultralytics import YOLO
+    out = YOLO(pt_path).export(format=fmt, imgsz=imgsz, dynamic=(fmt == 'onnx'))
+    print(f"[EXPORT] {pt_path} → {out}")
+    if int8:
+        if fmt != 'onnx':
+            raise ValueError("--int8 needs --format onnx")
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        q_path = os.path.splitext(out)[0] + '.int8.onnx'
+        quantize_dynamic(out, q_path, weight_type=QuantType.QInt8)
+        print(f"[EXPORT] int8 dynamic quantized → {q_path}")
+        out = q_path
+    return out
+
+
+# ─────────────────── COMPARE ────────────────────────
+def load_corpus(path, limit=None):
+    """RGB arrays from an .mjpeg file or a directory of .jpg/.png images."""
+    from PIL import Image
+    import io
+    if os.path.isdir(path):
+        files = sorted(f for f in os.listdir(path) if f.lower().endswith(('.jpg', '.jpeg', '.png')))
+        blobs = [open(os.path.join(path, f), 'rb').read() for f in files]
+    else:
+        from mjpeg_stream import MjpegDemuxer
+        with open(path, 'rb') as f:
+            blobs = list(MjpegDemuxer(f))
+    blobs = blobs[:limit] if limit else blobs
+    return [np.asarray(Image.open(io.BytesIO(b)).convert('RGB')) for b in blobs]
+
+
+def crash_boxes(model, r, conf_thres):
+    """xyxy rows of motor_crash detections at or above conf_thres."""
+    out = []
+    for box, conf, cls in zip(r.boxes.xyxy, r.boxes.conf, r.boxes.cls):
+        if model.names[int(cls)] == CRASH_LABEL and float(conf) >= conf_thres:
+            out.append([float(v) for v in box])
+    return out
+
+
+def iou(a, b):
+    ix = max(0.0, min(a[2], b[2]) - max(a[0], b[0]))
+    iy = max(0.0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = ix * iy
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def run_model(path, frames, imgsz, conf, crash_conf, warmup=3):
+    """
+    Latency and motor_crash hits of one model on `frames`. Every backend is
+    fed the same letterboxed float32 RGB tensor of a frame through run(), so
+    only the model differs between rows of the comparison.
+    """
+    model = load_model(path)
+    size  = getattr(model, 'fixed_size', None) or imgsz
+    lb    = Letterboxer(max_batch=1)
+
+    def infer(a):
+        batch, metas = lb([a], size, getattr(model, 'rect_stride', 0))
+        return model.run(batch, metas, [a.shape], conf=conf)[0]
+
+    for a in frames[:warmup]:
+        infer(a)
+    lat, hits = [], []
+    for a in frames:
+        t0 = time.perf_counter()
+        r = infer(a)
+        lat.append(time.perf_counter() - t0)
+        hits.append(crash_boxes(model, r, crash_conf))
+    return np.array(lat), hits
+
+
+def compare(corpus, paths, imgsz=640, conf=0.5, crash_conf=0.90, limit=None):
+    frames = load_corpus(corpus, limit)
+    print(f"{len(frames)} frames from {corpus}, imgsz={imgsz}\n")
+    ref_hits = None
+    print(f"{'model':<40} {'mean ms':>8} {'p95 ms':>8} {'fires':>6} {'agree':>7} {'recall':>7} {'IoU':>5}")
+    for path in paths:
+        lat, hits = run_model(path, frames, imgsz, conf, crash_conf)
+        fires = sum(1 for h in hits if h)
+        line = (f"{os.path.basename(path):<40} {lat.mean()*1000:8.1f} "
+                f"{np.percentile(lat, 95)*1000:8.1f} {fires:6d}")
+        if ref_hits is None:
+            ref_hits = hits
+            line += f" {'(ref)':>7}"
+        else:
+            agree  = sum(bool(a) == bool(b) for a, b in zip(ref_hits, hits)) / len(hits)
+            ref_n  = sum(1 for h in ref_hits if h)
+            recall = sum(1 for a, b in zip(ref_hits, hits) if a and b) / ref_n if ref_n else 1.0
+            ious   = [max(iou(ra, rb) for rb in b) for a, b in zip(ref_hits, hits)
+                      if a and b for ra in a[:1]]
+            line += f" {agree:7.1%} {recall:7.1%} {np.mean(ious) if ious else 0:5.2f}"
+        print(line)
+
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Export and compare accident model backends")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    ex = sub.add_parser("export", help="convert a .pt model")
+    ex.add_argument("model")
+    ex.add_argument("--format", choices=["onnx", "torchscript"], default="onnx")
+    ex.add_argument("--imgsz", type=int, default=640)
+    ex.add_argument("--int8", action="store_true", help="also write an int8 dynamic quantized .onnx")
+    cp = sub.add_parser("compare", help="latency/accuracy on a frame corpus")
+    cp.add_argument("corpus", help=".mjpeg file or directory of images")
+    cp.add_argument("models", nargs="+", help="first one is the reference")
+    cp.add_argument("--imgsz", type=int, default=640)
+    cp.add_argument("--conf", type=float, default=0.5)
+    cp.add_argument("--crash-conf", type=float, default=0.90)
+    cp.add_argument("--limit", type=int, default=None)
+    args = ap.parse_args()
+    if args.cmd == "export":
+        export(args.model, args.format, args.imgsz, args.int8)
+    else:
+        compare(args.corpus, args.models, args.imgsz, args.conf, args.crash_conf, args.limit)
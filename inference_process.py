@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+inference_process.py — run YOLO in its own process, fed through shared memory.
+
+In-process inference shares the GIL with capture parsing, overlay rendering,
+Flask streaming and the cloud sender. InferenceProcess moves model.predict
+into a child process and looks like a model to the caller:
+
+    model = InferenceProcess("accident_model_latest.pt", slot_shape=(480, 640, 3))
+    model.start()                                   # spawns + waits for load
+    results = model.predict(source=[arr0, arr1], imgsz=640, conf=0.5)
+    model.names                                     # {cls_id: label}
+
+  - frames are copied into fixed multiprocessing.shared_memory slots, only a
+    tiny (slot, shape) message crosses the pipe
+  - the worker loads the model with inference_backends.load_model, so any
+    backend (torch, TorchScript, ONNX Runtime) can run out of process
+  - results come back as numpy xyxy/conf/cls arrays wrapped so that
+    r.boxes.xyxy / .conf / .cls work like ultralytics Results
+  - if the worker dies or a request times out it is killed and restarted on
+    the next call (with backoff); that call raises RuntimeError
+"""
+
+import importlib
+import itertools
+import multiprocessing as mp
+import threading
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from inference_backends import Result
+
+
+def _load(loader, model_path):
+    module, _, attr = loader.partition(':')
+    return getattr(importlib.import_module(module), attr)(model_path)
+
+
+def _to_numpy(t):
+    return t.cpu().numpy() if hasattr(t, 'cpu') else np.asarray(t)
+
+
+def _worker_main(loader, model_path, shm_name, slot_bytes, threads, conn):
+    """Child process: load the model, then serve predict requests forever."""
+    if threads:
+        try:
+            import torch
+            torch.set_num_threads(threads)
+        except ImportError:
+            pass
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        model = _load(loader, model_path)
+        conn.send(('ready', dict(model.names)))
+        while True:
+            try:
+                msg = conn.recv()
+            except EOFError:
+                break
+            if msg is None:
+                break
+            req_id, items, kwargs = msg
+            arrs = [np.ndarray(shape, np.uint8, buffer=shm.buf, offset=slot * slot_bytes)
+                    for slot, shape in items]
+            try:
+                results = model.predict(source=arrs, **kwargs)
+                out = [(_to_numpy(r.boxes.xyxy), _to_numpy(r.boxes.conf), _to_numpy(r.boxes.cls))
+                       for r in results]
+                conn.send((req_id, out))
+            except Exception as e:
+                conn.send((req_id, e))
+            del arrs
+    finally:
+        shm.close()
+
+
+class InferenceProcess:
+    def __init__(self, model_path, slot_shape, slots=2, loader="inference_backends:load_model",
+                 threads=None, timeout=10.0, startup_timeout=120.0):
+        self.model_path      = model_path
+        self.slot_shape      = tuple(slot_shape)
+        self.slots           = slots
+        self.loader          = loader
+        self.threads         = threads
+        self.timeout         = timeout
+        self.startup_timeout = startup_timeout
+
+        self.slot_bytes = int(np.prod(self.slot_shape))
+        self._shm   = shared_memory.SharedMemory(create=True, size=self.slot_bytes * slots)
+        self._ctx   = mp.get_context('spawn')   # never fork a process running torch threads
+        self._lock  = threading.Lock()
+        self._proc  = None
+        self._conn  = None
+        self._ids   = itertools.count()
+        self._next_restart = 0.0
+
+        self.names    = {}
+        self.restarts = -1      # first start is not a restart
+        self.requests = 0
+
+    # ── lifecycle ─────────────────────────────────────────
+    def start(self):
+        with self._lock:
+            self._spawn()
+        return self
+
+    def _spawn(self):
+        parent, child = self._ctx.Pipe()
+        self._proc = self._ctx.Process(
+            target=_worker_main, name="yolo-inference", daemon=True,
+            args=(self.loader, self.model_path, self._shm.name,
+                  self.slot_bytes, self.threads, child))
+        self._proc.start()
+        child.close()
+        self._conn = parent
+        self.restarts += 1
+        try:
+            if not parent.poll(self.startup_timeout):
+                self._kill("model load timed out")
+                raise RuntimeError("inference worker did not load the model in time")
+            msg = parent.recv()
+        except (EOFError, BrokenPipeError, OSError) as e:
+            self._proc.join(timeout=1)
+            code = self._proc.exitcode
+            self._kill(f"worker exited while loading (exit code {code})")
+            raise RuntimeError(f"inference worker failed to load {self.model_path}") from e
+        self.names = msg[1]
+        print(f"[ML-PROC] Worker pid {self._proc.pid} ready ({len(self.names)} classes)")
+
+    def _kill(self, reason):
+        print(f"[ML-PROC] Stopping worker: {reason}")
+        if self._proc is not None:
+            self._proc.kill()
+            self._proc.join(timeout=5)
+        if self._conn is not None:
+            self._conn.close()
+        self._proc = self._conn = None
+        # Back off 1s, 2s, 4s … up to 30s between restarts
+        self._next_restart = time.monotonic() + min(30, 2 ** max(0, self.restarts))
+
+    def _ensure_running(self):
+        if self._proc is not None and self._proc.is_alive():
+            return
+        if self._proc is not None:
+            self._kill(f"worker died (exit code {self._proc.exitcode})")
+        if time.monotonic() < self._next_restart:
+            raise RuntimeError("inference worker restarting")
+        self._spawn()
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                try: self._conn.send(None)
+                except Exception: pass
+            if self._proc is not None:
+                self._proc.join(timeout=5)
+                if self._proc.is_alive(): self._proc.kill()
+            self._proc = self._conn = None
+            self._shm.close()
+            self._shm.unlink()
+
+    # ── model-like interface ──────────────────────────────
+    def predict(self, source, **kwargs):
+        arrs = source if isinstance(source, list) else [source]
+        if len(arrs) > self.slots:
+            raise ValueError(f"batch of {len(arrs)} > {self.slots} shared-memory slots")
+        kwargs.pop('stream', None)
+        with self._lock:
+            self._ensure_running()
+            items = []
+            for slot, arr in enumerate(arrs):
+                if arr.dtype != np.uint8 or arr.size > self.slot_bytes:
+                    raise ValueError(f"frame {arr.shape} {arr.dtype} does not fit a slot")
+                view = np.ndarray(arr.shape, np.uint8, buffer=self._shm.buf,
+                                  offset=slot * self.slot_bytes)
+                np.copyto(view, arr)
+                del view
+                items.append((slot, arr.shape))
+            req_id = next(self._ids)
+            deadline = time.monotonic() + self.timeout
+            try:
+                self._conn.send((req_id, items, kwargs))
+                while True:
+                    if not self._conn.poll(max(0.0, deadline - time.monotonic())):
+                        self._kill(f"no result after {self.timeout}s")
+                        raise RuntimeError("inference timed out")
+                    got_id, out = self._conn.recv()
+                    if got_id == req_id:
+                        break
+                    print(f"[ML-PROC] Dropping stale reply {got_id} (waiting for {req_id})")
+            except (EOFError, OSError) as e:
+                self._kill(f"pipe error: {e!r}")
+                raise RuntimeError("inference worker died") from e
+            self.requests += 1
+        if isinstance(out, Exception):
+            raise out
+        return [Result(*o) for o in out]
+
+    def stats(self):
+        return {"pid": self._proc.pid if self._proc else None,
+                "alive": bool(self._proc and self._proc.is_alive()),
+                "restarts": max(0, self.restarts), "requests": self.requests}
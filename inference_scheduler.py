@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+inference_scheduler.py — budget YOLO runs across cameras by measured latency.
+
+Running predict on every new frame falls behind as soon as inference is
+slower than the camera frame rate, and then both cameras lag equally.
+InferenceScheduler measures how long each image takes and decides which
+cameras are due:
+
+    sched = InferenceScheduler((0, 1), is_active=lambda c: ..., floor_hz=2)
+    due   = sched.due(frames)           # subset worth running now
+    t0 = time.monotonic(); model.predict(...)
+    sched.record(due, time.monotonic() - t0)
+
+  - rates are sized so the sum of rate × seconds-per-image stays within
+    max_duty of wall time, leaving CPU for capture and streaming
+  - a camera with an active crash candidate (is_active(cam) True) gets
+    `active_weight` times the share of a quiet one
+  - no camera drops below floor_hz, none goes above max_hz
+
+With a resolution cascade, tier_of(cam) names the tier (e.g. imgsz) the
+camera will run at; latency is measured per tier and the budget charges
+each camera its own tier's cost:
+
+    sched.record(due, elapsed, tier=320)
+
+A cheaper pre-pass that does not count as an inference (e.g. a crash gate)
+feeds only its tier's latency, leaving runs and the last-run times alone:
+
+    sched.record_latency("gate", elapsed, n_images)
+
+Frames that pass due() but are then scored by such a pre-pass count as
+checked whether or not they go on: mark_checked() restarts their camera's
+interval without counting a run, so the pre-pass stays within the rate
+due() allows instead of running on every new frame of a quiet camera.
+
+    sched.mark_checked(due)
+"""
+
+import threading
+import time
+
+
+class InferenceScheduler:
+    def __init__(self, cams, is_active, floor_hz=2.0, max_hz=15.0,
+                 active_weight=4.0, max_duty=0.8, alpha=0.2, initial_latency=0.2,
+                 tier_of=None):
+        self.cams          = tuple(cams)
+        self.is_active     = is_active
+        self.floor_hz      = floor_hz
+        self.max_hz        = max_hz
+        self.active_weight = active_weight
+        self.max_duty      = max_duty
+        self.alpha         = alpha
+        self.tier_of       = tier_of or (lambda cam: None)
+        self.initial_latency = initial_latency
+        self.latency       = {}                # tier → EWMA seconds per image
+        self._lock     = threading.Lock()
+        self._last_run = {c: 0.0 for c in self.cams}
+        self._rates    = {c: max_hz for c in self.cams}
+        self.runs      = {c: 0 for c in self.cams}
+        self.deferred  = {c: 0 for c in self.cams}
+
+    def rates(self):
+        """Target inferences per second for every camera right now."""
+        weights = {c: self.active_weight if self.is_active(c) else 1.0 for c in self.cams}
+        cost    = {c: max(self.latency.get(self.tier_of(c), self.initial_latency), 1e-4)
+                   for c in self.cams}
+        # rate_c = k·w_c with Σ rate_c·cost_c = max_duty
+        k     = self.max_duty / sum(weights[c] * cost[c] for c in self.cams)
+        rates = {c: min(self.max_hz, max(self.floor_hz, k * w)) for c, w in weights.items()}
+        with self._lock:
+            self._rates = rates
+        return rates
+
+    def due(self, frames, now=None):
+        """Frames (one per camera, any may be None) whose camera is due for inference."""
+        now   = time.monotonic() if now is None else now
+        rates = self.rates()
+        out   = []
+        with self._lock:
+            for f in frames:
+                if f is None:
+                    continue
+                if now - self._last_run[f.cam] >= 1.0 / rates[f.cam]:
+                    out.append(f)
+                else:
+                    self.deferred[f.cam] += 1
+        return out
+
+    def record(self, frames, elapsed, tier=None, now=None):
+        """Feed back one predict call that covered `frames` and took `elapsed` s."""
+        if not frames:
+            return
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._update_latency(tier, elapsed / len(frames))
+            for f in frames:
+                self._last_run[f.cam] = now
+                self.runs[f.cam] += 1
+
+    def mark_checked(self, frames, now=None):
+        """`frames` were scored (e.g. by a gate): restart their interval, no run."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            for f in frames:
+                self._last_run[f.cam] = now
+
+    def record_latency(self, tier, elapsed, images):
+        """Latency sample for `tier` only: `images` images took `elapsed` s."""
+        if images:
+            with self._lock:
+                self._update_latency(tier, elapsed / images)
+
+    def _update_latency(self, tier, per_image):
+        # caller holds _lock
+        lat = self.latency.get(tier, self.initial_latency)
+        self.latency[tier] = lat + self.alpha * (per_image - lat)
+
+    def stats(self):
+        with self._lock:
+            return {"latency_ms": {str(t): round(l * 1000, 1) for t, l in self.latency.items()},
+                    "rates_hz":   {c: round(r, 2) for c, r in self._rates.items()},
+                    "runs":       dict(self.runs),
+                    "deferred":   dict(self.deferred)}
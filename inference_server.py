@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+"""
+inference_server.py — run the accident model on a LAN box for several Pis.
+
+SERVER (any machine with the model and its runtime):
+    python inference_server.py --model accident_model_latest.pt --port 8500
+
+  POST /infer   body = concatenated JPEGs, X-Lengths: "n1,n2,..."
+                X-Imgsz, X-Conf, X-Classes ("0,3"), X-Deadline-Ms
+                → {"results": [{"xyxy": [[...]], "conf": [...], "cls": [...]}],
+                   "queue_ms", "infer_ms", "batch"}
+  GET  /info    model names + path
+  GET  /stats   batches, mean batch size, queue/infer latency, expired
+
+Requests from every camera and every Pi go into one queue. The batcher
+closes a batch when it is full, when the oldest request has waited
+max_wait, or when the earliest deadline minus the expected inference time
+is reached, whichever comes first. Requests already past their deadline
+are answered 504 without being inferred.
+
+CLIENT (camera-server.py with ML_REMOTE_URL set):
+    model = RemoteModel("http://192.168.1.50:8500", fallback_loader=...)
+    model.predict(source=[rgb0, rgb1], imgsz=640, conf=0.5)
+
+Frames are downscaled to imgsz on the long side (the model would
+letterbox them to that anyway) and sent as JPEG. If the server cannot be
+reached, the fallback model is loaded in the background and used
+on-device until the server answers again (re-probed every retry_s).
+"""
+
+import collections
+import io
+import threading
+import time
+
+import numpy as np
+from PIL import Image
+
+from inference_backends import Result
+
+
+def _percentiles(values):
+    if not values:
+        return {"p50": None, "p95": None}
+    v = np.asarray(values) * 1000
+    return {"p50": round(float(np.percentile(v, 50)), 1),
+            "p95": round(float(np.percentile(v, 95)), 1)}
+
+
+# ─────────────────── SERVER ─────────────────────────
+class _Pending:
+    __slots__ = ('images', 'key', 'deadline', 'arrived', 'done', 'result', 'error')
+
+    def __init__(self, images, key, deadline):
+        self.images   = images
+        self.key      = key          # (imgsz, conf, classes): must match to share a batch
+        self.deadline = deadline
+        self.arrived  = time.monotonic()
+        self.done     = threading.Event()
+        self.result   = None
+        self.error    = None
+
+
+class Batcher:
+    def __init__(self, model, max_batch=8, max_wait=0.03):
+        self.model     = model
+        self.max_batch = max_batch
+        self.max_wait  = max_wait
+        self._cond     = threading.Condition()
+        self._queue    = []
+        self.per_image = 0.05        # EWMA inference seconds per image
+        self.batches   = 0
+        self.images    = 0
+        self.expired   = 0
+        self.sizes     = collections.Counter()
+        self.queue_t   = collections.deque(maxlen=500)
+        self.infer_t   = collections.deque(maxlen=500)
+        threading.Thread(target=self._run, daemon=True, name="batcher").start()
+
+    def submit(self, images, key, deadline):
+        p = _Pending(images, key, deadline)
+        with self._cond:
+            self._queue.append(p)
+            self._cond.notify_all()
+        return p
+
+    def _close_at(self):
+        # caller holds _cond; queue not empty
+        n = sum(len(p.images) for p in self._queue)
+        if n >= self.max_batch:
+            return 0.0
+        first    = min(p.arrived for p in self._queue)
+        deadline = min(p.deadline for p in self._queue)
+        return min(first + self.max_wait, deadline - self.per_image * (n + 1))
+
+    def _take(self):
+        with self._cond:
+            while True:
+                while not self._queue:
+                    self._cond.wait()
+                delay = self._close_at() - time.monotonic()
+                if delay <= 0:
+                    break
+                self._cond.wait(delay)
+            now, key = time.monotonic(), self._queue[0].key
+            batch, rest, n = [], [], 0
+            for p in self._queue:
+                if p.deadline < now:
+                    p.error = "deadline passed"; p.done.set(); self.expired += 1
+                elif p.key == key and (n == 0 or n + len(p.images) <= self.max_batch):
+                    batch.append(p); n += len(p.images)
+                else:
+                    rest.append(p)
+            self._queue = rest
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._take()
+            if not batch:
+                continue
+            imgsz, conf, classes = batch[0].key
+            images = [im for p in batch for im in p.images]
+            t0 = time.monotonic()
+            try:
+                results = self.model.predict(source=images, imgsz=imgsz, conf=conf,
+                                             classes=list(classes) if classes else None,
+                                             verbose=False)
+                err = None
+            except Exception as e:
+                results, err = None, str(e)
+            elapsed = time.monotonic() - t0
+            self.per_image += 0.2 * (elapsed / len(images) - self.per_image)
+            self.batches += 1; self.images += len(images); self.sizes[len(images)] += 1
+            self.infer_t.append(elapsed)
+            i = 0
+            for p in batch:
+                self.queue_t.append(t0 - p.arrived)
+                if err:
+                    p.error = err
+                else:
+                    p.result = (results[i:i + len(p.images)], t0 - p.arrived, elapsed, len(images))
+                i += len(p.images)
+                p.done.set()
+
+    def stats(self):
+        return {"batches": self.batches, "images": self.images, "expired": self.expired,
+                "mean_batch": round(self.images / self.batches, 2) if self.batches else None,
+                "batch_sizes": dict(self.sizes),
+                "per_image_ms": round(self.per_image * 1000, 1),
+                "queue_ms": _percentiles(list(self.queue_t)),
+                "infer_ms": _percentiles(list(self.infer_t))}
+
+
+def _to_list(t):
+    return (t.cpu().numpy() if hasattr(t, 'cpu') else np.asarray(t)).tolist()
+
+
+def make_app(model, model_path, batcher):
+    from flask import Flask, request, jsonify
+    app = Flask(__name__)
+
+    @app.route('/info')
+    def info():
+        return jsonify({"names": {int(k): v for k, v in model.names.items()},
+                        "model": model_path})
+
+    @app.route('/stats')
+    def stats():
+        return jsonify(batcher.stats())
+
+    @app.route('/infer', methods=['POST'])
+    def infer():
+        body    = request.get_data()
+        lengths = [int(n) for n in request.headers.get('X-Lengths', str(len(body))).split(',')]
+        images, off = [], 0
+        for n in lengths:
+            images.append(np.asarray(Image.open(io.BytesIO(body[off:off + n])).convert('RGB')))
+            off += n
+        classes = request.headers.get('X-Classes')
+        key = (int(request.headers.get('X-Imgsz', 640)),
+               float(request.headers.get('X-Conf', 0.25)),
+               tuple(int(c) for c in classes.split(',')) if classes else None)
+        budget = float(request.headers.get('X-Deadline-Ms', 1000)) / 1000
+        p = batcher.submit(images, key, time.monotonic() + budget)
+        if not p.done.wait(budget + 5):
+            return jsonify({"error": "timed out"}), 504
+        if p.error:
+            return jsonify({"error": p.error}), 504 if p.error == "deadline passed" else 500
+        results, queued, infer_s, batch = p.result
+        return jsonify({
+            "results": [{"xyxy": _to_list(r.boxes.xyxy), "conf": _to_list(r.boxes.conf),
+                         "cls": _to_list(r.boxes.cls)} for r in results],
+            "queue_ms": round(queued * 1000, 1), "infer_ms": round(infer_s * 1000, 1),
+            "batch": batch})
+
+    return app
+
+
+# ─────────────────── CLIENT ─────────────────────────
+class RemoteModel:
+    """
+    Model-like client for a remote inference_server with on-device fallback.
+    The fallback starts loading in the background as soon as the client is
+    created (preload_fallback=False: on the first remote failure), so a
+    missed deadline does not leave frames undetected while it loads.
+    """
+
+    def __init__(self, url, fallback_loader=None, deadline=0.5, retry_s=10.0,
+                 quality=85, names=None, preload_fallback=True):
+        import requests
+        self.url      = url.rstrip('/')
+        self.deadline = deadline
+        self.retry_s  = retry_s
+        self.quality  = quality
+        self._session = requests.Session()
+        self._fallback_loader = fallback_loader
+        self._fallback = None
+        self._fallback_loading = False
+        self._fallback_lock = threading.Lock()
+        self._down_until = 0.0
+        self.names = names
+        self.remote_calls = self.remote_failures = self.fallback_calls = 0
+        self.rtt      = collections.deque(maxlen=200)
+        self.server_q = collections.deque(maxlen=200)
+        self.server_i = collections.deque(maxlen=200)
+        try:
+            info = self._session.get(f"{self.url}/info", timeout=2).json()
+            self.names = {int(k): v for k, v in info["names"].items()}
+            print(f"[REMOTE] Using {self.url} ({info.get('model')})")
+        except Exception as e:
+            print(f"[REMOTE] {self.url} unreachable ({e}) — falling back to on-device")
+            self._down_until = time.monotonic() + self.retry_s
+            if self.names is None:
+                # need names now: load synchronously, and fail loudly
+                if self._fallback_loader is None:
+                    raise RuntimeError(f"remote inference at {self.url} unreachable "
+                                       f"and no on-device fallback configured") from e
+                self._fallback_loading = True
+                try:
+                    self._load_fallback(reraise=True)
+                except Exception as le:
+                    raise RuntimeError(f"remote inference at {self.url} unreachable and "
+                                       f"the on-device fallback failed to load: {le}") from le
+                self.names = self._fallback.names
+        if preload_fallback:
+            self._start_fallback_load()
+
+    def _load_fallback(self, reraise=False):
+        # caller sets _fallback_loading
+        try:
+            self._fallback = self._fallback_loader()
+            print("[REMOTE] On-device fallback model ready")
+        except Exception as e:
+            print(f"[REMOTE] Fallback load failed: {e}")
+            if reraise:
+                raise
+        finally:
+            self._fallback_loading = False
+
+    def _start_fallback_load(self):
+        with self._fallback_lock:
+            if self._fallback is not None or not self._fallback_loader or self._fallback_loading:
+                return
+            self._fallback_loading = True
+        threading.Thread(target=self._load_fallback, daemon=True,
+                         name="remote-fallback-load").start()
+
+    def _mark_down(self):
+        self._down_until = time.monotonic() + self.retry_s
+        self._start_fallback_load()           # retries a failed preload
+
+    def _encode(self, arr, imgsz):
+        img = Image.fromarray(arr)
+        scale = imgsz / max(img.size)
+        if scale < 1:
+            img = img.resize((round(img.width * scale), round(img.height * scale)), Image.BILINEAR)
+        else:
+            scale = 1.0
+        buf = io.BytesIO()
+        img.save(buf, format='JPEG', quality=self.quality)
+        return buf.getvalue(), scale
+
+    def _remote(self, arrs, imgsz, conf, classes):
+        enc = [self._encode(a, imgsz) for a in arrs]
+        headers = {'Content-Type': 'application/octet-stream',
+                   'X-Lengths': ','.join(str(len(j)) for j, _ in enc),
+                   'X-Imgsz': str(imgsz), 'X-Conf': str(conf),
+                   'X-Deadline-Ms': str(int(self.deadline * 1000))}
+        if classes:
+            headers['X-Classes'] = ','.join(str(int(c)) for c in classes)
+        t0 = time.monotonic()
+        r = self._session.post(f"{self.url}/infer", data=b''.join(j for j, _ in enc),
+                               headers=headers, timeout=self.deadline + 1.0)
+        r.raise_for_status()
+        data = r.json()
+        self.rtt.append(time.monotonic() - t0)
+        self.server_q.append(data["queue_ms"] / 1000)
+        self.server_i.append(data["infer_ms"] / 1000)
+        out = []
+        for res, (_, scale) in zip(data["results"], enc):
+            xyxy = np.asarray(res["xyxy"], dtype=np.float32).reshape(-1, 4) / scale
+            out.append(Result(xyxy, np.asarray(res["conf"], dtype=np.float32),
+                              np.asarray(res["cls"], dtype=np.float32)))
+        return out
+
+    def predict(self, source, imgsz=640, conf=0.25, classes=None, **kw):
+        arrs = source if isinstance(source, list) else [source]
+        if time.monotonic() >= self._down_until:
+            try:
+                out = self._remote(arrs, imgsz, conf, classes)
+                self.remote_calls += 1
+                return out
+            except Exception as e:
+                self.remote_failures += 1
+                print(f"[REMOTE] {self.url} failed ({e}) — on-device for {self.retry_s:.0f}s")
+                self._mark_down()
+        if self._fallback is None:
+            raise RuntimeError("remote inference down and fallback model not loaded yet")
+        self.fallback_calls += 1
+        return self._fallback.predict(source=arrs, imgsz=imgsz, conf=conf,
+                                      classes=classes, **kw)
+
+    def close(self):
+        if self._fallback is not None and hasattr(self._fallback, 'close'):
+            self._fallback.close()
+
+    def stats(self):
+        return {"url": self.url,
+                "remote_up": time.monotonic() >= self._down_until,
+                "remote_calls": self.remote_calls, "remote_failures": self.remote_failures,
+                "fallback_calls": self.fallback_calls,
+                "fallback_loaded": self._fallback is not None,
+                "rtt_ms": _percentiles(list(self.rtt)),
+                "server_queue_ms": _percentiles(list(self.server_q)),
+                "server_infer_ms": _percentiles(list(self.server_i))}
+
+
+if __name__ == "__main__":
+    import argparse
+    import logging
+    from inference_backends import load_model
+
+    ap = argparse.ArgumentParser(description="Batched remote inference server for camera-server.py")
+    ap.add_argument("--model", default="accident_model_latest.pt")
+    ap.add_argument("--host", default="0.0.0.0")
+    ap.add_argument("--port", type=int, default=8500)
+    ap.add_argument("--max-batch", type=int, default=8)
+    ap.add_argument("--max-wait-ms", type=float, default=30)
+    args = ap.parse_args()
+
+    model = load_model(args.model)
+    batcher = Batcher(model, args.max_batch, args.max_wait_ms / 1000)
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    print(f"[SERVER] {args.model} on http://{args.host}:{args.port} "
+          f"(batch ≤{args.max_batch}, wait ≤{args.max_wait_ms:.0f} ms)")
+    make_app(model, args.model, batcher).run(host=args.host, port=args.port, threaded=True)
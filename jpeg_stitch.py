@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+jpeg_stitch.py — side-by-side / stacked JPEGs without decoding a pixel.
+
+Two baseline JPEGs of the same height can be joined in the compressed
+domain when their scans are cut into restart intervals that line up with
+MCU rows: every interval starts with fresh DC predictors, so whole
+intervals can be re-ordered freely. The combined image is
+
+    header  SOF with the summed width (or height), the shared DQT/DHT/DRI
+    scan    for each MCU row: left's intervals, then right's, with the
+            RSTn markers renumbered 0..7 in the new order
+
+which costs a few regex splits and a join — no IDCT, no re-quantization,
+no generation loss:
+
+    jpeg = stitch_h([front_jpeg, rear_jpeg])          # None → incompatible
+    jpeg = stitch_v([header_strip, jpeg])             # stacked, same width
+    jpeg = stitch_tile(frame_jpeg, badge_jpeg)        # top-left corner replaced
+    reason = why_not([front_jpeg, rear_jpeg])         # for logging / stats
+
+Compatible means: baseline (SOF0/SOF1) Huffman, identical component layout
+and sampling, identical quantization and Huffman tables, the same non-zero
+restart interval (DRI) dividing each image's MCUs per row, and — for
+every image but the last in a row — a width that is a whole number of
+MCUs. Camera streams without DRI (e.g. test.mjpeg) are not compatible;
+callers fall back to the pixel path.
+
+encode_like(img, ref_jpeg) encodes a PIL image with ref's tables,
+subsampling and restart interval (Pillow ≥ 11.1 for restart markers), so
+a drawn overlay or header strip can be stitched in with the camera frames.
+
+Run `python jpeg_stitch.py a.jpg b.jpg out.jpg` to stitch two files.
+"""
+
+import io
+import re
+import struct
+
+SOF_BASELINE = (0xC0, 0xC1)
+_RST = re.compile(rb'\xff[\xd0-\xd7]')
+
+
+class JpegParts:
+    """Marker segments and entropy-coded intervals of one baseline JPEG."""
+
+    __slots__ = ('app', 'dqt', 'dht', 'sof_marker', 'precision', 'height', 'width',
+                 'comps', 'dri', 'sos', 'intervals')
+
+    @property
+    def mcu_size(self):
+        hmax = max(c[1] for c in self.comps)
+        vmax = max(c[2] for c in self.comps)
+        return 8 * hmax, 8 * vmax
+
+    @property
+    def mcus_per_row(self):
+        return -(-self.width // self.mcu_size[0])
+
+    @property
+    def mcu_rows(self):
+        return -(-self.height // self.mcu_size[1])
+
+    @property
+    def intervals_per_row(self):
+        return self.mcus_per_row // self.dri
+
+    def layout(self):
+        """What must match for two images to share one scan."""
+        return (self.sof_marker, self.precision, self.comps, self.dqt, self.dht,
+                self.dri, self.sos)
+
+
+def parse(jpeg):
+    """JpegParts for a baseline JPEG; ValueError for anything else."""
+    if jpeg[:2] != b'\xff\xd8':
+        raise ValueError("not a JPEG")
+    p = JpegParts()
+    p.app, p.dqt, p.dht = [], {}, {}
+    p.sof_marker = p.dri = p.sos = None
+    i, n = 2, len(jpeg)
+    while i < n:
+        if jpeg[i] != 0xFF:
+            raise ValueError(f"bad marker at {i}")
+        marker = jpeg[i + 1]
+        if marker == 0xFF:                       # fill byte
+            i += 1
+            continue
+        length = struct.unpack('>H', jpeg[i + 2:i + 4])[0]
+        body = jpeg[i + 4:i + 2 + length]
+        if marker == 0xDB:                       # DQT: may hold several tables
+            j = 0
+            while j < len(body):
+                pq, tq = body[j] >> 4, body[j] & 15
+                size = 64 * (2 if pq else 1)
+                p.dqt[tq] = body[j:j + 1 + size]
+                j += 1 + size
+        elif marker == 0xC4:                     # DHT: may hold several tables
+            j = 0
+            while j < len(body):
+                count = sum(body[j + 1:j + 17])
+                p.dht[body[j]] = body[j:j + 17 + count]
+                j += 17 + count
+        elif marker in SOF_BASELINE:
+            p.sof_marker = marker
+            p.precision, p.height, p.width, nc = struct.unpack('>BHHB', body[:6])
+            p.comps = tuple((body[6 + 3 * k], body[7 + 3 * k] >> 4, body[7 + 3 * k] & 15,
+                             body[8 + 3 * k]) for k in range(nc))
+        elif 0xC2 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            raise ValueError(f"SOF{marker - 0xC0} (not baseline) not supported")
+        elif marker == 0xDD:
+            p.dri = struct.unpack('>H', body[:2])[0]
+        elif marker == 0xDA:
+            if p.sof_marker is None:
+                raise ValueError("SOS before SOF")
+            p.sos = body
+            end = jpeg.rfind(b'\xff\xd9')
+            scan = jpeg[i + 2 + length:end if end > i else n]
+            p.intervals = _RST.split(scan)
+            p.dqt = tuple(sorted(p.dqt.items()))
+            p.dht = tuple(sorted(p.dht.items()))
+            return p
+        elif 0xE0 <= marker <= 0xEF and not p.app:
+            p.app.append(jpeg[i:i + 2 + length])   # keep the first APPn (JFIF)
+        i += 2 + length
+    raise ValueError("no scan")
+
+
+def _check(parts, axis):
+    a = parts[0]
+    for p in parts:
+        if p.layout() != a.layout():
+            for name, x, y in zip(("SOF type", "precision", "components/sampling",
+                                   "quantization tables", "Huffman tables",
+                                   "restart interval", "scan header"),
+                                  p.layout(), a.layout()):
+                if x != y:
+                    return f"{name} differ"
+        if not p.dri:
+            return "no restart interval (DRI)"
+        if p.mcus_per_row % p.dri:
+            return f"restart interval {p.dri} does not divide {p.mcus_per_row} MCUs/row"
+        if len(p.intervals) != p.mcu_rows * p.intervals_per_row:
+            return "restart marker count does not match the image size"
+    mw, mh = a.mcu_size
+    if axis == 'h':
+        if any(p.height != a.height for p in parts):
+            return "heights differ"
+        if any(p.width % mw for p in parts[:-1]):
+            return f"width not a multiple of the {mw}px MCU"
+    elif axis == 'v':
+        if any(p.width != a.width for p in parts):
+            return "widths differ"
+        if any(p.height % mh for p in parts[:-1]):
+            return f"height not a multiple of the {mh}px MCU"
+    else:                                        # 'tile': parts[1] over parts[0]
+        t = parts[1]
+        if t.width > a.width or t.height > a.height:
+            return "tile larger than the image"
+        if t.height % mh and t.height != a.height:
+            return f"tile height not a multiple of the {mh}px MCU"
+    return None
+
+
+def why_not(jpegs, axis='h'):
+    """None if `jpegs` can be stitched along `axis`, else the reason."""
+    try:
+        return _check([parse(j) for j in jpegs], axis)
+    except ValueError as e:
+        return str(e)
+
+
+def _assemble(a, width, height, intervals):
+    out = [b'\xff\xd8']
+    out += a.app
+    for tq, table in a.dqt:
+        out.append(b'\xff\xdb' + struct.pack('>H', 2 + len(table)) + table)
+    sof = struct.pack('>BHHB', a.precision, height, width, len(a.comps))
+    sof += b''.join(struct.pack('>BBB', cid, (h << 4) | v, tq) for cid, h, v, tq in a.comps)
+    out.append(bytes((0xFF, a.sof_marker)) + struct.pack('>H', 2 + len(sof)) + sof)
+    for tc_th, table in a.dht:
+        out.append(b'\xff\xc4' + struct.pack('>H', 2 + len(table)) + table)
+    out.append(b'\xff\xdd\x00\x04' + struct.pack('>H', a.dri))
+    out.append(b'\xff\xda' + struct.pack('>H', 2 + len(a.sos)) + a.sos)
+    for k, data in enumerate(intervals):
+        if k:
+            out.append(bytes((0xFF, 0xD0 + (k - 1) % 8)))
+        out.append(data)
+    out.append(b'\xff\xd9')
+    return b''.join(out)
+
+
+def stitch_h(jpegs):
+    """Left-to-right join of same-height JPEGs, or None if incompatible."""
+    try:
+        parts = [parse(j) for j in jpegs]
+    except ValueError:
+        return None
+    if _check(parts, 'h'):
+        return None
+    a = parts[0]
+    intervals = []
+    for row in range(a.mcu_rows):
+        for p in parts:
+            k = p.intervals_per_row
+            intervals += p.intervals[row * k:(row + 1) * k]
+    return _assemble(a, sum(p.width for p in parts), a.height, intervals)
+
+
+def stitch_v(jpegs):
+    """Top-to-bottom join of same-width JPEGs, or None if incompatible."""
+    try:
+        parts = [parse(j) for j in jpegs]
+    except ValueError:
+        return None
+    if _check(parts, 'v'):
+        return None
+    intervals = [iv for p in parts for iv in p.intervals]
+    return _assemble(parts[0], parts[0].width, sum(p.height for p in parts), intervals)
+
+
+def stitch_tile(jpeg, tile):
+    """
+    `jpeg` with its top-left corner replaced by the smaller JPEG `tile`, or
+    None if incompatible. The tile's restart intervals replace the image's
+    one for one, so its width must be a whole number of intervals.
+    """
+    try:
+        a, t = parse(jpeg), parse(tile)
+    except ValueError:
+        return None
+    if _check([a, t], 'tile'):
+        return None
+    k, kt = a.intervals_per_row, t.intervals_per_row
+    intervals = list(a.intervals)
+    for row in range(t.mcu_rows):
+        intervals[row * k:row * k + kt] = t.intervals[row * kt:(row + 1) * kt]
+    return _assemble(a, a.width, a.height, intervals)
+
+
+def encode_like(img, ref_jpeg):
+    """Encode a PIL RGB image so it can be stitched with `ref_jpeg`: same
+    quantization tables, subsampling and restart interval. None if ref has
+    no restart interval or the result still does not match."""
+    from PIL import Image
+    ref = parse(ref_jpeg)
+    if not ref.dri or len(ref.comps) != 3:
+        return None
+    y, cb = ref.comps[0], ref.comps[1]
+    subsampling = {(1, 1): 0, (2, 1): 1, (2, 2): 2}.get((y[1] // cb[1], y[2] // cb[2]))
+    if subsampling is None:
+        return None
+    qtables = Image.open(io.BytesIO(ref_jpeg)).quantization
+    out = io.BytesIO()
+    img.save(out, format='JPEG', qtables=qtables, subsampling=subsampling,
+             restart_marker_blocks=ref.dri)
+    jpeg = out.getvalue()
+    try:
+        p = parse(jpeg)
+    except ValueError:
+        return None
+    return jpeg if p.layout() == ref.layout() else None
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    if len(sys.argv) != 4:
+        sys.exit("usage: python jpeg_stitch.py left.jpg right.jpg out.jpg")
+    a, b = (open(f, 'rb').read() for f in sys.argv[1:3])
+    reason = why_not([a, b])
+    if reason:
+        sys.exit(f"cannot stitch: {reason}")
+    t0 = time.perf_counter()
+    out = stitch_h([a, b])
+    dt = time.perf_counter() - t0
+    with open(sys.argv[3], 'wb') as f:
+        f.write(out)
+    print(f"{sys.argv[3]}: {len(out)} B in {dt * 1000:.2f} ms")
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+mjpeg_stream.py — zero-copy MJPEG stream demuxer for the Pi camera servers.
+
+Splits the raw `rpicam-vid --codec mjpeg -o -` byte stream into JPEG frames
+without the `buffer += chunk` / `buffer = buffer[eoi+2:]` copying of the old
+camera_thread loop:
+
+  - one preallocated bytearray, filled in place with readinto()
+  - SOI/EOI search resumes where the previous scan stopped, so no byte is
+    scanned twice
+  - the only memmove is a partial trailing frame when the buffer wraps
+
+HOW TO USE:
+    from mjpeg_stream import MjpegDemuxer
+
+    for frame in MjpegDemuxer(process.stdout, frame_timeout=10):
+        publish(frame)            # bytes, safe to keep
+
+  Pass copy=False to get memoryviews into the ring instead; those are only
+  valid until the next frame is requested.
+
+BENCHMARK:
+    python mjpeg_stream.py test.mjpeg --repeat 20
+"""
+
+import time
+
+SOI = b'\xff\xd8'
+EOI = b'\xff\xd9'
+
+
+class MjpegDemuxer:
+    """Iterator of JPEG frames read from a binary stream."""
+
+    def __init__(self, stream, bufsize=1024 * 1024, read_size=64 * 1024,
+                 min_frame=1024, frame_timeout=None, copy=True):
+        if read_size >= bufsize:
+            raise ValueError("read_size must be smaller than bufsize")
+        self.stream        = stream
+        self.read_size     = read_size
+        self.min_frame     = min_frame
+        self.frame_timeout = frame_timeout
+        self.copy          = copy
+
+        self._buf  = bytearray(bufsize)
+        self._view = memoryview(self._buf)
+
+        # Counters (read by status/benchmark code)
+        self.bytes_read = 0
+        self.frames     = 0
+        self.dropped    = 0   # runt frames shorter than min_frame
+        self.overflows  = 0   # partial frames larger than the whole buffer
+        self.compactions = 0
+
+    def __iter__(self):
+        return self._frames()
+
+    def _frames(self):
+        buf, view = self._buf, self._view
+        size      = len(buf)
+        readinto  = self.stream.readinto
+        start = 0      # first byte still needed
+        end   = 0      # write position
+        scan  = 0      # next byte to search from
+        soi   = -1     # start of the frame being assembled, -1 if none
+        last_frame_time = time.monotonic()
+
+        while True:
+            # ── Make room for the next read ───────────────
+            if size - end < self.read_size:
+                if start > 0:
+                    pending = end - start
+                    view[:pending] = view[start:end]
+                    if soi >= 0: soi -= start
+                    scan -= start
+                    start, end = 0, pending
+                    self.compactions += 1
+                if size - end < self.read_size:
+                    # A single frame filled the buffer — drop it and resync
+                    start = end = scan = 0; soi = -1
+                    self.overflows += 1
+
+            n = readinto(view[end:end + self.read_size])
+            if not n:
+                return
+            end += n
+            self.bytes_read += n
+
+            # ── Incremental SOI/EOI scan ──────────────────
+            while True:
+                if soi < 0:
+                    i = buf.find(SOI, scan, end)
+                    if i < 0:
+                        # Keep a trailing 0xFF: it may be half of the next SOI
+                        scan = start = max(start, end - 1)
+                        break
+                    soi = start = i
+                    scan = i + 2
+                j = buf.find(EOI, scan, end)
+                if j < 0:
+                    scan = max(scan, end - 1)
+                    break
+                stop = j + 2
+                if stop - soi < self.min_frame:
+                    self.dropped += 1
+                else:
+                    self.frames += 1
+                    last_frame_time = time.monotonic()
+                    yield bytes(view[soi:stop]) if self.copy else view[soi:stop]
+                start = scan = stop
+                soi = -1
+
+            if (self.frame_timeout is not None
+                    and time.monotonic() - last_frame_time > self.frame_timeout):
+                raise TimeoutError(f"no frame for {self.frame_timeout}s")
+
+
+# ─────────────────── BENCHMARK ──────────────────────
+class _ChunkedReader:
+    """In-memory stand-in for a pipe: short reads of at most `limit` bytes."""
+
+    def __init__(self, data, limit):
+        self._view  = memoryview(data)
+        self._pos   = 0
+        self._limit = limit
+
+    def read(self, n):
+        n   = min(n, self._limit)
+        out = self._view[self._pos:self._pos + n].tobytes()
+        self._pos += len(out)
+        return out
+
+    def readinto(self, b):
+        n = min(len(b), self._limit, len(self._view) - self._pos)
+        b[:n] = self._view[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+
+def _legacy_split(stream):
+    """The original camera_thread splitter, kept verbatim for comparison."""
+    buffer = b''
+    while True:
+        chunk = stream.read(8192)
+        if not chunk: return
+        buffer += chunk
+        if len(buffer) > 4*1024*1024: buffer = b''; continue
+        while True:
+            soi = buffer.find(SOI)
+            if soi == -1: break
+            eoi = buffer.find(EOI, soi+2)
+            if eoi == -1: break
+            frame = buffer[soi:eoi+2]; buffer = buffer[eoi+2:]
+            if len(frame) < 1024: continue
+            yield frame
+
+
+def _bench(name, make_iter, data, pipe_chunk):
+    t0 = time.perf_counter()
+    frames = sum(1 for _ in make_iter(_ChunkedReader(data, pipe_chunk)))
+    dt = time.perf_counter() - t0
+    print(f"  {name:<22} {frames:6d} frames  {dt*1000:8.1f} ms  "
+          f"{len(data)/dt/1e6:8.1f} MB/s  {frames/dt:9.0f} fps")
+    return frames
+
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="MJPEG demuxer throughput benchmark")
+    ap.add_argument("path", nargs="?", default="test.mjpeg")
+    ap.add_argument("--repeat", type=int, default=20,
+                    help="concatenate the file N times (default 20)")
+    ap.add_argument("--pipe-chunk", type=int, default=64 * 1024,
+                    help="max bytes returned per read, like a pipe (default 64K)")
+    args = ap.parse_args()
+
+    with open(args.path, "rb") as f:
+        data = f.read() * args.repeat
+    print(f"{args.path} x{args.repeat}: {len(data)/1e6:.1f} MB, pipe reads ≤ {args.pipe_chunk} B")
+
+    n_old  = _bench("legacy bytes splitter", _legacy_split, data, args.pipe_chunk)
+    n_copy = _bench("demuxer (bytes)", MjpegDemuxer, data, args.pipe_chunk)
+    n_view = _bench("demuxer (memoryview)",
+                    lambda s: MjpegDemuxer(s, copy=False), data, args.pipe_chunk)
+    if not n_old == n_copy == n_view:
+        raise SystemExit(f"frame count mismatch: {n_old} / {n_copy} / {n_view}")
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+model_manager.py — load, warm up and hot-swap the detection model.
+
+ml_worker asks the manager for the current model on every pass, so a new
+model file can be brought in without restarting capture or the cloud link:
+
+    manager = ModelManager(build)          # build(path) → LoadedModel, warmed up
+    manager.load("accident_model_latest.pt")               # background
+    lm = manager.current                   # None until the first load finishes
+    lm.model.predict(...); lm.crash_ids
+    manager.load("accident_model_v2.pt")   # old model keeps serving meanwhile
+
+The swap is a single attribute assignment, so a reader sees either the old
+or the new LoadedModel, never a mix. A failed load leaves the old model in
+place. Retired models with a close() (e.g. InferenceProcess) are closed a
+few seconds later, once any predict already holding them has finished.
+"""
+
+import hashlib
+import os
+import threading
+import time
+
+
+class LoadedModel:
+    __slots__ = ('model', 'path', 'crash_ids', 'generation', 'loaded_at',
+                 'timings', 'sha256', 'mtime', 'gate', 'gate_ids')
+
+    def __init__(self, model, path, crash_ids, timings=None, gate=None, gate_ids=None):
+        self.model      = model
+        self.path       = path
+        self.crash_ids  = crash_ids
+        self.gate       = gate if gate is not None else model   # crash-gate model
+        self.gate_ids   = gate_ids if gate is not None else crash_ids
+        self.timings    = timings or {}
+        self.generation = 0
+        self.loaded_at  = None
+        self.sha256     = None
+        self.mtime      = None
+
+    def version(self):
+        return {"path": self.path, "generation": self.generation,
+                "sha256": self.sha256, "mtime": self.mtime,
+                "loaded_at": self.loaded_at, "timings": self.timings}
+
+
+def file_digest(path, chunk=1 << 20):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(chunk), b''):
+            h.update(block)
+    return h.hexdigest()[:12]
+
+
+class ModelManager:
+    def __init__(self, build, retire_after=5.0):
+        self.build        = build
+        self.retire_after = retire_after
+        self.current      = None
+        self._lock        = threading.Lock()
+        self._generation  = 0
+        self.pending      = None     # path being loaded
+        self.error        = None
+
+    def load(self, path, background=True):
+        """Start loading `path`. False if a load is already in progress.
+        background=False loads in the caller and re-raises a load failure."""
+        with self._lock:
+            if self.pending is not None:
+                return False
+            self.pending = path
+            self.error   = None
+        if background:
+            threading.Thread(target=self._load, args=(path,), daemon=True,
+                             name="model-load").start()
+        else:
+            self._load(path, reraise=True)
+        return True
+
+    def _load(self, path, reraise=False):
+        try:
+            if not os.path.isfile(path):
+                raise FileNotFoundError(f"{path} not found")
+            lm = self.build(path)
+            lm.sha256 = file_digest(path)
+            lm.mtime  = os.path.getmtime(path)
+            with self._lock:
+                self._generation += 1
+                lm.generation = self._generation
+                lm.loaded_at  = time.time()
+                old, self.current = self.current, lm
+                self.pending = None
+            print(f"[MODEL] Serving {path} (gen {lm.generation}, sha256 {lm.sha256})")
+            if old is not None and hasattr(old.model, 'close'):
+                threading.Timer(self.retire_after, old.model.close).start()
+        except Exception as e:
+            with self._lock:
+                self.error   = f"{path}: {e}"
+                self.pending = None
+            print(f"[MODEL] Load failed, {'keeping current model' if self.current else 'no model'}: {e}")
+            if reraise:
+                raise
+
+    def status(self):
+        lm = self.current
+        if self.pending is not None:
+            state = "reloading" if lm else "loading"
+        elif lm is None:
+            state = "error" if self.error else "loading"
+        else:
+            state = "ready"
+        return {"state": state, "pending": self.pending, "error": self.error,
+                "version": lm.version() if lm else None}
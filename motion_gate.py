@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+motion_gate.py — skip YOLO on frames that look like the last one inferred.
+
+On a parked bike most frames are nearly identical. MotionGate keeps an
+80×60 grayscale thumbnail of the last frame each camera sent to the model
+and scores new frames by mean absolute difference (0–255 grey levels):
+
+    gate = MotionGate({0: {"threshold": 4.0, "static_interval": 2.0}, 1: {...}})
+    if gate.should_infer(frame):   # moved enough, or static for too long
+        ...run the model...
+
+Thumbnails are cheap: JPEGs are decoded in draft mode (DCT scaled 1/8, luma
+only) and raw YUV420 frames just subsample their Y plane, so the gate costs
+about a third of a full decode per frame. A static scene is still re-checked
+every `static_interval` seconds, and force=True (e.g. while a crash
+candidate is being confirmed) always passes.
+
+Run `python motion_gate.py test.mjpeg` to print scores and timing.
+"""
+
+import io
+import threading
+import time
+
+import numpy as np
+from PIL import Image
+
+THUMB_SIZE = (80, 60)
+
+DEFAULTS = {"threshold": 4.0, "static_interval": 2.0}
+
+
+def thumbnail(frame):
+    """Small grayscale float32 array for a Frame (raw Y plane if present)."""
+    if frame.raw is not None:
+        h = frame.raw.shape[0] * 2 // 3
+        y = frame.raw[:h]
+        sy = max(1, h // THUMB_SIZE[1]); sx = max(1, y.shape[1] // THUMB_SIZE[0])
+        return y[::sy, ::sx][:THUMB_SIZE[1], :THUMB_SIZE[0]].astype(np.float32)
+    img = Image.open(io.BytesIO(frame.jpeg))
+    img.draft('L', THUMB_SIZE)
+    img = img.convert('L')
+    if img.size != THUMB_SIZE:
+        img = img.resize(THUMB_SIZE, Image.BILINEAR)
+    return np.asarray(img, dtype=np.float32)
+
+
+def motion_score(a, b):
+    """Mean absolute grey-level difference between two thumbnails."""
+    if a.shape != b.shape:
+        return float('inf')
+    return float(np.abs(a - b).mean())
+
+
+class _CamGate:
+    __slots__ = ('threshold', 'static_interval', 'ref', 'ref_t',
+                 'checked', 'skipped', 'last_score')
+
+    def __init__(self, threshold, static_interval):
+        self.threshold       = threshold
+        self.static_interval = static_interval
+        self.ref        = None
+        self.ref_t      = 0.0
+        self.checked    = 0
+        self.skipped    = 0
+        self.last_score = 0.0
+
+
+class MotionGate:
+    def __init__(self, config=None):
+        self._lock = threading.Lock()
+        self.cams  = {}
+        for cam, cfg in (config or {}).items():
+            self.configure(cam, **cfg)
+
+    def configure(self, cam, **cfg):
+        """Set threshold / static_interval for one camera (others keep defaults)."""
+        with self._lock:
+            g = self.cams.get(cam)
+            merged = dict(DEFAULTS) if g is None else {
+                "threshold": g.threshold, "static_interval": g.static_interval}
+            merged.update(cfg)
+            if g is None:
+                self.cams[cam] = _CamGate(**merged)
+            else:
+                g.threshold, g.static_interval = merged["threshold"], merged["static_interval"]
+
+    def should_infer(self, frame, force=False, now=None):
+        """True if the frame should go to the model; updates the reference if so."""
+        if frame.cam not in self.cams:
+            self.configure(frame.cam)
+        g = self.cams[frame.cam]
+        now = time.monotonic() if now is None else now
+        thumb = thumbnail(frame)
+        with self._lock:
+            g.checked += 1
+            score = float('inf') if g.ref is None else motion_score(thumb, g.ref)
+            g.last_score = score
+            if (force or score >= g.threshold
+                    or now - g.ref_t >= g.static_interval):
+                g.ref, g.ref_t = thumb, now
+                return True
+            g.skipped += 1
+            return False
+
+    def stats(self):
+        with self._lock:
+            return {cam: {"checked": g.checked, "skipped": g.skipped,
+                          "last_score": round(g.last_score, 2)
+                                        if g.last_score != float('inf') else None,
+                          "threshold": g.threshold,
+                          "static_interval": g.static_interval}
+                    for cam, g in self.cams.items()}
+
+
+if __name__ == "__main__":
+    import sys
+    from frames import Frame
+    from mjpeg_stream import MjpegDemuxer
+
+    path = sys.argv[1] if len(sys.argv) > 1 else "test.mjpeg"
+    with open(path, 'rb') as f:
+        jpegs = list(MjpegDemuxer(f))
+    frames = [Frame(0, i, j) for i, j in enumerate(jpegs)]
+
+    t0 = time.perf_counter()
+    thumbs = [thumbnail(fr) for fr in frames]
+    t_thumb = (time.perf_counter() - t0) / len(frames)
+    t0 = time.perf_counter()
+    for fr in frames:
+        Image.open(io.BytesIO(fr.jpeg)).convert('RGB')
+    t_full = (time.perf_counter() - t0) / len(frames)
+
+    scores = [motion_score(a, b) for a, b in zip(thumbs, thumbs[1:])]
+    print(f"{len(frames)} frames from {path}")
+    print(f"  thumbnail     {t_thumb*1000:.2f} ms/frame (full RGB decode {t_full*1000:.2f} ms)")
+    print(f"  frame-to-frame score: min {min(scores):.2f}  "
+          f"median {sorted(scores)[len(scores)//2]:.2f}  max {max(scores):.2f}")
+    gate = MotionGate()
+    passed = sum(gate.should_infer(fr, now=i / 15) for i, fr in enumerate(frames))
+    print(f"  default gate @15fps: {passed}/{len(frames)} frames inferred")
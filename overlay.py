@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+overlay.py — overlay compositor: cached fonts, pre-rendered static layers.
+
+add_overlay used to load two TrueType fonts, redraw the camera badge and
+re-encode the JPEG on every frame, even when there was nothing to show.
+OverlayCompositor keeps everything that does not change between frames:
+
+    comp = OverlayCompositor()
+    font = comp.font(18)                          # loaded once per size
+    comp.blend(arr, comp.badge("FRONT", (0, 200, 255, 220)), 4, 4)     # numpy frame
+    img.paste(comp.badge_tile("FRONT", (0, 200, 255, 220)), (0, 0))      # opaque tile
+    comp.blend_image(img, comp.bar_background(640), 0, 472)           # PIL frame
+    header = comp.header(1280, 32, (("◀ FRONT", (8, 8), fill), ...))   # RGB, pasted
+
+  - static layers (badges, progress-bar background) are rendered once as
+    premultiplied RGBA and blended with integer numpy math — into a numpy
+    frame, or just the covered region of a PIL image
+  - the combined-view header strip (background, labels, divider) is cached
+    as an opaque RGB image; only the timestamp is drawn per frame
+  - the camera badge is also cached as an opaque 128×32 tile (badge_tile):
+    whole JPEG MCUs, so the server can paste it into pixels or splice its
+    encoding into a camera JPEG (jpeg_stitch.stitch_tile) and both look
+    the same
+  - when a frame has nothing dynamic on it the caller hands back the
+    original JPEG untouched — no decode, no draw, no encode
+
+comp.record(cam, passthrough, draw_s, encode_s) feeds per-camera render cost,
+reported by comp.stats().
+"""
+
+import threading
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+FONT_PATH = "/usr/share/fonts/truetype/dejavu/DejaVuSansMono-Bold.ttf"
+
+
+class Layer:
+    """RGBA patch, premultiplied, ready for blend()."""
+
+    __slots__ = ('pm', 'inv', 'h', 'w')
+
+    def __init__(self, rgba):
+        rgba = np.asarray(rgba, dtype=np.uint16)
+        a = rgba[..., 3:4]
+        self.pm  = rgba[..., :3] * a + 127     # rgb·α, rounding folded in
+        self.inv = 255 - a
+        self.h, self.w = rgba.shape[:2]
+
+
+class _CamCost:
+    __slots__ = ('frames', 'passthrough', 'draw_ms', 'encode_ms')
+
+    def __init__(self):
+        self.frames = self.passthrough = 0
+        self.draw_ms = self.encode_ms = None
+
+
+class OverlayCompositor:
+    def __init__(self, font_path=FONT_PATH, alpha=0.1):
+        self.font_path = font_path
+        self.alpha     = alpha
+        self._lock   = threading.Lock()
+        self._fonts  = {}
+        self._layers = {}
+        self._cost   = {}
+
+    # ── cached resources ──
+    def font(self, size):
+        f = self._fonts.get(size)
+        if f is None:
+            try:
+                f = ImageFont.truetype(self.font_path, size)
+            except Exception:
+                f = ImageFont.load_default()
+            self._fonts[size] = f
+        return f
+
+    def _cached(self, key, render):
+        v = self._layers.get(key)
+        if v is None:
+            with self._lock:
+                v = self._layers.get(key)
+                if v is None:
+                    v = self._layers[key] = render()
+        return v
+
+    def badge(self, label, color, size=(117, 25), font_size=18):
+        """Filled label box, as drawn at (4, 4) on each camera view."""
+        def render():
+            img = Image.new('RGBA', size, (0, 0, 0, 0))
+            d = ImageDraw.Draw(img)
+            d.rectangle([0, 0, size[0] - 1, size[1] - 1], fill=color)
+            d.text((4, 2), label, fill=(0, 0, 0, 255), font=self.font(font_size))
+            return Layer(np.asarray(img))
+        return self._cached(('badge', label, color, size, font_size), render)
+
+    def badge_tile(self, label, color, size=(128, 32), bg=(10, 10, 10)):
+        """Opaque RGB tile with badge() at (4, 4), for a view's top-left."""
+        layer = self.badge(label, color)          # outside _cached: its lock is not reentrant
+        def render():
+            arr = np.empty((size[1], size[0], 3), np.uint8)
+            arr[...] = bg
+            return Image.fromarray(self.blend(arr, layer, 4, 4))
+        return self._cached(('badge_tile', label, color, size, bg), render)
+
+    def bar_background(self, width, height=8, color=(40, 40, 40, 200)):
+        return self._cached(('bar', width, height, color),
+                            lambda: Layer(np.broadcast_to(np.array(color, np.uint8),
+                                                          (height, width, 4))))
+
+    def header(self, width, height, labels, divider_x=None, bg=(10, 10, 10),
+               divider=(40, 40, 40), font_size=18):
+        """Opaque RGB strip with static `labels` [(text, (x, y), fill), ...]."""
+        def render():
+            img = Image.new('RGB', (width, height), bg)
+            d = ImageDraw.Draw(img)
+            for text, xy, fill in labels:
+                d.text(xy, text, fill=fill, font=self.font(font_size))
+            if divider_x is not None:
+                d.line([(divider_x, 0), (divider_x, height)], fill=divider, width=2)
+            return img
+        return self._cached(('header', width, height, tuple(labels), divider_x, bg,
+                             divider, font_size), render)
+
+    # ── compositing ──
+    @staticmethod
+    def blend(arr, layer, x, y):
+        """Alpha-blend `layer` into uint8 RGB `arr` at (x, y), in place, clipped."""
+        H, W = arr.shape[:2]
+        x0, y0 = max(x, 0), max(y, 0)
+        x1, y1 = min(x + layer.w, W), min(y + layer.h, H)
+        if x0 >= x1 or y0 >= y1:
+            return arr
+        ly, lx = slice(y0 - y, y1 - y), slice(x0 - x, x1 - x)
+        region = arr[y0:y1, x0:x1]
+        mixed = region * layer.inv[ly, lx]
+        mixed += layer.pm[ly, lx]
+        mixed //= 255
+        region[...] = mixed
+        return arr
+
+    def blend_image(self, img, layer, x, y):
+        """blend() for a PIL RGB image: only the layer's region goes through numpy."""
+        box = (max(x, 0), max(y, 0), min(x + layer.w, img.width), min(y + layer.h, img.height))
+        if box[0] >= box[2] or box[1] >= box[3]:
+            return img
+        region = np.array(img.crop(box))
+        self.blend(region, layer, x - box[0], y - box[1])
+        img.paste(Image.fromarray(region), box[:2])
+        return img
+
+    # ── cost accounting ──
+    def record(self, cam, passthrough, draw_s=0.0, encode_s=0.0):
+        with self._lock:
+            c = self._cost.get(cam)
+            if c is None:
+                c = self._cost[cam] = _CamCost()
+            c.frames += 1
+            if passthrough:
+                c.passthrough += 1
+                return
+            for attr, v in (('draw_ms', draw_s * 1000), ('encode_ms', encode_s * 1000)):
+                old = getattr(c, attr)
+                setattr(c, attr, v if old is None else old + self.alpha * (v - old))
+
+    def stats(self):
+        with self._lock:
+            return {cam: {"frames": c.frames, "passthrough": c.passthrough,
+                          "draw_ms": None if c.draw_ms is None else round(c.draw_ms, 2),
+                          "encode_ms": None if c.encode_ms is None else round(c.encode_ms, 2)}
+                    for cam, c in self._cost.items()}
+
+
+if __name__ == "__main__":
+    import io
+    import sys
+    import time
+    from mjpeg_stream import MjpegDemuxer
+
+    path = sys.argv[1] if len(sys.argv) > 1 else "test.mjpeg"
+    with open(path, 'rb') as f:
+        jpegs = list(MjpegDemuxer(f))[:60]
+    comp = OverlayCompositor()
+    badge_col = (0, 200, 255, 220)
+
+    def old(j):
+        img  = Image.open(io.BytesIO(j)).convert('RGB')
+        draw = ImageDraw.Draw(img, 'RGBA')
+        font = ImageFont.truetype(FONT_PATH, 18)
+        ImageFont.truetype(FONT_PATH, 14)
+        draw.rectangle([4, 4, 120, 28], fill=badge_col)
+        draw.text((8, 6), "FRONT", fill=(0, 0, 0, 255), font=font)
+        iw, ih = img.size
+        draw.rectangle([0, ih - 8, iw, ih], fill=(40, 40, 40, 200))
+        out = io.BytesIO(); img.save(out, format='JPEG', quality=92)
+        return out.getvalue()
+
+    def new(j):
+        img = Image.open(io.BytesIO(j)).convert('RGB')
+        img.paste(comp.badge_tile("FRONT", badge_col), (0, 0))
+        comp.blend_image(img, comp.bar_background(img.width), 0, img.height - 8)
+        out = io.BytesIO(); img.save(out, format='JPEG', quality=92)
+        return out.getvalue()
+
+    print(f"{len(jpegs)} frames from {path}")
+    for name, fn in (("per-frame fonts + draw", old), ("cached layers", new),
+                     ("passthrough", lambda j: j)):
+        fn(jpegs[0])
+        t0 = time.perf_counter()
+        for j in jpegs:
+            fn(j)
+        print(f"  {name:<24} {(time.perf_counter() - t0) / len(jpegs) * 1000:6.2f} ms/frame")
@@ -12,6 +12,7 @@ import colorsys
 import torch
 from ultralytics import YOLO
 import requests as req_lib
+from mjpeg_stream import MjpegDemuxer
 
 app = Flask(__name__)
 app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 0
@@ -304,47 +305,10 @@ def camera_thread(cam_idx):
                  '--flush', '1', '-o', '-'],
                 stdout=subprocess.PIPE, stderr=subprocess.PIPE, bufsize=0)
             
-            SOI = b'\xff\xd8'
-            EOI = b'\xff\xd9'
-            buffer = b''
-            last_frame_time = time.time()
             set_cam_status(cam_idx, "Waiting for first frame...")
             
-            while True:
-                if time.time() - last_frame_time > 10:
-                    set_cam_status(cam_idx, "Watchdog: no frame 10s, restarting...")
-                    break
-                
-                try:
-                    chunk = process.stdout.read(8192)
-                except Exception as e:
-                    set_cam_status(cam_idx, f"Read error: {e}")
-                    break
-                
-                if not chunk:
-                    err = process.stderr.read(2048).decode(errors='replace').strip()
-                    set_cam_status(cam_idx, f"Process ended. {err or '(none)'}")
-                    with cam["frame_lock"]:
-                        cam["latest_frame"] = None
-                    break
-                
-                buffer += chunk
-                if len(buffer) > 4*1024*1024:
-                    buffer = b''
-                    continue
-                
-                while True:
-                    soi = buffer.find(SOI)
-                    if soi == -1: break
-                    eoi = buffer.find(EOI, soi+2)
-                    if eoi == -1: break
-                    
-                    frame = buffer[soi:eoi+2]
-                    buffer = buffer[eoi+2:]
-                    
-                    if len(frame) < 1024: continue
-                    
-                    last_frame_time = time.time()
+            try:
+                for frame in MjpegDemuxer(process.stdout, frame_timeout=10):
                     frames_captured += 1
                     
                     with cam["frame_lock"]:
@@ -352,6 +316,15 @@ def camera_thread(cam_idx):
                         if not cam["frame_ready"].is_set():
                             cam["frame_ready"].set()
                             set_cam_status(cam_idx, "Streaming!")
+                
+                err = process.stderr.read(2048).decode(errors='replace').strip()
+                set_cam_status(cam_idx, f"Process ended. {err or '(none)'}")
+                with cam["frame_lock"]:
+                    cam["latest_frame"] = None
+            except TimeoutError:
+                set_cam_status(cam_idx, "Watchdog: no frame 10s, restarting...")
+            except OSError as e:
+                set_cam_status(cam_idx, f"Read error: {e}")
         
         except FileNotFoundError:
             set_cam_status(cam_idx, "ERROR: rpicam-vid not found!")
@@ -6,7 +6,7 @@ HOW TO USE:
   Add these lines at the bottom of pi_server.py __main__ block:
 
     from pi_cloud_client import PiCloudClient
-    cloud = PiCloudClient(cameras, combined_frame_lock, confirm_state, gps_state)
+    cloud = PiCloudClient(cameras, combined_bus, confirm_state, gps_state)
     cloud.start()
 
 INSTALL:
@@ -28,6 +28,7 @@ try:
     import websockets
     import aiohttp
     from aiortc import RTCPeerConnection, RTCSessionDescription, RTCIceCandidate, VideoStreamTrack
+    from aiortc.mediastreams import MediaStreamError
     import av
     WEBRTC_OK = True
 except ImportError as e:
@@ -38,14 +39,18 @@ except ImportError as e:
 CLOUD_WS_URL = "wss://YOUR-APP.up.railway.app/ws/pi"
 CLOUD_URL    = "https://YOUR-APP.up.railway.app"
 PUSH_SECRET  = "Rafhael@1"
+MAX_FRAME_AGE = 1.0   # don't send WebRTC frames older than this (seconds)
+UPLOAD_MAX_AGE = 0.25  # HTTP snapshot: older than this → wait for a new render
+UPLOAD_WAIT    = 1.0   # ...for at most this long
+UPLOAD_LEASE   = 0.05
 
 
 class PiCloudClient:
-    def __init__(self, cameras_ref, combined_frame_lock_ref,
+    def __init__(self, cameras_ref, combined_bus_ref,
                  confirm_state_ref, gps_state_ref,
                  confirm_secs=3, cooldown_secs=10):
         self.cameras              = cameras_ref
-        self.combined_frame_lock  = combined_frame_lock_ref
+        self.combined_bus         = combined_bus_ref
         self.confirm_state        = confirm_state_ref
         self.gps_state            = gps_state_ref
         self.CRASH_CONFIRM_SECS   = confirm_secs
@@ -59,7 +64,7 @@ class PiCloudClient:
         self._loop = None
 
     def set_combined_frame_ref(self, ref_fn):
-        """Pass a callable that returns the current combined_frame bytes."""
+        """Pass a callable that returns the current combined Frame (see frames.py)."""
         self._combined_frame_ref = ref_fn
 
     def start(self):
@@ -204,7 +209,7 @@ class PiCloudClient:
         sess.headers.update({"X-Secret": PUSH_SECRET})
 
         lf = ls = lg = lm = 0.0
-        last_frame = None
+        last_seq = -1
 
         while True:
             now = time.time()
@@ -212,14 +217,14 @@ class PiCloudClient:
             # ── Snapshot (fallback for SSE) ───────────────
             if now - lf >= 0.5:   # 2fps fallback
                 frame = self._get_combined_frame()
-                if frame and frame is not last_frame:
+                if frame and frame.seq > last_seq:
                     try:
                         r = sess.post(f"{CLOUD_URL}/push/frame",
-                                      data=frame,
+                                      data=frame.jpeg,
                                       headers={"Content-Type": "image/jpeg"},
                                       timeout=6)
                         if r.status_code == 200:
-                            last_frame = frame
+                            last_seq = frame.seq
                             lf = now
                     except Exception as e:
                         print(f"[CLOUD-HTTP] Frame: {e}")
@@ -268,16 +273,16 @@ class PiCloudClient:
             time.sleep(0.3)
 
     def _get_combined_frame(self):
-        """Get current combined JPEG bytes from pi_server globals."""
+        """
+        Current combined Frame. A short demand lease is taken only here, at
+        the send tick (wait_fresh's subscription holds demand while it
+        waits): the Pi renders a frame for this upload instead of keeping
+        the combined view rendering continuously.
+        """
         if self._combined_frame_ref:
             return self._combined_frame_ref()
-        # Try importing directly
-        try:
-            import pi_server as ps
-            with ps.combined_frame_lock:
-                return ps.combined_frame
-        except Exception:
-            return None
+        self.combined_bus.want(UPLOAD_LEASE)
+        return self.combined_bus.wait_fresh(UPLOAD_MAX_AGE, timeout=UPLOAD_WAIT)
 
 
 # ── Camera VideoStreamTrack ───────────────────────────────────
@@ -288,29 +293,33 @@ class _CameraTrack(VideoStreamTrack):
         super().__init__()
         self.cam_idx  = cam_idx
         self.cameras  = cameras
-        self._last    = None
+        self._sub     = None
+        self._stopped = False
 
     async def recv(self):
         pts, time_base = await self.next_timestamp()
 
-        cam = self.cameras[self.cam_idx]
-
-        # Prefer overlay frame (has detection boxes), fall back to raw
-        frame_bytes = None
-        with cam["overlay_lock"]:
-            frame_bytes = cam["overlay_frame"]
-        if frame_bytes is None:
-            with cam["frame_lock"]:
-                frame_bytes = cam["latest_frame"]
-
-        if frame_bytes is None or frame_bytes is self._last:
-            await asyncio.sleep(0.033)
+        # Overlay frames (with detection boxes); block in a worker thread
+        # until a newer one is published instead of polling. stop() may run
+        # while get() is blocked: never re-subscribe after it.
+        if self._stopped:
+            raise MediaStreamError
+        sub = self._sub
+        if sub is None:
+            sub = self._sub = self.cameras[self.cam_idx]["overlays"].subscribe(fresh=True)
+        loop  = asyncio.get_running_loop()
+        frame = await loop.run_in_executor(None, sub.get, 1.0)
+
+        if self._stopped:
+            raise MediaStreamError
+        if frame is None or sub.tracker.too_old(MAX_FRAME_AGE):
             return await self.recv()
 
-        self._last = frame_bytes
-
         try:
-            img = Image.open(io.BytesIO(frame_bytes)).convert("RGB")
+            # Overlay frames carry their rendered image — no decode needed
+            img = frame.image
+            if img is None:
+                img = Image.open(io.BytesIO(frame.jpeg)).convert("RGB")
             frame = av.VideoFrame.from_ndarray(np.array(img), format="rgb24")
             frame.pts       = pts
             frame.time_base = time_base
@@ -318,3 +327,11 @@ class _CameraTrack(VideoStreamTrack):
         except Exception:
             await asyncio.sleep(0.033)
             return await self.recv()
+
+    def stop(self):
+        # release the overlay subscription so the Pi stops rendering for us
+        self._stopped = True
+        if self._sub is not None:
+            self._sub.close()
+            self._sub = None
+        super().stop()
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+preprocess.py — letterbox + normalize into preallocated, reused buffers.
+
+The usual path allocates several full-size arrays per frame: the resized
+image, the padded canvas, the float copy, the NCHW transpose. Letterboxer
+keeps one uint8 canvas and one float32 NCHW input per (thread, imgsz) and
+writes into them in place:
+
+    lb = Letterboxer(max_batch=2)
+    batch, metas = lb([rgb0, rgb1], 640)       # float32 (n, 3, 640, 640), 0–1
+    batch, metas = lb([rgb0, rgb1], 640, 32)   # (n, 3, 480, 640): minimal padding
+    ...run the model on batch...
+    xyxy = unletterbox(xyxy, metas[i], rgb_i.shape)
+
+  - resize writes straight into the canvas region (cv2 dst=), padding is
+    only re-filled when the geometry of a slot changes
+  - normalize is one ufunc with out= into the NCHW buffer
+  - buffers live in threading.local, so each inference thread owns its own
+    and the returned batch is valid until that thread's next call
+  - stride > 0 pads only up to the next multiple of stride (ultralytics'
+    "rect" letterbox): a 4:3 frame at 640 runs as 640×480, not 640×640.
+    Used when every frame of the batch has the same shape and the model
+    takes dynamic input sizes
+
+Without OpenCV the resize falls back to PIL, which allocates per frame.
+OpenCV is imported on the first letterbox, not when the module loads.
+
+Run `python preprocess.py test.mjpeg` for a per-frame time and allocation
+comparison (tracemalloc). The letterbox is only part of a predict call:
+the model itself allocates its activations, and ultralytics converts a
+tensor input back to uint8 images for its Results. To time whole predict
+calls on both paths, add a model:
+
+    python preprocess.py test.mjpeg accident_model_latest.pt
+"""
+
+import threading
+
+import numpy as np
+
+_cv2 = None
+
+
+def opencv():
+    """The cv2 module, or False without OpenCV. Imported on first use."""
+    global _cv2
+    if _cv2 is None:
+        try:
+            import cv2
+            _cv2 = cv2
+        except ImportError:
+            _cv2 = False
+    return _cv2
+
+PAD_VALUE = 114
+_INV255   = np.float32(1 / 255)
+
+
+def letterbox_geometry(h, w, size, stride=0):
+    """
+    (gain, new_h, new_w, pad_x, pad_y, canvas_h, canvas_w) for fitting h×w
+    into size×size, centred. stride > 0 shrinks the canvas to the resized
+    image rounded up to a multiple of stride.
+    """
+    gain = min(size / h, size / w)
+    nh, nw = round(h * gain), round(w * gain)
+    ch, cw = (nh + (size - nh) % stride, nw + (size - nw) % stride) if stride else (size, size)
+    return gain, nh, nw, (cw - nw) // 2, (ch - nh) // 2, ch, cw
+
+
+def unletterbox(xyxy, meta, shape):
+    """Map (N, 4) letterbox boxes back to source pixels, in place."""
+    gain, (px, py) = meta
+    xyxy[:, [0, 2]] -= px
+    xyxy[:, [1, 3]] -= py
+    xyxy /= gain
+    xyxy[:, [0, 2]] = xyxy[:, [0, 2]].clip(0, shape[1])
+    xyxy[:, [1, 3]] = xyxy[:, [1, 3]].clip(0, shape[0])
+    return xyxy
+
+
+class _Buffers:
+    __slots__ = ('canvas', 'batch', 'geom')
+
+    def __init__(self, max_batch, ch, cw):
+        self.canvas = np.full((max_batch, ch, cw, 3), PAD_VALUE, dtype=np.uint8)
+        self.batch  = np.empty((max_batch, 3, ch, cw), dtype=np.float32)
+        self.geom   = [None] * max_batch
+
+
+class Letterboxer:
+    def __init__(self, max_batch=2):
+        self.max_batch = max_batch
+        self._local    = threading.local()
+
+    def _buffers(self, ch, cw, n):
+        bufs = getattr(self._local, 'bufs', None)
+        if bufs is None:
+            bufs = self._local.bufs = {}
+        b = bufs.get((ch, cw))
+        if b is None or len(b.geom) < n:     # first use, or a bigger batch than planned
+            b = bufs[(ch, cw)] = _Buffers(max(n, self.max_batch), ch, cw)
+        return b
+
+    def __call__(self, arrs, size, stride=0):
+        """Letterbox + normalize `arrs` (RGB uint8 HWC). Returns (batch view, metas)."""
+        if stride and any(a.shape[:2] != arrs[0].shape[:2] for a in arrs):
+            stride = 0                       # mixed shapes share one square canvas
+        ch, cw = letterbox_geometry(*arrs[0].shape[:2], size, stride)[5:]
+        b = self._buffers(ch, cw, len(arrs))
+        metas = []
+        for i, img in enumerate(arrs):
+            h, w = img.shape[:2]
+            gain, nh, nw, px, py = letterbox_geometry(h, w, size, stride)[:5]
+            canvas = b.canvas[i]
+            if b.geom[i] != (nh, nw, px, py):
+                canvas[...] = PAD_VALUE
+                b.geom[i] = (nh, nw, px, py)
+            region = canvas[py:py + nh, px:px + nw]
+            if (nh, nw) == (h, w):
+                np.copyto(region, img)
+            elif opencv():
+                _cv2.resize(img, (nw, nh), dst=region, interpolation=_cv2.INTER_LINEAR)
+            else:
+                from PIL import Image
+                region[...] = Image.fromarray(img).resize((nw, nh), Image.BILINEAR)
+            np.multiply(canvas.transpose(2, 0, 1), _INV255, out=b.batch[i])
+            metas.append((gain, (px, py)))
+        return b.batch[:len(arrs)], metas
+
+
+# ─────────────────── BENCHMARK ──────────────────────
+def _naive(arrs, size, stride=0):
+    """The allocate-everything path, for comparison."""
+    out = []
+    for img in arrs:
+        h, w = img.shape[:2]
+        gain, nh, nw, px, py, ch, cw = letterbox_geometry(h, w, size, stride)
+        if opencv():
+            small = _cv2.resize(img, (nw, nh), interpolation=_cv2.INTER_LINEAR)
+        else:
+            from PIL import Image
+            small = np.asarray(Image.fromarray(img).resize((nw, nh), Image.BILINEAR))
+        canvas = np.full((ch, cw, 3), PAD_VALUE, dtype=np.uint8)
+        canvas[py:py + nh, px:px + nw] = small
+        out.append(canvas.transpose(2, 0, 1).astype(np.float32) / 255.0)
+    return np.stack(out)
+
+
+if __name__ == "__main__":
+    import io
+    import sys
+    import time
+    import tracemalloc
+    from PIL import Image
+    from mjpeg_stream import MjpegDemuxer
+
+    path = sys.argv[1] if len(sys.argv) > 1 else "test.mjpeg"
+    with open(path, 'rb') as f:
+        frames = [np.asarray(Image.open(io.BytesIO(j)).convert('RGB')) for j in MjpegDemuxer(f)]
+    pairs = [frames[i:i + 2] for i in range(0, len(frames) - 1, 2)]
+    lb = Letterboxer(max_batch=2)
+
+    print(f"{len(frames)} frames {frames[0].shape[1]}x{frames[0].shape[0]}, batches of 2"
+          f"{'' if opencv() else ' (no OpenCV: PIL resize)'}")
+    # tracemalloc sees numpy data buffers: "new ≥64K" counts large blocks a
+    # call leaves behind (its output included), "peak MB" is the transient
+    # high-water mark above the pre-call level — every temporary counts.
+    print(f"{'imgsz':>5} {'path':<10} {'ms/batch':>9} {'new ≥64K':>9} {'peak MB':>8}")
+    for size in (320, 640):
+        for name, fn in (("naive", _naive), ("prealloc", lb),
+                         ("rect", lambda p, size: lb(p, size, 32))):
+            fn(pairs[0], size)                 # warm: first call allocates buffers
+            t0 = time.perf_counter()
+            for p in pairs:
+                fn(p, size)
+            dt = (time.perf_counter() - t0) / len(pairs)
+
+            tracemalloc.start()
+            allocs = peak = 0
+            for p in pairs:
+                base = tracemalloc.take_snapshot()
+                tracemalloc.reset_peak()
+                cur0 = tracemalloc.get_traced_memory()[0]
+                out  = fn(p, size)
+                peak += tracemalloc.get_traced_memory()[1] - cur0
+                after = tracemalloc.take_snapshot()
+                allocs += sum(1 for t in after.traces if t.size >= 65536) \
+                        - sum(1 for t in base.traces if t.size >= 65536)
+                del out
+            tracemalloc.stop()
+            print(f"{size:5d} {name:<10} {dt*1000:9.2f} {allocs/len(pairs):9.1f} "
+                  f"{peak/len(pairs)/1e6:8.2f}")
+
+    if len(sys.argv) > 2:
+        # Whole predict calls. tracemalloc cannot see torch's allocator, so
+        # large CPU allocations come from the torch profiler instead.
+        from inference_backends import load_model
+        try:
+            from torch.profiler import profile, ProfilerActivity
+        except ImportError:
+            profile = None
+        print(f"\n{sys.argv[2]}: whole predict() per batch of 2")
+        print(f"{'imgsz':>5} {'path':<10} {'ms/batch':>9} {'torch ≥64K':>11} {'MB':>7}")
+        runs = pairs[:10]
+        for prealloc in (False, True):
+            model = load_model(sys.argv[2], prealloc=prealloc)
+            for size in (320, 640):
+                def call(p):
+                    return model.predict(source=list(p), imgsz=size, conf=0.5, verbose=False)
+                call(runs[0])
+                t0 = time.perf_counter()
+                for p in runs:
+                    call(p)
+                dt = (time.perf_counter() - t0) / len(runs)
+                big = mb = float('nan')
+                if profile:
+                    with profile(activities=[ProfilerActivity.CPU], profile_memory=True) as prof:
+                        call(runs[1])
+                    sizes = [e.cpu_memory_usage for e in prof.events() if e.cpu_memory_usage >= 65536]
+                    big, mb = len(sizes), sum(sizes) / 1e6
+                print(f"{size:5d} {'prealloc' if prealloc else 'plain':<10} {dt*1000:9.1f} "
+                      f"{big:11} {mb:7.1f}")
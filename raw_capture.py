@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""
+raw_capture.py — dual-output capture: MJPEG for viewers, raw YUV420 for ML.
+
+With CAMERA_SOURCE = 'dual' the camera server no longer JPEG-decodes every
+frame before YOLO. Each camera produces two streams from one sensor readout:
+
+  main  → MJPEG (hardware encoder) → /stream, overlays, cloud
+  lores → YUV420 at inference size → detect_accidents_in_frame
+
+Backends (same iterator interface, yields (jpeg_bytes, yuv_array)):
+
+  Picamera2DualCapture  real CSI camera via picamera2 (main + lores streams)
+  FileDualCapture       off-hardware: replays an .mjpeg file alongside a
+                        raw .yuv file at a fixed frame rate
+
+Raw frames are tightly packed YUV420 planar (I420) arrays of shape
+(h*3//2, w). picamera2 returns lores buffers with each row padded to the
+ISP stride; yuv420_unpad drops the padding at capture time. Every backend
+hands out arrays the caller owns, so the ML thread can lag behind capture
+without tearing.
+
+MAKE A TEST FILE (needs pillow):
+    python raw_capture.py test.mjpeg test.yuv --size 640x480
+"""
+
+import collections
+import threading
+import time
+
+import numpy as np
+from PIL import Image
+
+from camera_sources import CameraSource
+from mjpeg_stream import MjpegDemuxer
+
+_cv2 = None    # imported on the first conversion, not at server start
+
+
+def _opencv():
+    global _cv2
+    if _cv2 is None:
+        try:
+            import cv2
+            _cv2 = cv2
+        except ImportError:
+            _cv2 = False
+    return _cv2
+
+_picam2 = None  # (Picamera2, FileOutput, pairing encoder) once a CSI camera opens
+
+
+def _picamera2():
+    """picamera2 (and libcamera) on first use: only 'dual' capture needs it."""
+    global _picam2
+    if _picam2 is None:
+        try:
+            from picamera2 import Picamera2
+            from picamera2.encoders import MJPEGEncoder
+            from picamera2.outputs import FileOutput
+        except ImportError:
+            raise RuntimeError("picamera2 not installed "
+                               "(sudo apt install python3-picamera2)") from None
+        _picam2 = (Picamera2, FileOutput, type("_PairingEncoder", (_Pairing, MJPEGEncoder), {}))
+    return _picam2
+
+
+def yuv420_frame_size(width, height):
+    """Bytes in one I420 frame."""
+    return width * height * 3 // 2
+
+
+def yuv420_unpad(yuv, width, height):
+    """
+    Tightly packed I420 (shape (h*3//2, w)) from a buffer whose rows are
+    padded to a stride (shape (h*3//2, stride)). Chroma rows are stride//2
+    wide, two to a buffer row. Returns `yuv` itself when there is no padding.
+    """
+    stride = yuv.shape[-1] if yuv.ndim == 2 else width
+    if stride == width:
+        return yuv
+    buf = yuv.reshape(-1)
+    ysz, cw, ch = stride * height, width // 2, height // 2
+    csz = (stride // 2) * ch
+    out = np.empty((height * 3 // 2, width), dtype=np.uint8)
+    out[:height] = buf[:ysz].reshape(height, stride)[:, :width]
+    chroma = out[height:].reshape(-1)
+    for k in range(2):
+        plane = buf[ysz + k * csz:ysz + (k + 1) * csz].reshape(ch, stride // 2)[:, :cw]
+        chroma[k * cw * ch:(k + 1) * cw * ch] = plane.reshape(-1)
+    return out
+
+
+def yuv420_to_rgb(yuv, width, height):
+    """
+    Convert an I420 frame (shape (h*3//2, w), or stride-padded) to an RGB
+    uint8 array.
+    Uses OpenCV when present (ultralytics already pulls it in) — about 7×
+    cheaper than decoding the matching JPEG. Falls back to PIL, which is
+    roughly the same cost as a decode.
+    """
+    yuv = yuv420_unpad(yuv, width, height)
+    if _opencv():
+        return _cv2.cvtColor(yuv.reshape(height * 3 // 2, width), _cv2.COLOR_YUV2RGB_I420)
+    buf  = memoryview(np.ascontiguousarray(yuv)).cast('B')
+    ysz  = width * height
+    csz  = ysz // 4
+    half = (width // 2, height // 2)
+    y  = Image.frombuffer('L', (width, height), buf[:ysz], 'raw', 'L', 0, 1)
+    cb = Image.frombuffer('L', half, buf[ysz:ysz + csz], 'raw', 'L', 0, 1)
+    cr = Image.frombuffer('L', half, buf[ysz + csz:ysz + 2 * csz], 'raw', 'L', 0, 1)
+    cb = cb.resize((width, height), Image.NEAREST)
+    cr = cr.resize((width, height), Image.NEAREST)
+    return np.asarray(Image.merge('YCbCr', (y, cb, cr)).convert('RGB'))
+
+
+class RawFrameReader:
+    """
+    Iterator of fixed-size I420 frames read from a pipe or file.
+    Arrays come from a ring of `slots` buffers; a yielded array stays valid
+    until `slots - 1` further frames have been read.
+    """
+
+    def __init__(self, stream, width, height, slots=3):
+        self.stream = stream
+        self.width  = width
+        self.height = height
+        self._ring  = [np.empty((height * 3 // 2, width), dtype=np.uint8)
+                       for _ in range(slots)]
+        self._next  = 0
+        self.frames = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        arr  = self._ring[self._next]
+        view = memoryview(arr).cast('B')
+        got  = 0
+        while got < len(view):
+            n = self.stream.readinto(view[got:])
+            if not n:
+                raise StopIteration
+            got += n
+        self._next = (self._next + 1) % len(self._ring)
+        self.frames += 1
+        return arr
+
+
+class FileDualCapture(CameraSource):
+    """
+    Off-hardware dual capture: pairs frames from an MJPEG file and a raw
+    I420 file and paces them at `fps`. Both files loop.
+    """
+
+    name = "dual-file"
+
+    def __init__(self, mjpeg_path, raw_path, width, height, fps=15):
+        super().__init__()
+        self.mjpeg_path = mjpeg_path
+        self.raw_path   = raw_path
+        self.width      = width
+        self.height     = height
+        self.fps        = fps
+
+    def __iter__(self):
+        period = 1.0 / self.fps if self.fps else 0
+        next_t = time.monotonic()
+        while not self._stop.is_set():
+            with open(self.mjpeg_path, 'rb') as mf, open(self.raw_path, 'rb') as rf:
+                raws = RawFrameReader(rf, self.width, self.height)
+                for jpeg, raw in zip(MjpegDemuxer(mf), raws):
+                    if self._stop.is_set():
+                        return
+                    if period:
+                        next_t += period
+                        delay = next_t - time.monotonic()
+                        if delay > 0: time.sleep(delay)
+                        else: next_t = time.monotonic()
+                    yield jpeg, raw.copy()
+                if raws.frames == 0:
+                    raise ValueError(f"{self.raw_path}: shorter than one frame")
+
+
+class _JpegSink:
+    """
+    picamera2 FileOutput target: one write() call per encoded frame. Each
+    JPEG takes the oldest lores copy from `pending` (see _Pairing)
+    and the two are kept as one slot, so a JPEG dropped because take() ran
+    late drops its own lores with it and later pairs stay aligned.
+    """
+
+    def __init__(self, pending):
+        self._cond    = threading.Condition()
+        self._frame   = None
+        self._pending = pending
+
+    def write(self, buf):
+        with self._cond:
+            lores = self._pending.popleft() if self._pending else None
+            self._frame = (bytes(buf), lores)
+            self._cond.notify_all()
+        return len(buf)
+
+    def flush(self):
+        pass
+
+    def take(self, timeout):
+        """Latest (jpeg, lores) pair, or None after `timeout` s without one."""
+        with self._cond:
+            if self._frame is None:
+                self._cond.wait(timeout)
+            frame, self._frame = self._frame, None
+            return frame
+
+
+class _Pairing:
+    """
+    Mixed into MJPEGEncoder (see _picamera2): copies the lores plane out of
+    every request the encoder is handed, so each encoded JPEG is paired
+    with the YUV of the same sensor readout. The V4L2 encoder emits one
+    frame per input in order, so the sink pairs each write with the oldest
+    queued copy.
+    """
+
+    def __init__(self, width, height, pending, *a, **kw):
+        super().__init__(*a, **kw)
+        self._size    = (width, height)
+        self._pending = pending
+
+    def encode(self, stream, request):
+        self._pending.append(yuv420_unpad(request.make_array("lores"), *self._size))
+        super().encode(stream, request)
+
+
+class Picamera2DualCapture(CameraSource):
+    """
+    One CSI camera, two outputs: the main stream goes through the hardware
+    MJPEG encoder, the lores stream is read as YUV420 for inference. Both
+    come from the same completed request (see _Pairing).
+    """
+
+    name = "dual-picamera2"
+
+    def __init__(self, cam_idx, size, raw_size, fps=15, quality=90):
+        _picamera2()                           # fail here, not in the capture thread
+        super().__init__()
+        self.cam_idx  = cam_idx
+        self.size     = size
+        self.raw_size = raw_size
+        self.fps      = fps
+        self.quality  = quality
+        self._picam   = None
+
+    def __iter__(self):
+        Picamera2, FileOutput, PairingEncoder = _picamera2()
+        picam = self._picam = Picamera2(self.cam_idx)
+        config = picam.create_video_configuration(
+            main={"size": self.size},
+            lores={"size": self.raw_size, "format": "YUV420"},
+            controls={"FrameRate": self.fps})
+        picam.configure(config)
+        pending = collections.deque(maxlen=8)
+        sink    = _JpegSink(pending)
+        picam.start_encoder(PairingEncoder(*self.raw_size, pending), FileOutput(sink),
+                            quality=self.quality)
+        picam.start()
+        try:
+            while not self._stop.is_set():
+                pair = sink.take(timeout=10)
+                if pair is None:
+                    raise TimeoutError("no encoded frame for 10s")
+                if pair[1] is None:
+                    continue                   # encoder output with no lores copy
+                yield pair
+        finally:
+            self.close()
+
+    def close(self):
+        super().close()
+        if self._picam is not None:
+            try:
+                self._picam.stop_encoder()
+                self._picam.close()
+            except Exception:
+                pass
+            self._picam = None
+
+
+# ─────────────────── TEST FILE GENERATOR ────────────
+def mjpeg_to_yuv420(mjpeg_path, raw_path, width, height):
+    """Decode every frame of an MJPEG file into a raw I420 file."""
+    import io
+    n = 0
+    with open(mjpeg_path, 'rb') as mf, open(raw_path, 'wb') as rf:
+        for jpeg in MjpegDemuxer(mf):
+            img = Image.open(io.BytesIO(jpeg)).convert('RGB').resize((width, height))
+            y, cb, cr = img.convert('YCbCr').split()
+            half = (width // 2, height // 2)
+            rf.write(y.tobytes())
+            rf.write(cb.resize(half, Image.BOX).tobytes())
+            rf.write(cr.resize(half, Image.BOX).tobytes())
+            n += 1
+    return n
+
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Convert an MJPEG file to raw I420 for FileDualCapture")
+    ap.add_argument("mjpeg")
+    ap.add_argument("raw")
+    ap.add_argument("--size", default="640x480", help="WxH of the raw frames")
+    args = ap.parse_args()
+    w, h = map(int, args.size.lower().split("x"))
+    n = mjpeg_to_yuv420(args.mjpeg, args.raw, w, h)
+    print(f"Wrote {n} frames ({yuv420_frame_size(w, h)} B each) to {args.raw}")
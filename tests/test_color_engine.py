@@ -0,0 +1,96 @@
+import colorsys
+
+import numpy as np
+import pytest
+
+from color_engine import _HUE_EDGES, COLOR_NAMES, ColorEngine, classify
+
+
+def scalar_name(r, g, b):
+    """The per-pixel colorsys rule classify() replaces."""
+    h, s, v = colorsys.rgb_to_hsv(r / 255, g / 255, b / 255)
+    h = h * 360; s = s * 100; v = v * 100
+    if s < 10:
+        return "Black" if v < 20 else "White" if v > 80 else "Gray"
+    if v < 20:
+        return "Black"
+    for hi, name in _HUE_EDGES:
+        if h < hi:
+            return name
+    return "Red"
+
+
+def on_hue_edge(r, g, b):
+    """Exact hue exactly on an edge, where float rounding picks either side."""
+    mx, mn = max(r, g, b), min(r, g, b)
+    if mx == mn:
+        return False
+    k, d = (0, g - b) if r == mx else (1, b - r) if g == mx else (2, r - g)
+    num = (120 * k * (mx - mn) + 60 * d) % (360 * (mx - mn))
+    return num % (mx - mn) == 0 and num // (mx - mn) in {0} | {hi for hi, _ in _HUE_EDGES}
+
+
+def names(pixels):
+    return [COLOR_NAMES[k] for k in classify(np.array(pixels, np.uint8))]
+
+
+def test_classify_matches_scalar_rule_on_lattice():
+    lattice = np.stack(np.meshgrid(*[np.arange(0, 256, 5)] * 3, indexing='ij'),
+                       -1).reshape(-1, 3)
+    fast = classify(lattice.astype(np.uint8))
+    bad = [tuple(map(int, p)) for k, p in zip(fast, lattice)
+           if COLOR_NAMES[k] != scalar_name(*map(int, p))]
+    assert all(on_hue_edge(*p) for p in bad), bad[:10]
+
+
+def test_classify_matches_scalar_rule_on_random_pixels():
+    px = np.random.default_rng(0).integers(0, 256, (20000, 3))
+    fast = classify(px.astype(np.uint8))
+    bad = [tuple(map(int, p)) for k, p in zip(fast, px)
+           if COLOR_NAMES[k] != scalar_name(*map(int, p))]
+    assert all(on_hue_edge(*p) for p in bad), bad[:10]
+
+
+@pytest.mark.parametrize("rgb,name", [
+    ((0, 0, 0), "Black"), ((255, 255, 255), "White"), ((128, 128, 128), "Gray"),
+    ((30, 30, 30), "Black"), ((255, 0, 0), "Red"), ((255, 128, 0), "Orange"),
+    ((255, 255, 0), "Yellow"), ((0, 200, 0), "Green"), ((0, 255, 255), "Cyan"),
+    ((0, 0, 255), "Blue"), ((160, 0, 255), "Purple"), ((255, 0, 255), "Magenta"),
+    ((255, 0, 40), "Red"),
+])
+def test_classify_known_colors(rgb, name):
+    assert names([rgb]) == [name]
+
+
+def test_classify_keeps_leading_shape():
+    img = np.zeros((4, 5, 3), np.uint8)
+    img[:, :, 2] = 255
+    out = classify(img)
+    assert out.shape == (4, 5)
+    assert (out == COLOR_NAMES.index("Blue")).all()
+
+
+def test_analyze_grid_cells():
+    img = np.zeros((120, 160, 3), np.uint8)
+    img[:, :80] = (255, 0, 0)                  # left half red
+    img[:, 80:] = (0, 0, 255)                  # right half blue
+    img[60:, 80:] = (255, 255, 255)            # bottom-right white
+    cells = ColorEngine(step=4).analyze(img, grid=(2, 2), origin=(10, 20))
+    assert [c['position'] for c in cells] == ['grid_0_0', 'grid_0_1', 'grid_1_0', 'grid_1_1']
+    assert [c['name'] for c in cells] == ['Red', 'Blue', 'Red', 'White']
+    assert all(c['share'] == 1.0 for c in cells)
+    assert cells[1]['hist'] == {'Blue': 1.0}
+    assert (cells[0]['r'], cells[0]['g'], cells[0]['b']) == (255, 0, 0)
+    assert cells[3]['hex'] == '#ffffff'
+    assert cells[0]['coords'] == (10 + 40, 20 + 30)
+    assert cells[3]['coords'] == (10 + 120, 20 + 90)
+
+
+def test_analyze_mixed_cell_share_and_mean():
+    img = np.zeros((40, 40, 3), np.uint8)
+    img[:30] = (0, 200, 0)                     # 3/4 green, 1/4 black
+    (cell,) = ColorEngine(step=1).analyze(img, grid=(1, 1))
+    assert cell['position'] == 'center'
+    assert cell['name'] == 'Green' and cell['share'] == 0.75
+    assert cell['hist'] == {'Green': 0.75, 'Black': 0.25}
+    assert (cell['r'], cell['g'], cell['b']) == (0, 150, 0)
@@ -0,0 +1,91 @@
+from collections import namedtuple
+
+import numpy as np
+
+from crash_gate import CrashGate, gate_score
+from inference_backends import Result
+
+Frame = namedtuple('Frame', 'cam score')
+
+
+def result(*dets):
+    """Result with one box per (conf, cls)."""
+    xyxy = np.array([[0, 0, 10, 10]] * len(dets), np.float32).reshape(-1, 4)
+    conf = np.array([c for c, _ in dets], np.float32)
+    cls  = np.array([k for _, k in dets], np.float32)
+    return Result(xyxy, conf, cls)
+
+
+class FakeGateModel:
+    """predict() scores each 'image' (a Frame) with its own .score."""
+
+    def __init__(self):
+        self.calls = []
+
+    def predict(self, source, imgsz, conf, classes, verbose):
+        self.calls.append((list(source), imgsz, conf, classes))
+        return [result((f.score, 0)) if f.score else result() for f in source]
+
+
+def select(gate, frames, now, **kw):
+    return gate.select(frames, lambda f: f, kw.pop('model', FakeGateModel()), [0],
+                       now=now, **kw)
+
+
+def test_gate_score():
+    assert gate_score(result()) == 0.0
+    assert gate_score(result((0.3, 0), (0.6, 2))) == np.float32(0.6)
+    assert gate_score(result((0.3, 0), (0.6, 2)), [0]) == np.float32(0.3)
+    assert gate_score(result((0.6, 2)), [0]) == 0.0
+
+
+def test_first_frame_per_camera_is_a_safety_run():
+    gate = CrashGate(safety_interval=3.0)
+    model = FakeGateModel()
+    frames = [Frame(0, 0.0), Frame(1, 0.0)]
+    assert select(gate, frames, now=100.0, model=model) == frames
+    assert model.calls == [] and gate.last_checked == 0
+    assert gate.stats()["cams"][0]["safety"] == 1
+
+
+def test_threshold_decides_between_safety_runs():
+    gate = CrashGate(threshold=0.15, safety_interval=3.0, imgsz=160, conf=0.05)
+    select(gate, [Frame(0, 0.0), Frame(1, 0.0)], now=100.0)
+    model = FakeGateModel()
+    frames = [Frame(0, 0.1), Frame(1, 0.2)]
+    assert select(gate, frames, now=101.0, model=model) == [Frame(1, 0.2)]
+    assert gate.last_checked == 2
+    assert model.calls == [(frames, 160, 0.05, [0])]
+    cams = gate.stats()["cams"]
+    assert (cams[0]["checked"], cams[0]["passed"]) == (1, 0)
+    assert (cams[1]["checked"], cams[1]["passed"]) == (1, 1)
+    assert cams[0]["last_score"] == 0.1
+
+
+def test_safety_interval_counts_from_last_full_run():
+    gate = CrashGate(threshold=0.5, safety_interval=3.0)
+    select(gate, [Frame(0, 0.0), Frame(1, 0.0)], now=100.0)
+    assert select(gate, [Frame(1, 0.9)], now=102.0) == [Frame(1, 0.9)]
+    # cam 0 has had no full run since 100.0, cam 1 ran at 102.0
+    frames = [Frame(0, 0.0), Frame(1, 0.0)]
+    assert select(gate, frames, now=103.0) == [Frame(0, 0.0)]
+    assert select(gate, frames, now=104.5) == []
+    assert select(gate, frames, now=105.0) == [Frame(1, 0.0)]
+
+
+def test_forced_camera_skips_the_gate():
+    gate = CrashGate(threshold=0.5)
+    select(gate, [Frame(0, 0.0), Frame(1, 0.0)], now=100.0)
+    model = FakeGateModel()
+    frames = [Frame(0, 0.0), Frame(1, 0.0)]
+    out = select(gate, frames, now=100.5, model=model, force=lambda cam: cam == 1)
+    assert out == [Frame(1, 0.0)]
+    assert model.calls[0][0] == [Frame(0, 0.0)]
+    assert gate.stats()["cams"][1]["forced"] == 1
+
+
+def test_output_keeps_input_order():
+    gate = CrashGate(threshold=0.5)
+    select(gate, [Frame(0, 0.0), Frame(1, 0.0)], now=100.0)
+    frames = [Frame(1, 0.9), Frame(0, 0.9)]
+    assert select(gate, frames, now=101.0) == frames
@@ -0,0 +1,74 @@
+import warnings
+
+import numpy as np
+
+from crash_tracker import BoxTracker, iou_matrix
+
+
+def det(x1, y1, x2, y2, conf=0.95):
+    return {'box': [x1, y1, x2, y2], 'conf': conf}
+
+
+def test_iou_matrix():
+    ious = iou_matrix([[0, 0, 10, 10]], [[0, 0, 10, 10], [5, 0, 15, 10], [20, 20, 30, 30]])
+    assert np.allclose(ious, [[1.0, 50 / 150, 0.0]])
+
+
+def test_iou_matrix_zero_area_is_finite():
+    ious = iou_matrix([[5, 5, 5, 5]], [[5, 5, 5, 5], [0, 0, 10, 10]])
+    assert np.isfinite(ious).all()
+    assert (ious == 0).all()
+
+
+def test_same_box_keeps_its_track():
+    t = BoxTracker()
+    first = t.update([det(100, 100, 200, 200)], now=0.0)[0]
+    again = t.update([det(105, 102, 205, 203)], now=0.2)
+    assert len(again) == 1 and again[0].id == first.id
+    assert again[0].hits == 2 and again[0].misses == 0
+    assert again[0].box == [105, 102, 205, 203]
+
+
+def test_track_coasts_through_gap_then_drops():
+    t = BoxTracker(max_gap=1.0)
+    t.update([det(100, 100, 200, 200)], now=0.0)
+    live = t.update([], now=0.9)
+    assert len(live) == 1 and live[0].misses == 1
+    assert t.update([], now=1.1) == []
+
+
+def test_centroid_fallback_matches_fast_motion():
+    t = BoxTracker(iou_thres=0.3, centroid=0.5)
+    tid = t.update([det(100, 100, 150, 150)], now=0.0)[0].id
+    # IoU 0.25 is below the threshold; centre moved 30 px, 0.42 of the diagonal
+    moved = t.update([det(130, 100, 180, 150)], now=0.3)
+    assert [tr.id for tr in moved] == [tid]
+
+
+def test_far_detection_starts_a_new_track():
+    t = BoxTracker()
+    tid = t.update([det(0, 0, 50, 50)], now=0.0)[0].id
+    tracks = t.update([det(400, 300, 450, 350)], now=0.1)
+    assert sorted(tr.id for tr in tracks) == [tid, tid + 1]
+
+
+def test_degenerate_boxes_do_not_poison_matching():
+    t = BoxTracker()
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")             # no divide-by-zero / NaN warnings
+        t.update([det(50, 50, 50, 50)], now=0.0)
+        tracks = t.update([det(50, 50, 50, 50), det(300, 300, 360, 360)], now=0.1)
+    # the point box continues its track, the real box does not steal it
+    assert len(tracks) == 2
+    assert tracks[0].hits == 2 and tracks[0].box == [50, 50, 50, 50]
+    assert tracks[1].hits == 1
+
+
+def test_held_since_and_reset():
+    t = BoxTracker(max_gap=5.0)
+    assert t.held_since() is None
+    t.update([det(0, 0, 50, 50)], now=1.0)
+    t.update([det(0, 0, 50, 50), det(400, 300, 450, 350)], now=2.0)
+    assert t.held_since() == 1.0
+    t.reset()
+    assert t.tracks == [] and t.held_since() is None
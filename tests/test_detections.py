@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+
+import detections
+from detections import SIDES, crash_detections
+from inference_backends import Result
+
+SHAPE, CAM = (480, 640), (640, 480)
+
+
+def fake_result(n, seed=0, as_array=np.asarray):
+    rng  = np.random.default_rng(seed)
+    xy   = rng.uniform(0, 540, (n, 2)).astype(np.float32)
+    wh   = rng.uniform(20, 100, (n, 2)).astype(np.float32)
+    cls  = rng.integers(0, 3, n).astype(np.float32)
+    conf = rng.uniform(0.5, 1.0, n).astype(np.float32)
+    return Result(as_array(np.hstack([xy, xy + wh])), as_array(conf), as_array(cls))
+
+
+def both_paths(monkeypatch, r, **kw):
+    args = dict(shape=SHAPE, crash_ids=[0], conf_thres=0.9, cam_size=CAM)
+    args.update(kw)
+    monkeypatch.setattr(detections, 'SCALAR_MAX_BOXES', 10 ** 6)
+    scalar = crash_detections(r, **args)
+    monkeypatch.setattr(detections, 'SCALAR_MAX_BOXES', -1)
+    vector = crash_detections(r, **args)
+    return scalar, vector
+
+
+def same(a, b):
+    return (a.xyxy.tolist() == b.xyxy.tolist() and a.side.tolist() == b.side.tolist()
+            and np.allclose(a.conf, b.conf))
+
+
+@pytest.mark.parametrize("n", [1, 3, 8, 30, 300])
+@pytest.mark.parametrize("crash_ids", [[0], [0, 2]])
+def test_scalar_and_vector_agree(monkeypatch, n, crash_ids):
+    r = fake_result(n, seed=n)
+    scalar, vector = both_paths(monkeypatch, r, crash_ids=crash_ids)
+    assert same(scalar, vector)
+
+
+def test_scalar_and_vector_agree_on_torch_input(monkeypatch):
+    torch = pytest.importorskip("torch")
+    r = fake_result(50, seed=1, as_array=torch.from_numpy)
+    assert same(*both_paths(monkeypatch, r))
+
+
+def test_filters_class_and_confidence(monkeypatch):
+    r = Result(np.array([[0, 0, 10, 10], [0, 0, 10, 10], [0, 0, 10, 10]], np.float32),
+               np.array([0.95, 0.50, 0.99], np.float32), np.array([0, 0, 1], np.float32))
+    for d in both_paths(monkeypatch, r):
+        assert len(d) == 1 and np.allclose(d.conf, [0.95])
+
+
+def test_rescales_and_buckets_sides(monkeypatch):
+    # model saw a 320x240 array: every coordinate doubles on the 640x480 camera
+    r = Result(np.array([[10, 10, 50, 50], [140, 10, 180, 50], [270, 10, 310, 50]], np.float32),
+               np.full(3, 0.95, np.float32), np.zeros(3, np.float32))
+    for d in both_paths(monkeypatch, r, shape=(240, 320)):
+        assert d.xyxy.tolist() == [[20, 20, 100, 100], [280, 20, 360, 100],
+                                   [540, 20, 620, 100]]
+        assert [SIDES[s] for s in d.side] == ['Left', 'Center', 'Right']
+
+
+def test_empty_and_to_dicts():
+    empty = Result(np.empty((0, 4), np.float32), np.empty(0, np.float32), np.empty(0, np.float32))
+    assert len(crash_detections(empty, SHAPE, [0], 0.9, CAM)) == 0
+    r = Result(np.array([[10, 20, 30, 40]], np.float32), np.array([0.95], np.float32),
+               np.array([0], np.float32))
+    [d] = crash_detections(r, SHAPE, [0], 0.9, CAM).to_dicts(1, 'motor_crash')
+    assert d == {'box': [10, 20, 30, 40], 'label': 'motor_crash',
+                 'conf': pytest.approx(0.95), 'side': 'Left', 'cam': 1}
+
+
+def test_roi_crop_boxes_come_back_in_camera_coordinates(monkeypatch):
+    # a 160x160 crop at (300, 200) of the 640x480 frame, run at native size
+    r = Result(np.array([[10, 20, 60, 80]], np.float32), np.array([0.95], np.float32),
+               np.array([0], np.float32))
+    for d in both_paths(monkeypatch, r, offset=(300, 200)):
+        assert d.xyxy.tolist() == [[310, 220, 360, 280]]
+        assert SIDES[d.side[0]] == 'Center'
+
+
+def test_roi_offset_is_applied_before_rescaling(monkeypatch):
+    # crop of a 320x240 source frame: offset in source pixels, then ×2
+    r = Result(np.array([[0, 0, 20, 20]], np.float32), np.array([0.95], np.float32),
+               np.array([0], np.float32))
+    for d in both_paths(monkeypatch, r, shape=(240, 320), offset=(250, 100)):
+        assert d.xyxy.tolist() == [[500, 200, 540, 240]]
+        assert SIDES[d.side[0]] == 'Right'
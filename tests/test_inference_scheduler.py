@@ -0,0 +1,98 @@
+from collections import namedtuple
+
+import pytest
+
+from inference_scheduler import InferenceScheduler
+
+Frame = namedtuple('Frame', 'cam')
+
+
+def sched(active=(), **kw):
+    return InferenceScheduler((0, 1), is_active=lambda c: c in active, **kw)
+
+
+def test_rates_fill_the_duty_budget():
+    s = sched(floor_hz=0.1, max_hz=100, max_duty=0.8)
+    s.latency[None] = 0.05
+    rates = s.rates()
+    assert sum(r * 0.05 for r in rates.values()) == pytest.approx(0.8)
+    assert rates[0] == pytest.approx(rates[1])
+
+
+def test_active_camera_gets_weighted_share():
+    s = sched(active=(1,), floor_hz=0.1, max_hz=100, active_weight=4.0)
+    s.latency[None] = 0.05
+    rates = s.rates()
+    assert rates[1] == pytest.approx(4 * rates[0])
+    assert sum(r * 0.05 for r in rates.values()) == pytest.approx(0.8)
+
+
+def test_rates_are_clamped():
+    slow = sched(floor_hz=2.0)
+    slow.latency[None] = 5.0
+    assert slow.rates() == {0: 2.0, 1: 2.0}
+    fast = sched(max_hz=15.0)
+    fast.latency[None] = 0.001
+    assert fast.rates() == {0: 15.0, 1: 15.0}
+
+
+def test_per_tier_cost():
+    s = sched(floor_hz=0.1, max_hz=100, tier_of=lambda c: 320 if c == 0 else 640)
+    s.latency.update({320: 0.02, 640: 0.08})
+    rates = s.rates()
+    assert rates[0] == pytest.approx(rates[1])
+    assert rates[0] * 0.02 + rates[1] * 0.08 == pytest.approx(0.8)
+
+
+def test_due_defers_until_interval_passes():
+    s = sched(floor_hz=0.1, max_hz=100)
+    s.latency[None] = 0.2                      # 2 Hz each
+    frames = [Frame(0), Frame(1)]
+    assert s.due(frames, now=10.0) == frames
+    s.record(frames, 0.4, now=10.0)
+    assert s.due(frames, now=10.3) == []
+    assert s.deferred == {0: 1, 1: 1}
+    assert s.due([None, Frame(1)], now=10.5) == [Frame(1)]
+
+
+def test_record_counts_runs_and_updates_latency():
+    s = sched(alpha=0.5, initial_latency=0.2)
+    s.record([Frame(0), Frame(1)], 0.2, now=1.0)
+    assert s.runs == {0: 1, 1: 1}
+    assert s.latency[None] == pytest.approx(0.15)
+    s.record([], 1.0)
+    assert s.runs == {0: 1, 1: 1}
+
+
+def test_record_latency_leaves_runs_and_intervals_alone():
+    s = sched(alpha=1.0)
+    s.record_latency("gate", 0.1, 4)
+    assert s.latency == {"gate": pytest.approx(0.025)}
+    assert s.runs == {0: 0, 1: 0}
+    assert s.due([Frame(0)], now=100.0) == [Frame(0)]
+
+
+def test_mark_checked_restarts_interval_without_a_run():
+    s = sched(floor_hz=0.1, max_hz=100)
+    s.latency[None] = 0.2
+    s.mark_checked([Frame(0)], now=10.0)
+    assert s.runs == {0: 0, 1: 0}
+    assert s.due([Frame(0), Frame(1)], now=10.1) == [Frame(1)]
+    assert s.due([Frame(0)], now=10.5) == [Frame(0)]
+
+
+def test_gate_that_rejects_everything_stays_within_scheduled_rate():
+    # ml_worker with the gate on: 15 fps per camera for 10 s, the gate looks
+    # at every due frame and passes none, so record() is never called
+    s = sched()
+    s.latency[None] = 0.2                      # 2 Hz per camera
+    gated = 0
+    for tick in range(150):
+        now = 1.0 + tick / 15
+        due = s.due([Frame(0), Frame(1)], now=now)
+        s.mark_checked(due, now=now)
+        gated += len(due)
+    rates = s.rates()
+    assert gated <= 10 * sum(rates.values()) + len(rates)
+    assert sum(s.deferred.values()) > gated
+    assert s.runs == {0: 0, 1: 0}